@@ -1,15 +1,46 @@
-from fastapi import APIRouter
+import importlib
 
-from backend.app.api.api_v1.routers import canvases, notes, upload, media, ocr, transcribe
+from fastapi import APIRouter, Depends
+
+from backend.app.api.api_v1.deps import admit, invalidate_preview
+from backend.app.core.config import settings
+from backend.app.services.startup import startup_report
+
+
+def _load(name: str):
+    """Импортировать модуль роутера, замеряя время импорта"""
+    with startup_report.step(f"router:{name}"):
+        return importlib.import_module(f"backend.app.api.api_v1.routers.{name}")
 
 
 api_router = APIRouter()
 
 
+canvases = _load("canvases")
 api_router.include_router(canvases.router, prefix="/canvases", tags=["canvases"])
 
-api_router.include_router(notes.router, prefix="/canvases/{canvas_id}/notes", tags=["notes"])
-api_router.include_router(upload.router, prefix="/canvases", tags=["upload"])
+notes = _load("notes")
+api_router.include_router(notes.router, prefix="/canvases/{canvas_id}/notes", tags=["notes"],
+                          dependencies=[Depends(admit("interactive")), Depends(invalidate_preview)])
+
+upload = _load("upload")
+api_router.include_router(upload.router, prefix="/canvases", tags=["upload"],
+                          dependencies=[Depends(admit("upload"))])
+
+media = _load("media")
 api_router.include_router(media.router, prefix="/canvases", tags=["Media"])
-api_router.include_router(ocr.router, prefix="/canvases", tags=["OCR"])
-api_router.include_router(transcribe.router, prefix="/canvases", tags=["Transcribe"])
+api_router.include_router(media.files_router, prefix="/media", tags=["Media"])
+
+# Отключённые подсистемы не регистрируют маршруты, и их модули не импортируются
+if "ocr" in settings.features:
+    ocr = _load("ocr")
+    api_router.include_router(ocr.router, prefix="/canvases", tags=["OCR"],
+                              dependencies=[Depends(admit("ocr"))])
+
+if "transcription" in settings.features:
+    transcribe = _load("transcribe")
+    api_router.include_router(transcribe.router, prefix="/canvases", tags=["Transcribe"],
+                              dependencies=[Depends(admit("transcription"))])
+
+system = _load("system")
+api_router.include_router(system.router, prefix="/system", tags=["System"])
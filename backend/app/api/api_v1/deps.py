@@ -1,7 +1,75 @@
+import json
+import time
 from pathlib import Path
 
-DATA_DIR = Path("data") / "canvases"
+from fastapi import Depends, HTTPException, Request, Response, status
+
+from backend.app.services import storage
+from backend.app.services.admission import AdmissionRejected, limiters
+from backend.app.services.disk_usage import disk_usage
+from backend.app.services.preview import preview_renderer
+from backend.app.services.repository import (
+    Repository, CanvasNotFoundError, NoteBatchError, NoteConflictError, NotePatchError, get_repository
+)
+from backend.app.services.streaming import NDJSON_MEDIA_TYPE, encode_body, negotiate_encoding
 
 
 def get_canvas_path(canvas_id: str) -> Path:
-    return DATA_DIR / canvas_id
+    return storage.get_canvas_path(canvas_id)
+
+
+def record_media_file(repo: Repository, canvas_id: str, path: Path, old_size: int = 0):
+    """Учесть записанный файл канваса в хранилище и в счётчике места на диске"""
+    size = path.stat().st_size
+    repo.add_media(canvas_id, f"{path.parent.name}/{path.name}", size)
+    disk_usage.add(canvas_id, size - old_size)
+    preview_renderer.invalidate(repo, canvas_id)
+
+
+async def invalidate_preview(request: Request, canvas_id: str, repo: Repository = Depends(get_repository)):
+    """Зависимость, которая после изменяющего запроса ставит превью канваса на перерисовку"""
+    yield
+    if request.method != "GET":
+        preview_renderer.invalidate(repo, canvas_id)
+
+
+def wants_ndjson(request: Request) -> bool:
+    """Клиент просит поток NDJSON вместо одного JSON-документа"""
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+def accepted_encoding(request: Request):
+    """Сжатие ответа, выбранное по Accept-Encoding клиента, или None"""
+    return negotiate_encoding(request.headers.get("accept-encoding"))
+
+
+def json_response(request: Request, payload) -> Response:
+    """JSON-ответ, сжатый по Accept-Encoding клиента"""
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    body, encoding = encode_body(body, accepted_encoding(request))
+    headers = {"Vary": "Accept-Encoding"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(body, media_type="application/json", headers=headers)
+
+
+def admit(request_class: str):
+    """Зависимость, которая держит место в лимите класса запросов до конца обработки"""
+    limiter = limiters[request_class]
+
+    async def dependency():
+        try:
+            await limiter.acquire()
+        except AdmissionRejected as e:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=str(e),
+                headers={"Retry-After": str(e.retry_after)}
+            )
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            limiter.release(time.monotonic() - started)
+
+    return dependency
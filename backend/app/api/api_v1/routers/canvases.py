@@ -1,26 +1,107 @@
-from fastapi import APIRouter, HTTPException, status
-from backend.app.schemas.canvas import CanvasCreate, Canvas, CanvasUpdate
-from backend.app.services import storage
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, status, UploadFile, File, Query, BackgroundTasks, Depends, Header, Response
+from fastapi.responses import FileResponse, StreamingResponse
+from backend.app.api.api_v1.deps import Repository, get_repository
+from backend.app.core.config import settings
+from backend.app.schemas.canvas import CanvasCreate, Canvas, CanvasUpdate, CanvasClone
+from backend.app.services import canvas_archive, media_gc
+from backend.app.services.disk_usage import disk_usage
+from backend.app.services.image_index import image_index
+from backend.app.services.preview import preview_renderer
+from backend.app.services.streaming import response_cache
 
 router = APIRouter()
 
 
+def _ensure_canvas(repo: Repository, canvas_id: str) -> dict:
+    canvas = repo.get_canvas_meta(canvas_id)
+    if not canvas:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Canvas not found"
+        )
+    return canvas
+
+
 @router.get("/", response_model=list[str])
-async def list_canvases():
+async def list_canvases(repo: Repository = Depends(get_repository)):
     """Получить список всех канвасов"""
-    return storage.list_canvases()
+    return repo.list_canvases()
 
 
 @router.post("/", response_model=Canvas)
-async def create_canvas(canvas: CanvasCreate):
+async def create_canvas(canvas: CanvasCreate, repo: Repository = Depends(get_repository)):
     """Создать новый канвас"""
-    return storage.create_canvas(canvas.name)
+    return repo.create_canvas(canvas.name)
+
+
+@router.post("/import", response_model=Canvas)
+def import_canvas(
+    file: UploadFile = File(...),
+    name: Optional[str] = Query(None, description="Имя нового канваса, по умолчанию берётся из архива"),
+    repo: Repository = Depends(get_repository)
+):
+    """Импортировать канвас из zip-архива"""
+    try:
+        return canvas_archive.import_canvas_archive(repo, file.file, name)
+    except canvas_archive.ArchiveError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
 
 
 @router.get("/{canvas_id}", response_model=Canvas)
-async def get_canvas(canvas_id: str):
+async def get_canvas(canvas_id: str, repo: Repository = Depends(get_repository)):
     """Получить информацию о канвасе"""
-    canvas = storage.get_canvas_meta(canvas_id)
+    return _ensure_canvas(repo, canvas_id)
+
+
+@router.get("/{canvas_id}/export")
+def export_canvas(canvas_id: str, repo: Repository = Depends(get_repository)):
+    """Экспортировать канвас в zip-архив потоком"""
+    _ensure_canvas(repo, canvas_id)
+    return StreamingResponse(
+        canvas_archive.iter_canvas_archive(repo, canvas_id),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{canvas_id}.zip"'}
+    )
+
+
+@router.get("/{canvas_id}/preview")
+def get_canvas_preview(
+    canvas_id: str,
+    if_none_match: Optional[str] = Header(None),
+    repo: Repository = Depends(get_repository)
+):
+    """Получить PNG-превью канваса; поддерживает проверку через ETag"""
+    if "previews" not in settings.features:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Previews are disabled"
+        )
+    _ensure_canvas(repo, canvas_id)
+    path = preview_renderer.get_preview(repo, canvas_id)
+    if path is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Canvas not found"
+        )
+
+    stat = path.stat()
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    # Браузер каждый раз сверяет ETag; пока превью не перерисовано, ответ — пустой 304
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return FileResponse(path, media_type="image/png", headers=headers)
+
+
+@router.post("/{canvas_id}/clone", response_model=Canvas)
+def clone_canvas(canvas_id: str, clone: CanvasClone = None, repo: Repository = Depends(get_repository)):
+    """Клонировать канвас без копирования медиафайлов"""
+    canvas = canvas_archive.clone_canvas(repo, canvas_id, clone.name if clone else None)
     if not canvas:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -29,13 +110,33 @@ async def get_canvas(canvas_id: str):
     return canvas
 
 
+@router.get("/{canvas_id}/usage")
+def get_canvas_usage(canvas_id: str, repo: Repository = Depends(get_repository)):
+    """Получить место на диске, занятое канвасом"""
+    _ensure_canvas(repo, canvas_id)
+    return {"canvas_id": canvas_id, "bytes": disk_usage.get_canvas_usage(canvas_id)}
+
+
+@router.post("/{canvas_id}/gc")
+def collect_canvas_garbage(canvas_id: str, repo: Repository = Depends(get_repository)):
+    """Удалить медиафайлы канваса, на которые не ссылаются заметки"""
+    _ensure_canvas(repo, canvas_id)
+    return {"removed": media_gc.collect_canvas(repo, canvas_id)}
+
+
 @router.delete("/{canvas_id}")
-async def delete_canvas(canvas_id: str):
+async def delete_canvas(canvas_id: str, background_tasks: BackgroundTasks, repo: Repository = Depends(get_repository)):
     """Удалить канвас"""
-    success = storage.delete_canvas(canvas_id)
+    success = repo.delete_canvas(canvas_id)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Canvas not found"
         )
+    disk_usage.forget(canvas_id)
+    preview_renderer.forget(canvas_id)
+    image_index.forget_canvas(canvas_id)
+    response_cache.forget_canvas(canvas_id)
+    # Папка уже перемещена в корзину, удаление файлов не блокирует воркер
+    background_tasks.add_task(media_gc.empty_trash)
     return {"detail": "Canvas deleted"}
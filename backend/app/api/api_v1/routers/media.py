@@ -1,36 +1,63 @@
-from fastapi import APIRouter, HTTPException, status
-from pathlib import Path
+from fastapi import APIRouter, HTTPException, status, Depends, Query
+from fastapi.responses import FileResponse
 
-from backend.app.api.api_v1.deps import get_canvas_path
+from backend.app.api.api_v1.deps import Repository, get_repository, get_canvas_path
+from backend.app.core.config import settings
+from backend.app.services import storage
+from backend.app.services.image_index import HASH_BITS, image_index
 
 
 router = APIRouter()
 
-MEDIA_SUBFOLDERS = ["images", "audio", "ocr", "drawings", "transcripts"]
+# Раздача самих файлов: /media/{canvas_id}/{file_path}
+files_router = APIRouter()
 
 
 @router.get("/{canvas_id}/media")
-def list_media(canvas_id: str):
-    canvas_dir = get_canvas_path(canvas_id)
-    if not canvas_dir.exists():
+def list_media(canvas_id: str, repo: Repository = Depends(get_repository)):
+    if not repo.get_canvas_meta(canvas_id):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Canvas not found"
         )
 
-    media = {}
+    media = {folder: [] for folder in storage.MEDIA_FOLDERS}
+    for item in repo.list_media(canvas_id):
+        folder = item["file_path"].split("/", 1)[0]
+        if folder in media:
+            media[folder].append(item["file_path"])
 
-    for folder in MEDIA_SUBFOLDERS:
-        path = canvas_dir / folder
-        if not path.exists():
-            media[folder] = []
-            continue
+    return media
 
-        files = [
-            f"{folder}/{file.name}"
-            for file in path.iterdir()
-            if file.is_file()
-        ]
-        media[folder] = files
 
-    return media
\ No newline at end of file
+@router.get("/{canvas_id}/media/duplicates")
+def list_duplicate_images(
+    canvas_id: str,
+    max_distance: int = Query(settings.ocr_reuse_distance, ge=0, le=HASH_BITS // 4,
+                              description="Максимальное расстояние Хэмминга между dHash изображений"),
+    repo: Repository = Depends(get_repository)
+):
+    """Найти группы почти одинаковых изображений канваса"""
+    if "ocr" not in settings.features:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Image index is disabled"
+        )
+    if not repo.get_canvas_meta(canvas_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Canvas not found"
+        )
+    return {"groups": image_index.find_duplicates(canvas_id, max_distance)}
+
+
+@files_router.get("/{canvas_id}/{file_path:path}")
+def get_media_file(canvas_id: str, file_path: str):
+    canvas_dir = get_canvas_path(canvas_id).resolve()
+    path = (canvas_dir / file_path).resolve()
+    if not path.is_relative_to(canvas_dir) or not path.is_file():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="File not found"
+        )
+    return FileResponse(path)
@@ -1,9 +1,17 @@
-from fastapi import APIRouter, Path, HTTPException, status
-from typing import List
+from fastapi import APIRouter, Path, HTTPException, status, Depends, Query, Body, Header, Request, Response
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from typing import List, Optional
 from pydantic import BaseModel
 
-from backend.app.schemas.note import NoteCreate, Note
-from backend.app.services import notes_storage
+from backend.app.api.api_v1.deps import (
+    Repository, CanvasNotFoundError, NoteBatchError, NoteConflictError, NotePatchError, accepted_encoding,
+    get_repository, wants_ndjson
+)
+from backend.app.schemas.note import NoteCreate, Note, NoteBatch, NoteBatchResult
+from backend.app.services.drawing import LOD_SCREEN_TOLERANCE, lod_level
+from backend.app.services.lod_store import lod_store
+from backend.app.services.streaming import NDJSON_MEDIA_TYPE, encode, iter_notes_json, response_cache
 
 router = APIRouter()
 
@@ -28,29 +36,112 @@ class BulkSizeUpdate(BaseModel):
     updates: List[NoteSizeUpdate]
 
 
+async def _precompute_lod(canvas_id: str, notes: list[dict]):
+    """Посчитать уровни детализации записанных рисунков, чтобы чтение их не считало"""
+    drawings = [note for note in notes if note and note.get("type") == "drawing"]
+    if drawings:
+        await run_in_threadpool(lod_store.precompute, canvas_id, drawings)
+
+
 @router.get("/", response_model=list[Note])
-async def list_notes(canvas_id: str = Path(...)):
-    return notes_storage.list_notes(canvas_id)
+async def list_notes(
+    request: Request,
+    canvas_id: str = Path(...),
+    zoom: Optional[float] = Query(None, gt=0, description="Масштаб доски: рисунки упрощаются до незаметного на экране"),
+    tolerance: Optional[float] = Query(None, gt=0, description="Допустимое отклонение рисунков в единицах канваса"),
+    if_none_match: Optional[str] = Header(None),
+    repo: Repository = Depends(get_repository)
+):
+    """Получить заметки канваса.
+
+    Заметки отдаются потоком JSON-массива, а с Accept: application/x-ndjson —
+    по одной на строку; тело сжимается по Accept-Encoding. Готовые ответы
+    кешируются до следующего изменения заметок, ETag — ревизия заметок.
+    """
+    if tolerance is None and zoom is not None:
+        tolerance = LOD_SCREEN_TOLERANCE / zoom
+    ndjson = wants_ndjson(request)
+    encoding = accepted_encoding(request)
+
+    revision = repo.get_notes_revision(canvas_id)
+    etag = f'W/"{revision}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept, Accept-Encoding"}
+    if if_none_match and etag.removeprefix("W/") in [
+        tag.strip().removeprefix("W/") for tag in if_none_match.split(",")
+    ]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    media_type = NDJSON_MEDIA_TYPE if ndjson else "application/json"
+    # Ответ зависит не от самого отклонения, а от уровня детализации, который оно выбирает
+    level = lod_level(tolerance)
+    key = (canvas_id, revision, level, ndjson, encoding)
+    body = response_cache.get(key)
+    if body is not None:
+        return Response(body, media_type=media_type, headers=headers)
+
+    notes = repo.iter_notes(canvas_id)
+    if level:
+        notes = (lod_store.with_lod(canvas_id, note, tolerance) for note in notes)
+    chunks = encode(iter_notes_json(notes, ndjson), encoding)
+    return StreamingResponse(
+        response_cache.stream(key, chunks, lambda: repo.get_notes_revision(canvas_id) == revision),
+        media_type=media_type,
+        headers=headers
+    )
 
 
 @router.post("/", response_model=Note)
-async def create_note(canvas_id: str = Path(...), note: NoteCreate = None):
-    return notes_storage.create_note(canvas_id, note)
+async def create_note(canvas_id: str = Path(...), note: NoteCreate = None,
+                      repo: Repository = Depends(get_repository)):
+    try:
+        created = repo.create_note(canvas_id, note)
+    except CanvasNotFoundError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Canvas not found"
+        )
+    await _precompute_lod(canvas_id, [created])
+    return created
+
+
+@router.post("/batch", response_model=list[NoteBatchResult])
+async def apply_note_batch(canvas_id: str = Path(...), batch: NoteBatch = None,
+                           repo: Repository = Depends(get_repository)):
+    """Создать, обновить и удалить несколько заметок одной записью (всё или ничего)"""
+    try:
+        results = repo.apply_note_batch(canvas_id, batch.operations)
+    except CanvasNotFoundError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Canvas not found"
+        )
+    except NoteBatchError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail={"index": e.index, "detail": e.detail}
+        )
+    await _precompute_lod(canvas_id, [result.get("note") for result in results])
+    return results
 
 
 @router.put("/{note_id}", response_model=Note)
-async def update_note(canvas_id: str = Path(...), note_id: str = Path(...), note: NoteCreate = None):
-    updated = notes_storage.update_note(canvas_id, note_id, note)
+async def update_note(canvas_id: str = Path(...), note_id: str = Path(...), note: NoteCreate = None,
+                      repo: Repository = Depends(get_repository)):
+    updated = repo.update_note(canvas_id, note_id, note)
     if not updated:
         raise HTTPException(
                             status_code=status.HTTP_404_NOT_FOUND,
                             detail="Note not found")
+    await _precompute_lod(canvas_id, [updated])
     return updated
 
 
 @router.delete("/{note_id}")
-async def delete_note(canvas_id: str = Path(...), note_id: str = Path(...)):
-    success = notes_storage.delete_note(canvas_id, note_id)
+async def delete_note(canvas_id: str = Path(...), note_id: str = Path(...),
+                      repo: Repository = Depends(get_repository)):
+    success = repo.delete_note(canvas_id, note_id)
     if not success:
         raise HTTPException(
                             status_code=status.HTTP_404_NOT_FOUND,
@@ -59,9 +150,10 @@ async def delete_note(canvas_id: str = Path(...), note_id: str = Path(...)):
 
 
 @router.patch("/positions", response_model=dict)
-async def update_note_positions(canvas_id: str = Path(...), bulk_update: BulkPositionUpdate = None):
+async def update_note_positions(canvas_id: str = Path(...), bulk_update: BulkPositionUpdate = None,
+                                repo: Repository = Depends(get_repository)):
     """Обновить позиции нескольких заметок одновременно (для drag & drop)"""
-    updated_count = notes_storage.update_note_positions(canvas_id, bulk_update.updates)
+    updated_count = repo.update_note_positions(canvas_id, bulk_update.updates)
     if updated_count == 0:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -71,12 +163,46 @@ async def update_note_positions(canvas_id: str = Path(...), bulk_update: BulkPos
 
 
 @router.patch("/sizes", response_model=dict)
-async def update_note_sizes(canvas_id: str = Path(...), bulk_update: BulkSizeUpdate = None):
+async def update_note_sizes(canvas_id: str = Path(...), bulk_update: BulkSizeUpdate = None,
+                            repo: Repository = Depends(get_repository)):
     """Обновить размеры нескольких заметок одновременно"""
-    updated_count = notes_storage.update_note_sizes(canvas_id, bulk_update.updates)
+    updated_count = repo.update_note_sizes(canvas_id, bulk_update.updates)
     if updated_count == 0:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="No notes found to update"
         )
     return {"detail": f"Updated {updated_count} note sizes"}
+
+
+@router.patch("/{note_id}", response_model=Note)
+async def patch_note(
+    response: Response,
+    canvas_id: str = Path(...),
+    note_id: str = Path(...),
+    patch: dict = Body(..., media_type="application/merge-patch+json"),
+    if_match: Optional[str] = Header(None, description="updated_at заметки в кавычках, как в ETag"),
+    repo: Repository = Depends(get_repository)
+):
+    """Частично обновить заметку (JSON Merge Patch); проверяются только переданные поля"""
+    try:
+        patched = repo.patch_note(canvas_id, note_id, patch, if_match)
+    except NotePatchError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=e.errors
+        )
+    except NoteConflictError as e:
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail="Note was modified",
+            headers={"ETag": f'"{e.updated_at}"'}
+        )
+    if not patched:
+        raise HTTPException(
+                            status_code=status.HTTP_404_NOT_FOUND,
+                            detail="Note not found")
+    if "drawing_data" in patch:
+        await _precompute_lod(canvas_id, [patched])
+    response.headers["ETag"] = f'"{patched["updated_at"]}"'
+    return patched
@@ -1,12 +1,12 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, status, Query
+from fastapi import APIRouter, UploadFile, File, HTTPException, status, Query, Depends
+from starlette.concurrency import run_in_threadpool
 from pathlib import Path
-from PIL import Image
-import pytesseract
 import uuid
 import shutil
 from pydantic import BaseModel
 
-from backend.app.api.api_v1.deps import get_canvas_path
+from backend.app.api.api_v1.deps import Repository, get_repository, get_canvas_path, record_media_file
+from backend.app.services import ocr
 from backend.app.services.cache import file_cache
 
 
@@ -14,19 +14,37 @@ router = APIRouter()
 
 allowed_types = ["image/png", "image/jpeg", "image/jpg"]
 
-pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
-
 
 class OCRExistingRequest(BaseModel):
     file_path: str
     lang: str = "eng"
 
 
+# Обработчики асинхронные, поэтому весь файловый ввод-вывод уходит в пул потоков:
+# иначе время ответа остальных запросов зависело бы от размера изображения
+
+def _save_upload(repo: Repository, canvas_id: str, file: UploadFile, image_path: Path):
+    # Копируем порциями, не читая загрузку в память целиком
+    with image_path.open("wb") as f:
+        shutil.copyfileobj(file.file, f)
+    record_media_file(repo, canvas_id, image_path)
+
+
+def _store_result(repo: Repository, canvas_id: str, image_path: Path, lang: str, text: str, transcript_path: Path):
+    """Сохранить распознанный текст в кеш и в файл транскрипта"""
+    file_cache.set_ocr_result(image_path, lang, text)
+    transcript_path.parent.mkdir(parents=True, exist_ok=True)
+    old_size = transcript_path.stat().st_size if transcript_path.exists() else 0
+    transcript_path.write_text(text, encoding="utf-8")
+    record_media_file(repo, canvas_id, transcript_path, old_size)
+
+
 @router.post("/{canvas_id}/ocr")
-def ocr_image(
+async def ocr_image(
     canvas_id: str,
     file: UploadFile = File(...),
-    lang: str = Query("eng", description="Язык для OCR, например 'eng' или 'rus' или 'eng+rus'")
+    lang: str = Query("eng", description="Язык для OCR, например 'eng' или 'rus' или 'eng+rus'"),
+    repo: Repository = Depends(get_repository)
 ):
     if file.content_type not in ["image/png", "image/jpeg", "image/jpg"]:
         raise HTTPException(
@@ -43,26 +61,26 @@ def ocr_image(
     image_id = f"{uuid.uuid4().hex}.png"
     image_path = ocr_dir / image_id
 
-    with image_path.open("wb") as f:
-        shutil.copyfileobj(file.file, f)
+    await run_in_threadpool(_save_upload, repo, canvas_id, file, image_path)
 
     try:
-        image = Image.open(image_path)
-        text = pytesseract.image_to_string(image, lang=lang)
+        # Заодно добавляет изображение в индекс похожих изображений
+        similar = await ocr.find_similar(repo, canvas_id, f"ocr/{image_id}", image_path, lang)
+        text = similar[0] if similar else await ocr.recognize(image_path, lang)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
         )
+    await run_in_threadpool(_store_result, repo, canvas_id, image_path, lang, text, transcripts_dir / f"{image_id}.txt")
 
-    transcript_path = transcripts_dir / f"{image_id}.txt"
-    transcript_path.write_text(text, encoding="utf-8")
-
+    if similar:
+        return {"text": text, "similar_to": similar[1]}
     return {"text": text}
 
 
 @router.post("/{canvas_id}/ocr-existing")
-def ocr_existing_image(canvas_id: str, request: OCRExistingRequest):
+async def ocr_existing_image(canvas_id: str, request: OCRExistingRequest, repo: Repository = Depends(get_repository)):
     """OCR для существующего файла изображения"""
     canvas_dir = get_canvas_path(canvas_id)
     image_path = canvas_dir / request.file_path
@@ -73,24 +91,22 @@ def ocr_existing_image(canvas_id: str, request: OCRExistingRequest):
             detail="Image file not found"
         )
     
-    # Проверяем кеш
-    cached_text = file_cache.get_ocr_result(image_path, request.lang)
+    # Проверяем кеш; ключ — хеш всего файла, поэтому считаем его в пуле
+    cached_text = await run_in_threadpool(file_cache.get_ocr_result, image_path, request.lang)
     if cached_text is not None:
         return {"text": cached_text, "from_cache": True}
     
     try:
-        image = Image.open(image_path)
-        text = pytesseract.image_to_string(image, lang=request.lang)
-        
-        # Сохраняем в кеш
-        file_cache.set_ocr_result(image_path, request.lang, text)
-        
-        # Сохраняем результат в файл
-        transcripts_dir = canvas_dir / "transcripts"
-        transcripts_dir.mkdir(parents=True, exist_ok=True)
-        transcript_path = transcripts_dir / f"{image_path.stem}_ocr.txt"
-        transcript_path.write_text(text, encoding="utf-8")
+        # Похожее изображение (другое разрешение или качество JPEG) уже распознавалось
+        similar = await ocr.find_similar(repo, canvas_id, request.file_path, image_path, request.lang)
+        text = similar[0] if similar else await ocr.recognize(image_path, request.lang)
+
+        # Сохраняем в кеш и в файл
+        transcript_path = canvas_dir / "transcripts" / f"{image_path.stem}_ocr.txt"
+        await run_in_threadpool(_store_result, repo, canvas_id, image_path, request.lang, text, transcript_path)
         
+        if similar:
+            return {"text": text, "from_cache": True, "similar_to": similar[1]}
         return {"text": text, "from_cache": False}
     except Exception as e:
         raise HTTPException(
@@ -0,0 +1,34 @@
+from fastapi import APIRouter, Depends
+
+from backend.app.api.api_v1.deps import Repository, get_repository
+from backend.app.services.admission import get_admission_stats
+from backend.app.services.disk_usage import disk_usage
+from backend.app.services.startup import startup_report
+from backend.app.services.streaming import response_cache
+
+
+router = APIRouter()
+
+
+@router.get("/disk-usage")
+def get_disk_usage(repo: Repository = Depends(get_repository)):
+    """Получить место на диске, занятое всеми канвасами"""
+    return disk_usage.get_total_usage(repo.list_canvases())
+
+
+@router.get("/admission")
+async def get_admission():
+    """Загрузка классов запросов: занятые места, длина очереди, время ожидания и отказы"""
+    return get_admission_stats()
+
+
+@router.get("/response-cache")
+async def get_response_cache():
+    """Кеш готовых ответов со списками заметок: записи, занятый объём, попадания и промахи"""
+    return response_cache.get_stats()
+
+
+@router.get("/startup")
+async def get_startup():
+    """Время этапов запуска и прогрева, включённые подсистемы и загруженные тяжёлые библиотеки"""
+    return startup_report.get_report()
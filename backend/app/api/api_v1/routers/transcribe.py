@@ -1,37 +1,38 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, status, Query
+from fastapi import APIRouter, UploadFile, File, HTTPException, status, Query, Depends, Request, Response
+from fastapi.responses import StreamingResponse
 from pathlib import Path
+from typing import AsyncIterator, Callable, Optional
+import asyncio
 import shutil
 import uuid
-import json
-from vosk import Model, KaldiRecognizer
 import wave
 import tempfile
 import subprocess
 from pydantic import BaseModel
 
-from backend.app.api.api_v1.deps import get_canvas_path
+from backend.app.api.api_v1.deps import (
+    Repository, accepted_encoding, get_repository, get_canvas_path, json_response, record_media_file, wants_ndjson
+)
 from backend.app.services.cache import file_cache
+from backend.app.services.speech import MODELS, combine_segments, iter_segments, run_in_pool
+from backend.app.services.streaming import NDJSON_MEDIA_TYPE, encode_async, ndjson_line
+from backend.app.services.tools import find_ffmpeg
 
 
 router = APIRouter()
 
 
-MODELS = {
-    "en-us": "models_vosk/vosk-model-small-en-us-0.15",
-    "ru-ru": "models_vosk/vosk-model-ru-0.10"
-}
-
-FFMPEG_PATH = r"C:\Users\Дмитрий\PycharmProjects\smartnotes-plus-plus\ffmpeg-7.1.1-essentials_build\bin\ffmpeg.exe"
-
-
 class TranscribeExistingRequest(BaseModel):
     file_path: str
     lang: str = "en-us"
 
 
 def convert_to_wav(input_path: Path, output_path: Path):
+    ffmpeg_path = find_ffmpeg()
+    if ffmpeg_path is None:
+        raise Exception("ffmpeg not found: set SMARTNOTES_FFMPEG_PATH")
     command = [
-        FFMPEG_PATH,
+        ffmpeg_path,
         "-y",
         "-i", str(input_path),
         "-ac", "1",
@@ -44,12 +45,82 @@ def convert_to_wav(input_path: Path, output_path: Path):
         raise Exception(f"ffmpeg error: {result.stderr.decode()}")
 
 
+async def _first_segment(segments: AsyncIterator[dict], invalid_detail: str) -> Optional[dict]:
+    """Дождаться первого сегмента, чтобы ошибки чтения файла вернулись обычным кодом ответа"""
+    try:
+        return await anext(segments)
+    except StopAsyncIteration:
+        return None
+    except wave.Error:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=invalid_detail
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Speech recognition error: {e}"
+        )
+
+
+async def _all_segments(first: Optional[dict], segments: AsyncIterator[dict]) -> AsyncIterator[dict]:
+    if first is None:
+        return
+    yield first
+    async for segment in segments:
+        yield segment
+
+
+async def _collect(first: Optional[dict], segments: AsyncIterator[dict]) -> dict:
+    try:
+        return combine_segments([segment async for segment in _all_segments(first, segments)])
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Speech recognition error: {e}"
+        )
+
+
+def _stream(request: Request, first: Optional[dict], segments: AsyncIterator[dict],
+            finish: Callable[[dict], dict], cleanup: Optional[Callable[[], None]] = None) -> StreamingResponse:
+    """NDJSON: строка на каждый сегмент по мере распознавания, последняя — итог.
+
+    Строки: {"type": "segment", "index", "segments", "text", "words"},
+    {"type": "done", "transcript", ...} или {"type": "error", "detail"}.
+    """
+    async def lines():
+        results = []
+        try:
+            async for segment in _all_segments(first, segments):
+                results.append(segment)
+                yield ndjson_line({"type": "segment", **segment})
+            result = combine_segments(results)
+            # finish пишет файлы, поэтому выполняется вне цикла событий
+            extra = await asyncio.to_thread(finish, result)
+            yield ndjson_line({"type": "done", "transcript": result["transcript"], **extra})
+        except Exception as e:
+            # Статус уже отправлен, поэтому ошибка сообщается строкой потока
+            yield ndjson_line({"type": "error", "detail": f"Speech recognition error: {e}"})
+        finally:
+            if cleanup is not None:
+                cleanup()
+
+    encoding = accepted_encoding(request)
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return StreamingResponse(encode_async(lines(), encoding), media_type=NDJSON_MEDIA_TYPE, headers=headers)
+
+
 @router.post("/{canvas_id}/transcribe")
 async def transcribe_audio(
+        request: Request,
         canvas_id: str,
         file: UploadFile = File(...),
-        lang: str = Query("en-us", description="Язык модели: 'en-us' или 'ru-ru'")
+        lang: str = Query("en-us", description="Язык модели: 'en-us' или 'ru-ru'"),
+        repo: Repository = Depends(get_repository)
 ):
+    """Загрузить и распознать аудио; с Accept: application/x-ndjson результат отдаётся потоком по сегментам"""
     if not file.content_type.startswith("audio/"):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -78,7 +149,7 @@ async def transcribe_audio(
     audio_path = audio_dir / audio_filename
 
     try:
-        convert_to_wav(Path(temp_input.name), audio_path)
+        await run_in_pool(convert_to_wav, Path(temp_input.name), audio_path)
     except Exception as e:
         Path(temp_input.name).unlink(missing_ok=True)
         raise HTTPException(
@@ -87,46 +158,32 @@ async def transcribe_audio(
         )
 
     Path(temp_input.name).unlink(missing_ok=True)
+    record_media_file(repo, canvas_id, audio_path)
 
-    try:
-        wf = wave.open(str(audio_path), "rb")
-    except Exception:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid audio file after conversion"
-        )
+    segments = iter_segments(audio_path, lang)
+    first = await _first_segment(segments, "Invalid audio file after conversion")
 
-    try:
-        model_path = MODELS[lang]
-        model = Model(model_path)
-        rec = KaldiRecognizer(model, wf.getframerate())
-        result_text = ""
-
-        while True:
-            data = wf.readframes(4000)
-            if len(data) == 0:
-                break
-            if rec.AcceptWaveform(data):
-                res = json.loads(rec.Result())
-                result_text += res.get("text", "") + " "
-        final_res = json.loads(rec.FinalResult())
-        result_text += final_res.get("text", "")
+    def finish(result: dict) -> dict:
+        transcript_path = transcripts_dir / f"{audio_filename}.txt"
+        transcript_path.write_text(result["transcript"], encoding="utf-8")
+        record_media_file(repo, canvas_id, transcript_path)
+        return {}
 
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Speech recognition error: {e}"
-        )
+    if wants_ndjson(request):
+        return _stream(request, first, segments, finish)
 
-    transcript_path = transcripts_dir / f"{audio_filename}.txt"
-    transcript_path.write_text(result_text.strip(), encoding="utf-8")
-
-    return {"transcript": result_text.strip()}
+    result = await _collect(first, segments)
+    await asyncio.to_thread(finish, result)
+    return json_response(request, {"transcript": result["transcript"], "words": result["words"]})
 
 
 @router.post("/{canvas_id}/transcribe-existing")
-async def transcribe_existing_audio(canvas_id: str, request: TranscribeExistingRequest):
-    """Транскрипция для существующего аудио файла"""
+async def transcribe_existing_audio(canvas_id: str, request: TranscribeExistingRequest, http_request: Request,
+                                    repo: Repository = Depends(get_repository)):
+    """Транскрипция для существующего аудио файла.
+
+    С Accept: application/x-ndjson результат отдаётся потоком по сегментам.
+    """
     if request.lang not in MODELS:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -145,7 +202,12 @@ async def transcribe_existing_audio(canvas_id: str, request: TranscribeExistingR
     # Проверяем кеш
     cached_transcript = file_cache.get_transcript_result(audio_path, request.lang)
     if cached_transcript is not None:
-        return {"transcript": cached_transcript, "from_cache": True}
+        if wants_ndjson(http_request):
+            return Response(
+                ndjson_line({"type": "done", "transcript": cached_transcript, "from_cache": True}),
+                media_type=NDJSON_MEDIA_TYPE
+            )
+        return json_response(http_request, {"transcript": cached_transcript, "from_cache": True})
 
     transcripts_dir = canvas_dir / "transcripts"
     transcripts_dir.mkdir(parents=True, exist_ok=True)
@@ -153,58 +215,51 @@ async def transcribe_existing_audio(canvas_id: str, request: TranscribeExistingR
     # Конвертируем в WAV если нужно
     if audio_path.suffix.lower() != '.wav':
         wav_path = transcripts_dir / f"{audio_path.stem}_temp.wav"
-        try:
-            convert_to_wav(audio_path, wav_path)
-        except Exception as e:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"Audio conversion error: {e}"
-            )
     else:
         wav_path = audio_path
 
-    try:
-        wf = wave.open(str(wav_path), "rb")
-    except Exception:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid audio file"
-        )
+    def cleanup():
+        # Удаляем временный файл при любом исходе, в том числе после ошибки ffmpeg
+        if wav_path != audio_path:
+            wav_path.unlink(missing_ok=True)
 
     try:
-        model_path = MODELS[request.lang]
-        model = Model(model_path)
-        rec = KaldiRecognizer(model, wf.getframerate())
-        result_text = ""
-
-        while True:
-            data = wf.readframes(4000)
-            if len(data) == 0:
-                break
-            if rec.AcceptWaveform(data):
-                res = json.loads(rec.Result())
-                result_text += res.get("text", "") + " "
-        final_res = json.loads(rec.FinalResult())
-        result_text += final_res.get("text", "")
+        if wav_path != audio_path:
+            try:
+                await run_in_pool(convert_to_wav, audio_path, wav_path)
+            except Exception as e:
+                raise HTTPException(
+                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                    detail=f"Audio conversion error: {e}"
+                )
+
+        # Сегменты кешируются по исходному файлу, а не по временному WAV
+        segments = iter_segments(wav_path, request.lang, source_path=audio_path)
+        first = await _first_segment(segments, "Invalid audio file")
+    except BaseException:
+        cleanup()
+        raise
+
+    def finish(result: dict) -> dict:
+        result_text = result["transcript"]
+
+        # Сохраняем в кеш
+        file_cache.set_transcript_result(audio_path, request.lang, result_text)
+
+        # Сохраняем транскрипт в файл
+        transcript_path = transcripts_dir / f"{audio_path.stem}_transcript.txt"
+        old_size = transcript_path.stat().st_size if transcript_path.exists() else 0
+        transcript_path.write_text(result_text, encoding="utf-8")
+        record_media_file(repo, canvas_id, transcript_path, old_size)
+        return {"from_cache": False}
+
+    if wants_ndjson(http_request):
+        # Временный файл нужен, пока идёт поток, и удаляется в его конце
+        return _stream(http_request, first, segments, finish, cleanup)
 
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Speech recognition error: {e}"
-        )
+    try:
+        result = await _collect(first, segments)
     finally:
-        wf.close()
-        # Удаляем временный файл если создавали
-        if wav_path != audio_path and wav_path.exists():
-            wav_path.unlink()
-
-    result_text = result_text.strip()
-    
-    # Сохраняем в кеш
-    file_cache.set_transcript_result(audio_path, request.lang, result_text)
-
-    # Сохраняем транскрипт в файл
-    transcript_path = transcripts_dir / f"{audio_path.stem}_transcript.txt"
-    transcript_path.write_text(result_text, encoding="utf-8")
-
-    return {"transcript": result_text, "from_cache": False}
+        cleanup()
+    extra = await asyncio.to_thread(finish, result)
+    return json_response(http_request, {"transcript": result["transcript"], "words": result["words"], **extra})
@@ -1,14 +1,16 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, status
+from fastapi import APIRouter, UploadFile, File, HTTPException, status, Depends
+from starlette.concurrency import run_in_threadpool
 from pathlib import Path
 from uuid import uuid4
 
-from backend.app.api.api_v1.deps import get_canvas_path
+from backend.app.api.api_v1.deps import Repository, get_repository, get_canvas_path, record_media_file
+from backend.app.services.image_index import image_index
 
 
 router = APIRouter()
 
 
-def save_file(canvas_id: str, file: UploadFile, subdir: str, allowed_types: list[str]) -> str:
+def save_file(repo: Repository, canvas_id: str, file: UploadFile, subdir: str, allowed_types: list[str]) -> str:
     if not any(file.content_type.startswith(t) for t in allowed_types):
         raise HTTPException(
                             status_code=status.HTTP_400_BAD_REQUEST,
@@ -26,23 +28,26 @@ def save_file(canvas_id: str, file: UploadFile, subdir: str, allowed_types: list
     with file_path.open("wb") as f:
         content = file.file.read()
         f.write(content)
+    record_media_file(repo, canvas_id, file_path)
+    # Хеш считается при загрузке, чтобы поиск похожих изображений не ждал его
+    image_index.add_file(canvas_id, f"{subdir}/{filename}", file_path)
 
     return f"{subdir}/{filename}"
 
 
 @router.post("/{canvas_id}/upload/image")
-async def upload_image(canvas_id: str, file: UploadFile = File(...)):
-    file_path = save_file(canvas_id, file, "images", ["image/"])
+async def upload_image(canvas_id: str, file: UploadFile = File(...), repo: Repository = Depends(get_repository)):
+    file_path = await run_in_threadpool(save_file, repo, canvas_id, file, "images", ["image/"])
     return {"file_path": file_path}
 
 
 @router.post("/{canvas_id}/upload/audio")
-async def upload_audio(canvas_id: str, file: UploadFile = File(...)):
-    file_path = save_file(canvas_id, file, "audio", ["audio/"])
+async def upload_audio(canvas_id: str, file: UploadFile = File(...), repo: Repository = Depends(get_repository)):
+    file_path = await run_in_threadpool(save_file, repo, canvas_id, file, "audio", ["audio/"])
     return {"file_path": file_path}
 
 
 @router.post("/{canvas_id}/upload/ocr-image")
-async def upload_ocr_image(canvas_id: str, file: UploadFile = File(...)):
-    file_path = save_file(canvas_id, file, "ocr", ["image/"])
+async def upload_ocr_image(canvas_id: str, file: UploadFile = File(...), repo: Repository = Depends(get_repository)):
+    file_path = await run_in_threadpool(save_file, repo, canvas_id, file, "ocr", ["image/"])
     return {"file_path": file_path}
\ No newline at end of file
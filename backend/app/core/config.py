@@ -0,0 +1,63 @@
+import os
+from pathlib import Path
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+def _env_list(name: str, default: str) -> set[str]:
+    return {item.strip() for item in os.getenv(name, default).split(",") if item.strip()}
+
+
+class Settings(BaseModel):
+    """Настройки приложения, читаются из переменных окружения SMARTNOTES_*"""
+
+    # Папка с канвасами; медиафайлы хранятся здесь при любом бэкенде
+    data_dir: Path = Path(os.getenv("SMARTNOTES_DATA_DIR", "data/canvases"))
+
+    # Бэкенд хранения канвасов, заметок и метаданных медиа: json, sqlite или memory
+    storage_backend: str = os.getenv("SMARTNOTES_STORAGE_BACKEND", "json")
+
+    # Файл базы данных для бэкенда sqlite
+    sqlite_path: Path = Path(os.getenv("SMARTNOTES_SQLITE_PATH", "data/smartnotes.db"))
+
+    # Сколько первых символов id канваса задают имя подпапки (0 — без шардирования)
+    shard_prefix_length: int = int(os.getenv("SMARTNOTES_SHARD_PREFIX_LENGTH", "2"))
+
+    # Сколько сегментов одной записи распознаётся параллельно
+    transcription_workers: int = int(os.getenv("SMARTNOTES_TRANSCRIPTION_WORKERS", str(os.cpu_count() or 1)))
+
+    # Сколько запросов каждого класса выполняется одновременно
+    ocr_concurrency: int = int(os.getenv("SMARTNOTES_OCR_CONCURRENCY", str(os.cpu_count() or 1)))
+    transcription_concurrency: int = int(os.getenv("SMARTNOTES_TRANSCRIPTION_CONCURRENCY", "1"))
+    upload_concurrency: int = int(os.getenv("SMARTNOTES_UPLOAD_CONCURRENCY", "8"))
+    interactive_concurrency: int = int(os.getenv("SMARTNOTES_INTERACTIVE_CONCURRENCY", "32"))
+
+    # Максимальное расстояние Хэмминга между dHash изображений, при котором
+    # результат OCR похожего изображения используется повторно (0 — только точные копии)
+    ocr_reuse_distance: int = int(os.getenv("SMARTNOTES_OCR_REUSE_DISTANCE", "4"))
+
+    # Сколько запросов может ждать в очереди на одно место; сверх этого — сразу 503
+    admission_queue_factor: int = int(os.getenv("SMARTNOTES_ADMISSION_QUEUE_FACTOR", "4"))
+
+    # Пределы импортируемого архива: защита от zip-бомб
+    import_max_size_mb: int = int(os.getenv("SMARTNOTES_IMPORT_MAX_SIZE_MB", "4096"))
+    import_max_members: int = int(os.getenv("SMARTNOTES_IMPORT_MAX_MEMBERS", "100000"))
+
+    # Включённые тяжёлые подсистемы: ocr (вместе с индексом похожих изображений),
+    # transcription, previews. Воркеру только для заметок достаточно пустого списка
+    features: set[str] = _env_list("SMARTNOTES_FEATURES", "ocr,transcription,previews")
+
+    # Загрузить библиотеки и модели включённых подсистем в фоне сразу после старта,
+    # а не при первом запросе
+    warmup: bool = os.getenv("SMARTNOTES_WARMUP", "0").lower() in ("1", "true", "yes")
+
+    # Память под сжатые ответы со списками заметок, в мегабайтах (0 — не кешировать)
+    response_cache_mb: int = int(os.getenv("SMARTNOTES_RESPONSE_CACHE_MB", "64"))
+
+    # Пути к внешним программам; если не заданы, ищутся в PATH и в стандартных местах
+    tesseract_cmd: Optional[str] = os.getenv("SMARTNOTES_TESSERACT_CMD")
+    ffmpeg_path: Optional[str] = os.getenv("SMARTNOTES_FFMPEG_PATH")
+
+
+settings = Settings()
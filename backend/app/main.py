@@ -1,11 +1,38 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 
-from backend.app.api.api_v1.api import api_router
+from backend.app.core.config import settings
+from backend.app.services.startup import startup_report, warmup
+
+with startup_report.step("api"):
+    from backend.app.api.api_v1.api import api_router
+
+from backend.app.services import media_gc
+from backend.app.services.repository import get_repository
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    with startup_report.step("repository"):
+        repo = get_repository()
+    # Фоновая сборка мусора: корзина, незавершённые импорты и неиспользуемые медиа
+    gc_task = asyncio.create_task(media_gc.run_periodically(repo))
+    # Прогрев не задерживает готовность: запросы принимаются сразу
+    tasks = [gc_task]
+    if settings.warmup:
+        tasks.append(asyncio.create_task(asyncio.to_thread(warmup, repo)))
+    startup_report.mark_ready()
+    yield
+    # Поток прогрева прервать нельзя; отмена только перестаёт его ждать
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Настройка CORS для разработки
 app.add_middleware(
@@ -16,9 +43,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Статические файлы для медиа
-app.mount("/media", StaticFiles(directory="data/canvases"), name="media")
-
 app.include_router(api_router)
 
 
@@ -14,6 +14,10 @@ class CanvasUpdate(CanvasBase):
     pass
 
 
+class CanvasClone(BaseModel):
+    name: Optional[str] = None
+
+
 class Canvas(CanvasBase):
     id: str
     created_at: datetime
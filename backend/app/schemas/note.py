@@ -1,5 +1,5 @@
-from typing import Literal, Union, Optional, List
-from pydantic import BaseModel
+from typing import Annotated, Literal, Union, Optional, List
+from pydantic import BaseModel, Field
 from datetime import datetime
 
 
@@ -60,3 +60,35 @@ class DrawingNote(DrawingNoteCreate):
 
 NoteCreate = Union[TextNoteCreate, ImageNoteCreate, AudioNoteCreate, DrawingNoteCreate]
 Note = Union[TextNote, ImageNote, AudioNote, DrawingNote]
+
+
+class NoteBatchCreate(BaseModel):
+    op: Literal["create"]
+    note: NoteCreate
+
+
+class NoteBatchUpdate(BaseModel):
+    op: Literal["update"]
+    id: str
+    note: NoteCreate
+
+
+class NoteBatchDelete(BaseModel):
+    op: Literal["delete"]
+    id: str
+
+
+NoteBatchOperation = Annotated[
+    Union[NoteBatchCreate, NoteBatchUpdate, NoteBatchDelete],
+    Field(discriminator="op")
+]
+
+
+class NoteBatch(BaseModel):
+    operations: List[NoteBatchOperation]
+
+
+class NoteBatchResult(BaseModel):
+    op: Literal["create", "update", "delete"]
+    id: str
+    note: Optional[Note] = None
@@ -0,0 +1,136 @@
+import asyncio
+import math
+import os
+import sys
+import threading
+import time
+from collections import deque
+from typing import Dict
+
+from backend.app.core.config import settings
+
+
+# На сколько понижается приоритет потоков тяжёлой работы (nice в Linux);
+# процессы tesseract и ffmpeg, запущенные из этих потоков, наследуют его
+BACKGROUND_NICE = 10
+
+
+class AdmissionRejected(Exception):
+    """Очередь класса запросов заполнена"""
+
+    def __init__(self, name: str, retry_after: int):
+        super().__init__(f"Too many {name} requests")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class Limiter:
+    """Ограничение числа одновременных запросов одного класса с ограниченной очередью.
+
+    Используется только из event loop, поэтому обходится без блокировок.
+    """
+
+    def __init__(self, name: str, limit: int, queue_size: int):
+        self.name = name
+        self.limit = max(1, limit)
+        self.queue_size = max(0, queue_size)
+        self._active = 0
+        self._waiters: deque[asyncio.Future] = deque()
+
+        self.admitted = 0
+        self.rejected = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        # Скользящее среднее времени обработки одного запроса, секунды
+        self._service_time = 1.0
+
+    def retry_after(self) -> int:
+        """Через сколько секунд примерно освободится место в очереди"""
+        backlog = (len(self._waiters) + 1) / self.limit
+        return max(1, math.ceil(backlog * self._service_time))
+
+    async def acquire(self):
+        if self._active < self.limit and not self._waiters:
+            self._active += 1
+            self.admitted += 1
+            return
+
+        if len(self._waiters) >= self.queue_size:
+            self.rejected += 1
+            raise AdmissionRejected(self.name, self.retry_after())
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        started = time.monotonic()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Место уже передано этому запросу — отдаём его следующему
+                self._hand_over()
+            else:
+                self._waiters.remove(waiter)
+            raise
+
+        waited = time.monotonic() - started
+        self.admitted += 1
+        self._wait_total += waited
+        self._wait_max = max(self._wait_max, waited)
+
+    def release(self, service_time: float):
+        self._service_time = 0.8 * self._service_time + 0.2 * service_time
+        self._hand_over()
+
+    def _hand_over(self):
+        # Место переходит первому ожидающему, счётчик занятых мест не меняется
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self._active -= 1
+
+    def get_stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "active": self._active,
+            "queued": len(self._waiters),
+            "queue_size": self.queue_size,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "avg_wait_ms": round(1000 * self._wait_total / self.admitted, 1) if self.admitted else 0.0,
+            "max_wait_ms": round(1000 * self._wait_max, 1),
+            "avg_service_ms": round(1000 * self._service_time, 1),
+        }
+
+
+def _make_limiter(name: str, limit: int) -> Limiter:
+    return Limiter(name, limit, limit * settings.admission_queue_factor)
+
+
+# Интерактивные запросы идут отдельной полосой и не ждут мест за OCR и транскрипцией
+limiters: Dict[str, Limiter] = {
+    "interactive": _make_limiter("interactive", settings.interactive_concurrency),
+    "upload": _make_limiter("upload", settings.upload_concurrency),
+    "ocr": _make_limiter("ocr", settings.ocr_concurrency),
+    "transcription": _make_limiter("transcription", settings.transcription_concurrency),
+}
+
+
+def lower_thread_priority():
+    """Понизить приоритет текущего потока, чтобы тяжёлая работа не вытесняла интерактивные запросы.
+
+    Используется как initializer пулов потоков. В Linux nice задаётся для
+    отдельного потока; на других системах он относится ко всему процессу,
+    поэтому там ничего не делаем.
+    """
+    if not sys.platform.startswith("linux"):
+        return
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), BACKGROUND_NICE)
+    except OSError:
+        pass
+
+
+def get_admission_stats() -> dict:
+    return {name: limiter.get_stats() for name, limiter in limiters.items()}
@@ -1,8 +1,14 @@
+from collections import OrderedDict
 from typing import Dict, Optional
 from pathlib import Path
 import hashlib
+import threading
 import time
 
+
+# Сколько хешей файлов помнить; самые давно использованные вытесняются
+HASH_MEMO_SIZE = 4096
+
 class FileProcessingCache:
     """Кеш для результатов обработки файлов (OCR и транскрипции)"""
     
@@ -13,20 +19,46 @@ class FileProcessingCache:
         # Кеш для транскрипций: {file_hash: {"transcript": str, "timestamp": float, "lang": str}}
         self._transcript_cache: Dict[str, Dict] = {}
         
+        # Кеш для сегментов длинных записей: {file_hash_lang_start_frames: {"result": dict, "timestamp": float}}
+        self._segment_cache: Dict[str, Dict] = {}
+        
+        # Хеши уже прочитанных файлов: {(path, mtime_ns, size): file_hash}, LRU
+        self._hash_memo: "OrderedDict[tuple, str]" = OrderedDict()
+        self._hash_memo_lock = threading.Lock()
+        
         # Время жизни кеша в секундах (24 часа)
         self._cache_ttl = 24 * 60 * 60
     
     def _get_file_hash(self, file_path: Path) -> str:
         """Получить хеш файла для использования в качестве ключа кеша"""
         try:
+            stat = file_path.stat()
+            memo_key = (str(file_path), stat.st_mtime_ns, stat.st_size)
+            with self._hash_memo_lock:
+                if memo_key in self._hash_memo:
+                    self._hash_memo.move_to_end(memo_key)
+                    return self._hash_memo[memo_key]
+            
+            # Читаем порциями, чтобы не держать в памяти длинные записи целиком
+            md5 = hashlib.md5()
             with open(file_path, 'rb') as f:
-                file_hash = hashlib.md5(f.read()).hexdigest()
-            return f"{file_path.name}_{file_hash}"
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    md5.update(chunk)
+            file_hash = f"{file_path.name}_{md5.hexdigest()}"
+            with self._hash_memo_lock:
+                self._hash_memo[memo_key] = file_hash
+                while len(self._hash_memo) > HASH_MEMO_SIZE:
+                    self._hash_memo.popitem(last=False)
+            return file_hash
         except Exception:
             # Если не можем прочитать файл, используем путь + время модификации
             stat = file_path.stat()
             return f"{file_path.name}_{stat.st_mtime}_{stat.st_size}"
     
+    def get_file_key(self, file_path: Path) -> str:
+        """Получить ключ файла для кешей, которые заполняются по частям"""
+        return self._get_file_hash(file_path)
+    
     def _is_cache_valid(self, cache_entry: Dict) -> bool:
         """Проверить валидность записи кеша"""
         return (time.time() - cache_entry.get("timestamp", 0)) < self._cache_ttl
@@ -85,6 +117,29 @@ class FileProcessingCache:
             "file_path": str(file_path)
         }
     
+    def get_segment_result(self, file_key: str, lang: str, start_frame: int, nframes: int) -> Optional[Dict]:
+        """Получить результат распознавания сегмента записи из кеша"""
+        cache_key = f"{file_key}_{lang}_{start_frame}_{nframes}"
+        
+        if cache_key in self._segment_cache:
+            entry = self._segment_cache[cache_key]
+            if self._is_cache_valid(entry):
+                return entry["result"]
+            else:
+                del self._segment_cache[cache_key]
+        
+        return None
+    
+    def set_segment_result(self, file_key: str, lang: str, start_frame: int, nframes: int, result: Dict):
+        """Сохранить результат распознавания сегмента записи в кеш"""
+        cache_key = f"{file_key}_{lang}_{start_frame}_{nframes}"
+        
+        self._segment_cache[cache_key] = {
+            "result": result,
+            "timestamp": time.time(),
+            "lang": lang,
+        }
+    
     def clear_expired_entries(self):
         """Очистить устаревшие записи из кеша"""
         current_time = time.time()
@@ -104,13 +159,23 @@ class FileProcessingCache:
         ]
         for key in expired_transcript:
             del self._transcript_cache[key]
+        
+        # Очищаем кеш сегментов
+        expired_segments = [
+            key for key, entry in self._segment_cache.items()
+            if (current_time - entry.get("timestamp", 0)) >= self._cache_ttl
+        ]
+        for key in expired_segments:
+            del self._segment_cache[key]
     
     def get_cache_stats(self) -> Dict:
         """Получить статистику кеша"""
         return {
             "ocr_entries": len(self._ocr_cache),
             "transcript_entries": len(self._transcript_cache),
-            "total_entries": len(self._ocr_cache) + len(self._transcript_cache)
+            "segment_entries": len(self._segment_cache),
+            "total_entries": len(self._ocr_cache) + len(self._transcript_cache) + len(self._segment_cache),
+            "hash_memo_entries": len(self._hash_memo)
         }
 
 
@@ -0,0 +1,243 @@
+import os
+import json
+import shutil
+import zipfile
+import zlib
+from pathlib import Path
+from typing import BinaryIO, Iterator, Optional
+
+from pydantic import TypeAdapter, ValidationError
+
+from backend.app.core.config import settings
+from backend.app.schemas.note import Note
+from backend.app.services import storage
+from backend.app.services.lod_store import LOD_DIR, lod_store
+from backend.app.services.repository import Repository
+
+
+# Размер порции при копировании файлов: память не зависит от размера канваса
+CHUNK_SIZE = 1024 * 1024
+
+# Файлы в этих папках после записи не изменяются, поэтому клон может
+# разделять их с исходным канвасом. Транскрипты перезаписываются на месте
+# и всегда копируются.
+SHARED_FOLDERS = ["images", "audio", "drawings", "ocr"]
+
+_COMPRESSED_SUFFIXES = {".json", ".txt"}
+
+_note_adapter = TypeAdapter(Note)
+
+
+class ArchiveError(Exception):
+    """Ошибка валидации импортируемого архива"""
+
+
+class _ChunkSink:
+    """Неперематываемый приёмник для ZipFile, отдающий записанные байты порциями"""
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_canvas_archive(repo: Repository, canvas_id: str) -> Iterator[bytes]:
+    """Отдать zip-архив канваса порциями, не собирая его в памяти"""
+    meta = repo.get_canvas_meta(canvas_id) or {}
+    notes = repo.list_notes(canvas_id)
+    sink = _ChunkSink()
+
+    with zipfile.ZipFile(sink, "w") as zf:
+        zf.writestr("meta.json", json.dumps(meta), zipfile.ZIP_DEFLATED)
+        zf.writestr("notes.json", json.dumps(notes, ensure_ascii=False, indent=2), zipfile.ZIP_DEFLATED)
+        del notes
+        yield sink.drain()
+
+        for path, arcname in storage.iter_media_files(storage.get_canvas_path(canvas_id)):
+            zinfo = zipfile.ZipInfo.from_file(path, arcname)
+            if path.suffix.lower() in _COMPRESSED_SUFFIXES:
+                zinfo.compress_type = zipfile.ZIP_DEFLATED
+
+            with path.open("rb") as src, zf.open(zinfo, "w") as dest:
+                while chunk := src.read(CHUNK_SIZE):
+                    dest.write(chunk)
+                    data = sink.drain()
+                    if data:
+                        yield data
+
+            data = sink.drain()
+            if data:
+                yield data
+
+    yield sink.drain()
+
+
+def _member_parts(name: str) -> tuple[str, ...]:
+    """Проверить имя элемента архива и разбить его на части пути"""
+    if name.startswith("/") or "\\" in name:
+        raise ArchiveError(f"Invalid archive entry: {name}")
+
+    parts = tuple(name.split("/"))
+    if any(part in ("", ".", "..") for part in parts):
+        raise ArchiveError(f"Invalid archive entry: {name}")
+
+    if parts in (("meta.json",), ("notes.json",)):
+        return parts
+    if len(parts) == 2 and parts[0] in storage.MEDIA_FOLDERS:
+        return parts
+    raise ArchiveError(f"Unexpected archive entry: {name}")
+
+
+def _read_notes(zf: zipfile.ZipFile, info: zipfile.ZipInfo) -> list[dict]:
+    try:
+        with zf.open(info) as f:
+            notes = json.load(f)
+    except ValueError:
+        raise ArchiveError("notes.json is not valid JSON")
+
+    if not isinstance(notes, list):
+        raise ArchiveError("notes.json must contain a list")
+
+    note_ids = set()
+    for note in notes:
+        try:
+            _note_adapter.validate_python(note)
+        except ValidationError:
+            note_id = note.get("id") if isinstance(note, dict) else None
+            raise ArchiveError(f"Invalid note in archive: {note_id}")
+        # Хранилища по-разному обошлись бы с повторами: ошибкой записи, потерей заметки или дублем
+        if note["id"] in note_ids:
+            raise ArchiveError(f"Duplicate note id in archive: {note['id']}")
+        note_ids.add(note["id"])
+    return notes
+
+
+def _read_meta(zf: zipfile.ZipFile, info: zipfile.ZipInfo) -> dict:
+    try:
+        with zf.open(info) as f:
+            meta = json.load(f)
+    except ValueError:
+        raise ArchiveError("meta.json is not valid JSON")
+
+    if not isinstance(meta, dict):
+        raise ArchiveError("meta.json must contain an object")
+    return meta
+
+
+def _check_limits(zf: zipfile.ZipFile):
+    """Отклонить архив со слишком многими или слишком большими элементами.
+
+    zipfile не распаковывает элемент дальше объявленного в архиве размера,
+    поэтому суммы объявленных размеров достаточно против zip-бомб.
+    """
+    infolist = zf.infolist()
+    if len(infolist) > settings.import_max_members:
+        raise ArchiveError(f"Archive has more than {settings.import_max_members} entries")
+    if sum(info.file_size for info in infolist) > settings.import_max_size_mb * 1024 * 1024:
+        raise ArchiveError(f"Archive is larger than {settings.import_max_size_mb} MB uncompressed")
+
+
+def import_canvas_archive(repo: Repository, fileobj: BinaryIO, name: Optional[str] = None) -> dict:
+    """Импортировать канвас из zip-архива, проверяя и записывая элементы по одному"""
+    try:
+        zf = zipfile.ZipFile(fileobj)
+    except zipfile.BadZipFile:
+        raise ArchiveError("Invalid zip archive")
+
+    staging = storage.new_staging_dir()
+    try:
+        with zf:
+            _check_limits(zf)
+            meta = None
+            notes = None
+            try:
+                for info in zf.infolist():
+                    if info.is_dir():
+                        continue
+
+                    parts = _member_parts(info.filename)
+                    if parts == ("meta.json",):
+                        meta = _read_meta(zf, info)
+                    elif parts == ("notes.json",):
+                        notes = _read_notes(zf, info)
+                    else:
+                        with zf.open(info) as src, staging.joinpath(*parts).open("wb") as dst:
+                            shutil.copyfileobj(src, dst, CHUNK_SIZE)
+            except (zipfile.BadZipFile, zlib.error, EOFError, NotImplementedError) as e:
+                # Повреждённый элемент: неверная CRC, обрезанные данные, неизвестное сжатие
+                raise ArchiveError(f"Corrupt zip archive: {e}")
+
+        if meta is None:
+            raise ArchiveError("meta.json is missing")
+
+        # Уровни детализации рисунков в архив не попадают и считаются при импорте
+        lod_store.precompute_staging(staging, notes or [])
+
+        return repo.create_canvas(name or meta.get("name") or "Imported canvas", notes or [], staging)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+
+def _reflink(src: Path, dst: Path) -> bool:
+    """Попытаться создать copy-on-write копию файла (btrfs, xfs)"""
+    try:
+        import fcntl
+    except ImportError:
+        return False
+
+    FICLONE = 0x40049409
+    try:
+        with src.open("rb") as s, dst.open("wb") as d:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        return True
+    except OSError:
+        dst.unlink(missing_ok=True)
+        return False
+
+
+def _share_file(src: Path, dst: Path):
+    try:
+        os.link(src, dst)
+    except OSError:
+        if not _reflink(src, dst):
+            shutil.copy2(src, dst)
+
+
+def clone_canvas(repo: Repository, canvas_id: str, name: Optional[str] = None) -> dict | None:
+    """Клонировать канвас, разделяя неизменяемые медиафайлы с исходным"""
+    meta = repo.get_canvas_meta(canvas_id)
+    if meta is None:
+        return None
+
+    staging = storage.new_staging_dir()
+    try:
+        for path, arcname in storage.iter_media_files(storage.get_canvas_path(canvas_id)):
+            target = staging / arcname
+            if path.parent.name in SHARED_FOLDERS:
+                _share_file(path, target)
+            else:
+                shutil.copy2(path, target)
+
+        # Уровни детализации неизменяемы и называются по содержимому рисунка
+        lod_dir = storage.get_canvas_path(canvas_id) / LOD_DIR
+        if lod_dir.is_dir():
+            (staging / LOD_DIR).mkdir()
+            for entry in os.scandir(lod_dir):
+                if entry.name.endswith(".json"):
+                    _share_file(Path(entry.path), staging / LOD_DIR / entry.name)
+
+        return repo.create_canvas(name or f"{meta['name']} (copy)", repo.list_notes(canvas_id), staging)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
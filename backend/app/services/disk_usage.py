@@ -0,0 +1,67 @@
+import os
+import threading
+from typing import Dict
+
+from backend.app.services import storage
+
+
+class DiskUsageTracker:
+    """Инкрементальный учёт места на диске, занятого канвасами.
+
+    Размер канваса считается обходом его папки один раз при первом запросе,
+    дальше он поддерживается вызовами add() из кода, который пишет или удаляет
+    файлы. Учитывается видимый размер файлов: медиа, разделённые клонами через
+    жёсткие ссылки, засчитываются каждому канвасу.
+    """
+
+    def __init__(self):
+        # {canvas_id: bytes}
+        self._usage: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _scan(self, canvas_id: str) -> int:
+        total = 0
+        for root, _, files in os.walk(storage.get_canvas_path(canvas_id)):
+            for name in files:
+                try:
+                    total += os.stat(os.path.join(root, name)).st_size
+                except FileNotFoundError:
+                    pass
+        return total
+
+    def get_canvas_usage(self, canvas_id: str) -> int:
+        """Получить размер канваса в байтах"""
+        with self._lock:
+            if canvas_id in self._usage:
+                return self._usage[canvas_id]
+
+        size = self._scan(canvas_id)
+        with self._lock:
+            return self._usage.setdefault(canvas_id, size)
+
+    def add(self, canvas_id: str, delta: int):
+        """Учесть изменение размера канваса на delta байт"""
+        with self._lock:
+            # Ещё не посчитанный канвас будет просканирован целиком при первом запросе
+            if canvas_id in self._usage:
+                self._usage[canvas_id] += delta
+
+    def forget(self, canvas_id: str):
+        """Забыть размер удалённого канваса"""
+        with self._lock:
+            self._usage.pop(canvas_id, None)
+
+    def get_total_usage(self, canvas_ids: list[str]) -> Dict:
+        """Получить размер канвасов и их сумму"""
+        canvases = {
+            canvas_id: self.get_canvas_usage(canvas_id)
+            for canvas_id in canvas_ids
+        }
+        return {
+            "total_bytes": sum(canvases.values()),
+            "canvases": canvases,
+        }
+
+
+# Глобальный экземпляр счётчика
+disk_usage = DiskUsageTracker()
@@ -0,0 +1,191 @@
+from itertools import accumulate
+from typing import Callable, Iterator, Optional
+
+
+# Ключи drawing_data со списками штрихов. README описывает формат
+# {"paths": [...], "colors": [...], "tools": [...]}, также понимается {"strokes": [...]}
+STROKE_KEYS = ("strokes", "paths")
+
+# Допустимые отклонения уровней детализации в единицах канваса, от точного к грубому
+LOD_TOLERANCES = (1.0, 4.0, 16.0)
+
+# Уровень сохраняется, только если в нём заметно меньше точек, чем в предыдущем
+LOD_MIN_REDUCTION = 0.7
+
+# Отклонение в пикселях экрана, которое незаметно при просмотре
+LOD_SCREEN_TOLERANCE = 0.5
+
+
+def _point(value) -> Optional[tuple[float, float]]:
+    if isinstance(value, dict):
+        value = (value.get("x"), value.get("y"))
+    if isinstance(value, (list, tuple)) and len(value) >= 2:
+        try:
+            return float(value[0]), float(value[1])
+        except (TypeError, ValueError):
+            return None
+    return None
+
+
+def _stroke_lists(drawing_data: dict) -> Iterator[tuple[str, int, list]]:
+    """Перебрать штрихи: (ключ drawing_data, номер штриха, штрих)"""
+    if not isinstance(drawing_data, dict):
+        return
+    for key in STROKE_KEYS:
+        strokes = drawing_data.get(key)
+        if isinstance(strokes, list):
+            for i, stroke in enumerate(strokes):
+                yield key, i, stroke
+
+
+def _raw_points(stroke) -> Optional[list]:
+    raw_points = stroke.get("points") if isinstance(stroke, dict) else stroke
+    return raw_points if isinstance(raw_points, list) else None
+
+
+def iter_strokes(drawing_data: dict) -> Iterator[dict]:
+    """Перебрать штрихи рисунка в едином виде: {"points": [(x, y)], "color", "width"}.
+
+    Штрих — список точек или {"points": [...], "color": ..., "width": ...};
+    точки — списки [x, y] или {"x", "y"}. Для "paths" цвет может лежать
+    в параллельном списке "colors". Координаты отсчитываются от левого
+    верхнего угла заметки.
+    """
+    for key, i, stroke in _stroke_lists(drawing_data):
+        raw_points = _raw_points(stroke)
+        if raw_points is None:
+            continue
+
+        color = width = None
+        if isinstance(stroke, dict):
+            color, width = stroke.get("color"), stroke.get("width")
+        colors = drawing_data.get("colors")
+        if color is None and key == "paths" and isinstance(colors, list) and i < len(colors):
+            color = colors[i]
+
+        points = [p for p in map(_point, raw_points) if p is not None]
+        if points:
+            yield {"points": points, "color": color, "width": width}
+
+
+def simplify_points(points: list[tuple[float, float]], tolerance: float) -> list[int]:
+    """Индексы точек ломаной, оставшихся после упрощения Рамера — Дугласа — Пекера.
+
+    Рекурсия заменена стеком, чтобы длинные штрихи не упирались в глубину рекурсии.
+    """
+    n = len(points)
+    if n < 3:
+        return list(range(n))
+
+    keep = [False] * n
+    keep[0] = keep[-1] = True
+    tolerance_sq = tolerance * tolerance
+    stack = [(0, n - 1)]
+
+    while stack:
+        first, last = stack.pop()
+        x1, y1 = points[first]
+        dx = points[last][0] - x1
+        dy = points[last][1] - y1
+        norm = dx * dx + dy * dy
+
+        max_dist_sq = -1.0
+        index = first
+        for i in range(first + 1, last):
+            px = points[i][0] - x1
+            py = points[i][1] - y1
+            if norm:
+                cross = dx * py - dy * px
+                dist_sq = cross * cross / norm
+            else:
+                dist_sq = px * px + py * py
+            if dist_sq > max_dist_sq:
+                max_dist_sq = dist_sq
+                index = i
+
+        if max_dist_sq > tolerance_sq:
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+
+    return [i for i in range(n) if keep[i]]
+
+
+def _map_strokes(drawing_data: dict, func: Callable[[list], list]) -> dict:
+    """Копия drawing_data, в которой списки точек штрихов заменены на func(список)"""
+    result = dict(drawing_data)
+    for key in STROKE_KEYS:
+        strokes = drawing_data.get(key)
+        if not isinstance(strokes, list):
+            continue
+        new_strokes = []
+        for stroke in strokes:
+            raw_points = _raw_points(stroke)
+            if raw_points is None:
+                new_strokes.append(stroke)
+            elif isinstance(stroke, dict):
+                new_strokes.append({**stroke, "points": func(raw_points)})
+            else:
+                new_strokes.append(func(raw_points))
+        result[key] = new_strokes
+    return result
+
+
+def count_points(drawing_data: dict) -> int:
+    return sum(len(_raw_points(stroke) or ()) for _, _, stroke in _stroke_lists(drawing_data))
+
+
+def simplify_drawing(drawing_data: dict, tolerance: float) -> dict:
+    """Упростить все штрихи рисунка, сохраняя формат точек"""
+    def simplify(raw_points: list) -> list:
+        points = [_point(p) for p in raw_points]
+        if any(p is None for p in points):
+            return raw_points
+        return [raw_points[i] for i in simplify_points(points, tolerance)]
+
+    return _map_strokes(drawing_data, simplify)
+
+
+def build_lod(drawing_data: dict) -> list[dict]:
+    """Посчитать уровни детализации рисунка: [{"tolerance", "points", "drawing_data"}].
+
+    Каждый уровень упрощается из предыдущего, поэтому отклонения складываются;
+    в "tolerance" записана их сумма — гарантированная граница отклонения.
+    """
+    tiers = []
+    current = drawing_data
+    current_points = count_points(drawing_data)
+    bound = 0.0
+
+    for tolerance in LOD_TOLERANCES:
+        if current_points < 3:
+            break
+        simplified = simplify_drawing(current, tolerance)
+        bound += tolerance
+        points = count_points(simplified)
+        if points <= current_points * LOD_MIN_REDUCTION:
+            tiers.append({"tolerance": bound, "points": points, "drawing_data": simplified})
+            current, current_points = simplified, points
+
+    return tiers
+
+
+def select_tier(tiers: list[dict], drawing_data: Optional[dict], tolerance: float) -> Optional[dict]:
+    """Самый грубый из уровней с отклонением не больше tolerance; если такого нет — исходный рисунок"""
+    for tier in tiers:
+        if tier["tolerance"] > tolerance:
+            break
+        drawing_data = tier["drawing_data"]
+    return drawing_data
+
+
+def lod_level(tolerance: Optional[float]) -> int:
+    """Сколько уровней детализации допускает отклонение tolerance.
+
+    Границы уровней в build_lod — накопленные суммы LOD_TOLERANCES, поэтому
+    при одинаковом lod_level select_tier выбирает один и тот же уровень;
+    0 — рисунки отдаются без упрощения.
+    """
+    if tolerance is None:
+        return 0
+    return sum(1 for bound in accumulate(LOD_TOLERANCES) if bound <= tolerance)
@@ -0,0 +1,263 @@
+import json
+import logging
+import os
+import threading
+from itertools import combinations
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Optional
+
+from backend.app.core.config import settings
+from backend.app.services import storage
+from backend.app.services.admission import lower_thread_priority
+
+
+logger = logging.getLogger(__name__)
+
+
+# Папки канваса, изображения из которых попадают в индекс
+IMAGE_FOLDERS = ["images", "ocr"]
+
+# Файл канваса с сохранёнными хешами: {file_path: hex}
+HASHES_FILE = "image_hashes.json"
+
+HASH_BITS = 64
+# 64-битный хеш делится на BLOCKS частей; при расстоянии d хотя бы одна часть
+# отличается не больше чем на d // BLOCKS бит (принцип Дирихле)
+BLOCKS = 4
+BLOCK_BITS = HASH_BITS // BLOCKS
+BLOCK_MASK = (1 << BLOCK_BITS) - 1
+
+
+def dhash(path: Path) -> Optional[int]:
+    """Разностный хеш изображения (dHash, 64 бита); None, если файл не изображение.
+
+    Картинка уменьшается до 9x8 в оттенках серого, бит равен 1, если пиксель
+    ярче правого соседа. Хеш почти не меняется при пересжатии и смене разрешения.
+    """
+    from PIL import Image
+
+    try:
+        with Image.open(path) as image:
+            # Для JPEG декодируется сразу уменьшенная копия
+            image.draft("L", (64, 64))
+            pixels = list(image.convert("L").resize((9, 8), Image.Resampling.BOX).getdata())
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            value = (value << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return value
+
+
+def _blocks(value: int) -> list[int]:
+    return [(value >> (i * BLOCK_BITS)) & BLOCK_MASK for i in range(BLOCKS)]
+
+
+def _neighbours(block: int, radius: int) -> Iterable[int]:
+    """Все значения части хеша на расстоянии не больше radius бит"""
+    yield block
+    for flips in range(1, radius + 1):
+        for bits in combinations(range(BLOCK_BITS), flips):
+            mask = 0
+            for bit in bits:
+                mask |= 1 << bit
+            yield block ^ mask
+
+
+class ImageHashIndex:
+    """Индекс перцептивных хешей изображений всех канвасов (multi-index hashing).
+
+    Каждая из BLOCKS частей хеша служит ключом своей хеш-таблицы, поэтому поиск
+    соседей на расстоянии до 2 * BLOCKS - 1 бит просматривает только кандидатов,
+    совпавших с запросом почти целиком хотя бы в одной части, а не весь индекс.
+
+    Хеши сохраняются в image_hashes.json в папке канваса. Канвас загружается
+    в память при первом обращении к нему; все канвасы сразу — один раз на процесс
+    в фоновом потоке (start_loading), до тех пор поиск видит только загруженные.
+    """
+
+    def __init__(self):
+        # {(canvas_id, file_path): hash}
+        self._hashes: Dict[tuple[str, str], int] = {}
+        # {canvas_id: {file_path: hash}}
+        self._by_canvas: Dict[str, Dict[str, int]] = {}
+        # Для каждой части: {значение части: {(canvas_id, file_path)}}
+        self._tables: list[Dict[int, set]] = [{} for _ in range(BLOCKS)]
+        self._loaded: set[str] = set()
+        self._loader: Optional[threading.Thread] = None
+        self._lock = threading.RLock()
+
+    def _insert(self, key: tuple[str, str], value: int):
+        self._discard(key)
+        self._hashes[key] = value
+        self._by_canvas.setdefault(key[0], {})[key[1]] = value
+        for table, block in zip(self._tables, _blocks(value)):
+            table.setdefault(block, set()).add(key)
+
+    def _discard(self, key: tuple[str, str]):
+        value = self._hashes.pop(key, None)
+        if value is None:
+            return
+        self._by_canvas[key[0]].pop(key[1], None)
+        for table, block in zip(self._tables, _blocks(value)):
+            bucket = table.get(block)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del table[block]
+
+    def _save_canvas(self, canvas_id: str):
+        hashes = {
+            file_path: f"{value:016x}"
+            for file_path, value in self._by_canvas.get(canvas_id, {}).items()
+        }
+        path = storage.get_canvas_path(canvas_id) / HASHES_FILE
+        if not path.parent.is_dir():
+            return
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(hashes, f)
+        os.replace(tmp_path, path)
+
+    def load_canvas(self, canvas_id: str):
+        """Загрузить хеши канваса в индекс, досчитав недостающие"""
+        with self._lock:
+            if canvas_id in self._loaded:
+                return
+
+        # Изображения читаются без блокировки, чтобы поиск и загрузки не ждали
+        canvas_dir = storage.get_canvas_path(canvas_id)
+        try:
+            with open(canvas_dir / HASHES_FILE, encoding="utf-8") as f:
+                saved = json.load(f)
+        except (FileNotFoundError, ValueError):
+            saved = {}
+
+        hashes = {}
+        for path, file_path in storage.iter_media_files(canvas_dir):
+            if file_path.split("/", 1)[0] not in IMAGE_FOLDERS:
+                continue
+            if file_path in saved:
+                hashes[file_path] = int(saved[file_path], 16)
+                continue
+            value = dhash(path)
+            if value is not None:
+                hashes[file_path] = value
+
+        with self._lock:
+            if canvas_id in self._loaded:
+                # Канвас успел загрузить другой поток
+                return
+            for file_path, value in hashes.items():
+                self._insert((canvas_id, file_path), value)
+            self._loaded.add(canvas_id)
+            if hashes.keys() != saved.keys():
+                self._save_canvas(canvas_id)
+
+    def load_all(self, canvas_ids: Iterable[str]):
+        for canvas_id in canvas_ids:
+            self.load_canvas(canvas_id)
+
+    def _load_in_background(self, list_canvases: Callable[[], Iterable[str]]):
+        lower_thread_priority()
+        try:
+            self.load_all(list_canvases())
+        except Exception:
+            logger.exception("Failed to load image index")
+
+    def start_loading(self, list_canvases: Callable[[], Iterable[str]]) -> threading.Thread:
+        """Загрузить все канвасы в фоновом потоке; повторные вызовы возвращают тот же поток"""
+        with self._lock:
+            if self._loader is None:
+                self._loader = threading.Thread(
+                    target=self._load_in_background, args=(list_canvases,), name="image-index", daemon=True
+                )
+                self._loader.start()
+            return self._loader
+
+    def add_file(self, canvas_id: str, file_path: str, path: Path) -> Optional[int]:
+        """Посчитать хеш загруженного изображения и добавить его в индекс"""
+        # Индекс похожих изображений входит в подсистему OCR
+        if "ocr" not in settings.features or file_path.split("/", 1)[0] not in IMAGE_FOLDERS:
+            return None
+        value = dhash(path)
+        if value is None:
+            return None
+        self.load_canvas(canvas_id)
+        with self._lock:
+            self._insert((canvas_id, file_path), value)
+            self._save_canvas(canvas_id)
+        return value
+
+    def get_hash(self, canvas_id: str, file_path: str) -> Optional[int]:
+        self.load_canvas(canvas_id)
+        with self._lock:
+            return self._hashes.get((canvas_id, file_path))
+
+    def remove_file(self, canvas_id: str, file_path: str):
+        with self._lock:
+            if canvas_id not in self._loaded:
+                return
+            if (canvas_id, file_path) in self._hashes:
+                self._discard((canvas_id, file_path))
+                self._save_canvas(canvas_id)
+
+    def forget_canvas(self, canvas_id: str):
+        """Убрать из индекса удалённый канвас"""
+        with self._lock:
+            for file_path in list(self._by_canvas.get(canvas_id, {})):
+                self._discard((canvas_id, file_path))
+            self._by_canvas.pop(canvas_id, None)
+            self._loaded.discard(canvas_id)
+
+    def search(self, value: int, max_distance: int, canvas_id: Optional[str] = None) -> list[tuple[int, str, str]]:
+        """Найти изображения на расстоянии Хэмминга не больше max_distance.
+
+        Возвращает [(расстояние, canvas_id, file_path)] по возрастанию расстояния.
+        """
+        radius = max_distance // BLOCKS
+        found = {}
+        with self._lock:
+            for table, block in zip(self._tables, _blocks(value)):
+                for candidate in _neighbours(block, radius):
+                    for key in table.get(candidate, ()):
+                        if key in found or (canvas_id is not None and key[0] != canvas_id):
+                            continue
+                        distance = bin(self._hashes[key] ^ value).count("1")
+                        if distance <= max_distance:
+                            found[key] = distance
+        return sorted((distance, key[0], key[1]) for key, distance in found.items())
+
+    def find_duplicates(self, canvas_id: str, max_distance: int) -> list[list[str]]:
+        """Сгруппировать похожие изображения канваса; одиночные не возвращаются"""
+        self.load_canvas(canvas_id)
+        with self._lock:
+            file_paths = sorted(self._by_canvas.get(canvas_id, {}))
+            parent = {file_path: file_path for file_path in file_paths}
+
+            def find(item: str) -> str:
+                while parent[item] != item:
+                    parent[item] = parent[parent[item]]
+                    item = parent[item]
+                return item
+
+            for file_path in file_paths:
+                value = self._hashes[(canvas_id, file_path)]
+                for _, _, other in self.search(value, max_distance, canvas_id):
+                    root_a, root_b = find(file_path), find(other)
+                    if root_a != root_b:
+                        parent[max(root_a, root_b)] = min(root_a, root_b)
+
+        groups: Dict[str, list[str]] = {}
+        for file_path in file_paths:
+            groups.setdefault(find(file_path), []).append(file_path)
+        return [group for group in groups.values() if len(group) > 1]
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+
+# Глобальный экземпляр
+image_index = ImageHashIndex()
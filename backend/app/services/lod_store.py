@@ -0,0 +1,169 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Iterable, Optional
+
+from backend.app.services import storage
+from backend.app.services.disk_usage import disk_usage
+from backend.app.services.drawing import build_lod, select_tier
+
+
+# Папка канваса с уровнями детализации рисунков: lod/<дайджест drawing_data>.json
+LOD_DIR = "lod"
+
+# Сколько точек всех уровней детализации держится в памяти
+LOD_CACHE_POINTS = 2_000_000
+
+# Сколько дайджестов рисунков запоминается, чтобы не хешировать рисунок при каждом чтении
+DIGEST_MEMO_SIZE = 65536
+
+
+def is_drawing(note_dict: dict) -> bool:
+    return note_dict.get("type") == "drawing" and isinstance(note_dict.get("drawing_data"), dict)
+
+
+def drawing_digest(drawing_data: dict) -> str:
+    """Дайджест содержимого рисунка: одинаковые рисунки делят уровни детализации"""
+    data = json.dumps(drawing_data, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+
+class LodStore:
+    """Уровни детализации рисунков, посчитанные при записи заметок.
+
+    Уровни лежат в папке канваса в файлах по дайджесту drawing_data, поэтому
+    переживают перезапуск и не пересчитываются, пока не изменится сам рисунок:
+    перемещение или изменение размера заметки их не затрагивает. Недавно
+    прочитанные уровни держатся в LRU-кеше, ограниченном числом точек.
+    """
+
+    def __init__(self, max_points: int):
+        self._max_points = max_points
+        # {дайджест: (число точек, уровни)}
+        self._tiers: "OrderedDict[str, tuple[int, list[dict]]]" = OrderedDict()
+        self._points = 0
+        # {(canvas_id, id заметки, updated_at): дайджест}
+        self._digests: "OrderedDict[tuple, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def digest(self, canvas_id: str, note_dict: dict) -> str:
+        key = (canvas_id, note_dict.get("id"), note_dict.get("updated_at"))
+        with self._lock:
+            digest = self._digests.get(key)
+            if digest is not None:
+                self._digests.move_to_end(key)
+                return digest
+
+        digest = drawing_digest(note_dict["drawing_data"])
+        with self._lock:
+            self._digests[key] = digest
+            while len(self._digests) > DIGEST_MEMO_SIZE:
+                self._digests.popitem(last=False)
+        return digest
+
+    def _remember(self, digest: str, tiers: list[dict]):
+        weight = max(sum(tier["points"] for tier in tiers), 1)
+        if weight > self._max_points:
+            return
+        with self._lock:
+            if digest in self._tiers:
+                return
+            self._tiers[digest] = (weight, tiers)
+            self._points += weight
+            while self._points > self._max_points:
+                _, (evicted, _) = self._tiers.popitem(last=False)
+                self._points -= evicted
+
+    def _cached(self, digest: str) -> Optional[list[dict]]:
+        with self._lock:
+            entry = self._tiers.get(digest)
+            if entry is None:
+                return None
+            self._tiers.move_to_end(digest)
+            return entry[1]
+
+    def _write(self, canvas_dir: Path, digest: str, tiers: list[dict]) -> int:
+        """Сохранить уровни рисунка; возвращает размер записанного файла"""
+        lod_dir = canvas_dir / LOD_DIR
+        lod_dir.mkdir(exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            "w", encoding="utf-8", dir=lod_dir, prefix=f"{digest}.", suffix=".tmp", delete=False
+        ) as f:
+            tmp_path = f.name
+            try:
+                json.dump(tiers, f, ensure_ascii=False)
+            except BaseException:
+                f.close()
+                os.unlink(tmp_path)
+                raise
+        path = lod_dir / f"{digest}.json"
+        os.replace(tmp_path, path)
+        return path.stat().st_size
+
+    def _load(self, canvas_dir: Path, digest: str) -> Optional[list[dict]]:
+        tiers = self._cached(digest)
+        if tiers is not None:
+            return tiers
+        try:
+            with open(canvas_dir / LOD_DIR / f"{digest}.json", encoding="utf-8") as f:
+                tiers = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        self._remember(digest, tiers)
+        return tiers
+
+    def _store(self, canvas_dir: Path, note_dict: dict, digest: str, canvas_id: Optional[str] = None) -> list[dict]:
+        """Найти или посчитать уровни рисунка и убедиться, что они сохранены в папке канваса"""
+        tiers = self._load(canvas_dir, digest)
+        if tiers is None:
+            tiers = build_lod(note_dict["drawing_data"])
+            self._remember(digest, tiers)
+        if canvas_dir.is_dir() and not (canvas_dir / LOD_DIR / f"{digest}.json").exists():
+            size = self._write(canvas_dir, digest, tiers)
+            if canvas_id is not None:
+                disk_usage.add(canvas_id, size)
+        return tiers
+
+    def precompute(self, canvas_id: str, notes: Iterable[dict]):
+        """Посчитать и сохранить уровни рисунков из записанных заметок"""
+        canvas_dir = storage.get_canvas_path(canvas_id)
+        for note_dict in notes:
+            if is_drawing(note_dict):
+                self._store(canvas_dir, note_dict, self.digest(canvas_id, note_dict), canvas_id)
+
+    def precompute_staging(self, staging: Path, notes: Iterable[dict]):
+        """То же для папки ещё не созданного канваса (импорт)"""
+        for note_dict in notes:
+            if is_drawing(note_dict):
+                self._store(staging, note_dict, drawing_digest(note_dict["drawing_data"]))
+
+    def get_tiers(self, canvas_id: str, note_dict: dict) -> list[dict]:
+        """Уровни рисунка; если их ещё нет (заметка записана до их появления), они досчитываются"""
+        if not is_drawing(note_dict):
+            return []
+        digest = self.digest(canvas_id, note_dict)
+        tiers = self._cached(digest)
+        if tiers is not None:
+            return tiers
+        return self._store(storage.get_canvas_path(canvas_id), note_dict, digest, canvas_id)
+
+    def for_tolerance(self, canvas_id: str, note_dict: dict, tolerance: float) -> Optional[dict]:
+        """Самый грубый уровень рисунка с отклонением не больше tolerance"""
+        return select_tier(self.get_tiers(canvas_id, note_dict), note_dict.get("drawing_data"), tolerance)
+
+    def with_lod(self, canvas_id: str, note_dict: dict, tolerance: float) -> dict:
+        """Копия заметки для ответа, в которой рисунок заменён подходящим уровнем детализации"""
+        if not is_drawing(note_dict):
+            return note_dict
+        drawing_data = self.for_tolerance(canvas_id, note_dict, tolerance)
+        if drawing_data is note_dict["drawing_data"]:
+            return note_dict
+        return {**note_dict, "drawing_data": drawing_data}
+
+
+# Глобальный экземпляр
+lod_store = LodStore(LOD_CACHE_POINTS)
@@ -0,0 +1,146 @@
+import asyncio
+import logging
+import os
+import shutil
+import time
+from pathlib import Path
+
+from backend.app.core.config import settings
+from backend.app.services import storage
+from backend.app.services.disk_usage import disk_usage
+from backend.app.services.image_index import image_index
+from backend.app.services.lod_store import LOD_DIR, is_drawing, lod_store
+from backend.app.services.repository import Repository
+
+
+logger = logging.getLogger(__name__)
+
+# Файлы моложе этого возраста не удаляются: на них может ещё не успеть
+# сослаться создаваемая заметка
+GC_GRACE_SECONDS = 60 * 60
+
+GC_INTERVAL_SECONDS = 15 * 60
+
+# Папки с исходными медиафайлами; transcripts/ содержит производные от них
+MEDIA_FOLDERS = ["images", "audio", "ocr", "drawings"]
+
+# Суффиксы производных файлов в transcripts/, добавляемые к имени исходника без расширения
+_DERIVED_SUFFIXES = ["_ocr.txt", "_transcript.txt"]
+_TEMP_SUFFIX = "_temp.wav"
+
+
+def _is_referenced_transcript(name: str, names: set[str], stems: set[str]) -> bool:
+    """Проверить, относится ли файл из transcripts/ к используемому медиафайлу"""
+    if name.endswith(_TEMP_SUFFIX):
+        return False
+    for suffix in _DERIVED_SUFFIXES:
+        if name.endswith(suffix):
+            return name[:-len(suffix)] in stems
+    if name.endswith(".txt"):
+        source = name[:-len(".txt")]
+        return source in names or source in stems
+    # Неизвестные файлы не трогаем
+    return True
+
+
+def _remove_if_stale(repo: Repository, canvas_id: str, path: str, file_path: str, deadline: float) -> bool:
+    try:
+        stat = os.stat(path)
+        if stat.st_mtime > deadline:
+            return False
+        os.unlink(path)
+    except FileNotFoundError:
+        return False
+    repo.remove_media(canvas_id, file_path)
+    image_index.remove_file(canvas_id, file_path)
+    disk_usage.add(canvas_id, -stat.st_size)
+    return True
+
+
+def collect_canvas(repo: Repository, canvas_id: str, grace_seconds: float = GC_GRACE_SECONDS) -> list[str]:
+    """Удалить медиафайлы канваса, на которые не ссылается ни одна заметка"""
+    canvas_dir = storage.get_canvas_path(canvas_id)
+    if not canvas_dir.is_dir():
+        return []
+
+    notes = repo.list_notes(canvas_id)
+    referenced = {n["file_path"] for n in notes if n.get("file_path")}
+    names = {Path(p).name for p in referenced}
+    stems = {Path(p).stem for p in referenced}
+    deadline = time.time() - grace_seconds
+    removed = []
+
+    for folder in MEDIA_FOLDERS:
+        folder_dir = canvas_dir / folder
+        if not folder_dir.is_dir():
+            continue
+        for entry in os.scandir(folder_dir):
+            rel_path = f"{folder}/{entry.name}"
+            if entry.is_file() and rel_path not in referenced:
+                if _remove_if_stale(repo, canvas_id, entry.path, rel_path, deadline):
+                    removed.append(rel_path)
+
+    transcripts_dir = canvas_dir / "transcripts"
+    if transcripts_dir.is_dir():
+        for entry in os.scandir(transcripts_dir):
+            rel_path = f"transcripts/{entry.name}"
+            if entry.is_file() and not _is_referenced_transcript(entry.name, names, stems):
+                if _remove_if_stale(repo, canvas_id, entry.path, rel_path, deadline):
+                    removed.append(rel_path)
+
+    # Уровни детализации рисунков, которых больше нет ни в одной заметке
+    lod_dir = canvas_dir / LOD_DIR
+    if lod_dir.is_dir():
+        lod_files = {f"{lod_store.digest(canvas_id, n)}.json" for n in notes if is_drawing(n)}
+        for entry in os.scandir(lod_dir):
+            rel_path = f"{LOD_DIR}/{entry.name}"
+            if entry.is_file() and entry.name not in lod_files:
+                if _remove_if_stale(repo, canvas_id, entry.path, rel_path, deadline):
+                    removed.append(rel_path)
+
+    return removed
+
+
+def empty_trash():
+    """Удалить содержимое корзины с диска"""
+    trash_dir = settings.data_dir / storage.TRASH_DIR
+    if not trash_dir.is_dir():
+        return
+    for entry in os.scandir(trash_dir):
+        shutil.rmtree(entry.path, ignore_errors=True)
+
+
+def remove_stale_staging(grace_seconds: float = GC_GRACE_SECONDS):
+    """Удалить папки незавершённых импортов и клонирований"""
+    staging_dir = settings.data_dir / storage.STAGING_DIR
+    if not staging_dir.is_dir():
+        return
+    deadline = time.time() - grace_seconds
+    for entry in os.scandir(staging_dir):
+        if entry.stat().st_mtime < deadline:
+            shutil.rmtree(entry.path, ignore_errors=True)
+
+
+def collect_all(repo: Repository, grace_seconds: float = GC_GRACE_SECONDS) -> int:
+    """Очистить корзину и удалить неиспользуемые медиафайлы всех канвасов"""
+    empty_trash()
+    remove_stale_staging(grace_seconds)
+    removed = 0
+    for canvas_id in repo.list_canvases():
+        try:
+            removed += len(collect_canvas(repo, canvas_id, grace_seconds))
+        except Exception:
+            logger.exception("Media GC failed for canvas %s", canvas_id)
+    return removed
+
+
+async def run_periodically(repo: Repository, interval_seconds: float = GC_INTERVAL_SECONDS):
+    """Фоновая задача сборщика: запускает collect_all() в отдельном потоке"""
+    while True:
+        try:
+            removed = await asyncio.to_thread(collect_all, repo)
+            if removed:
+                logger.info("Media GC removed %d files", removed)
+        except Exception:
+            logger.exception("Media GC failed")
+        await asyncio.sleep(interval_seconds)
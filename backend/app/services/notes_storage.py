@@ -1,14 +1,26 @@
 import os
+import re
 import json
-from datetime import datetime
-import uuid
+import tempfile
+from typing import Iterator
 from backend.app.schemas.note import NoteCreate
+from backend.app.services import storage
+from backend.app.services.disk_usage import disk_usage
+from backend.app.services.repository.base import (
+    CanvasNotFoundError, apply_note_batch as apply_batch, apply_note_patch, build_note, check_revision, rebuild_note,
+    updates_by_id, utcnow
+)
 
-BASE_PATH = "data/canvases"
+
+# Сколько символов notes.json читается за раз в iter_notes
+ITER_CHUNK_SIZE = 64 * 1024
+
+_decoder = json.JSONDecoder()
+_whitespace = re.compile(r"[ \t\n\r]*")
 
 
 def get_notes_path(canvas_id: str) -> str:
-    return os.path.join(BASE_PATH, canvas_id, "notes.json")
+    return str(storage.get_canvas_path(canvas_id) / "notes.json")
 
 
 def load_notes(canvas_id: str) -> list[dict]:
@@ -19,28 +31,116 @@ def load_notes(canvas_id: str) -> list[dict]:
         return json.load(f)
 
 
+def _iter_json_array(f) -> Iterator:
+    """Перебрать элементы JSON-массива из файла, не читая его целиком.
+
+    В памяти держится только недоразобранный хвост: если элемент не поместился,
+    дочитывается порция не меньше хвоста, так что длинный элемент разбирается
+    заново лишь логарифмическое число раз.
+    """
+    buffer, pos, eof = "", 0, False
+
+    def fill() -> bool:
+        nonlocal buffer, pos, eof
+        if eof:
+            return False
+        chunk = f.read(max(ITER_CHUNK_SIZE, len(buffer) - pos))
+        buffer, pos, eof = buffer[pos:] + chunk, 0, not chunk
+        return not eof
+
+    def next_char() -> str:
+        nonlocal pos
+        while True:
+            pos = _whitespace.match(buffer, pos).end()
+            if pos < len(buffer):
+                return buffer[pos]
+            if not fill():
+                raise json.JSONDecodeError("Unexpected end of data", buffer, pos)
+
+    if next_char() != "[":
+        raise json.JSONDecodeError("Expecting '['", buffer, pos)
+    pos += 1
+    if next_char() == "]":
+        return
+
+    while True:
+        next_char()
+        while True:
+            try:
+                item, end = _decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if not fill():
+                    raise
+                continue
+            # Число в конце порции может продолжаться в следующей
+            if end < len(buffer) or not fill():
+                break
+        pos = end
+        yield item
+
+        char = next_char()
+        pos += 1
+        if char == "]":
+            return
+        if char != ",":
+            raise json.JSONDecodeError("Expecting ',' delimiter", buffer, pos - 1)
+
+
+def iter_notes(canvas_id: str) -> Iterator[dict]:
+    """Перебрать заметки, разбирая notes.json по частям.
+
+    Запись подменяет файл целиком, поэтому открытый файл остаётся
+    согласованным снимком до конца перебора.
+    """
+    try:
+        f = open(get_notes_path(canvas_id), "r", encoding="utf-8")
+    except FileNotFoundError:
+        return
+    with f:
+        yield from _iter_json_array(f)
+
+
 def save_notes(canvas_id: str, notes: list[dict]):
     path = get_notes_path(canvas_id)
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(notes, f, ensure_ascii=False, indent=2)
+    old_size = os.path.getsize(path) if os.path.exists(path) else 0
+    # Пишем во временный файл и подменяем: читатели не увидят наполовину записанный notes.json.
+    # У каждой записи свой временный файл, чтобы параллельные записи не портили друг другу данные
+    with tempfile.NamedTemporaryFile(
+        "w", encoding="utf-8", dir=os.path.dirname(path), prefix="notes.", suffix=".tmp", delete=False
+    ) as f:
+        tmp_path = f.name
+        try:
+            json.dump(notes, f, ensure_ascii=False, indent=2)
+        except BaseException:
+            f.close()
+            os.unlink(tmp_path)
+            raise
+    os.replace(tmp_path, path)
+    disk_usage.add(canvas_id, os.path.getsize(path) - old_size)
+
+
+def _ensure_canvas(canvas_id: str):
+    if not (storage.get_canvas_path(canvas_id) / "meta.json").exists():
+        raise CanvasNotFoundError(canvas_id)
 
 
 def list_notes(canvas_id: str) -> list[dict]:
     return load_notes(canvas_id)
 
 
-def create_note(canvas_id: str, note: NoteCreate) -> dict:
-    notes = load_notes(canvas_id)
-    note_id = str(uuid.uuid4())
-    now = datetime.utcnow().isoformat()
+def get_notes_revision(canvas_id: str) -> str:
+    """Ревизия notes.json: файл при каждой записи подменяется новым, поэтому меняется inode"""
+    try:
+        stat = os.stat(get_notes_path(canvas_id))
+    except FileNotFoundError:
+        return "0"
+    return f"{stat.st_ino:x}-{stat.st_mtime_ns:x}-{stat.st_size:x}"
 
-    note_dict = note.model_dump()
-    note_dict.update({
-        "id": note_id,
-        "created_at": now,
-        "updated_at": now,
-    })
 
+def create_note(canvas_id: str, note: NoteCreate) -> dict:
+    _ensure_canvas(canvas_id)
+    notes = load_notes(canvas_id)
+    note_dict = build_note(note)
     notes.append(note_dict)
     save_notes(canvas_id, notes)
     return note_dict
@@ -50,18 +150,27 @@ def update_note(canvas_id: str, note_id: str, note: NoteCreate) -> dict | None:
     notes = load_notes(canvas_id)
     for i, n in enumerate(notes):
         if n["id"] == note_id:
-            updated_note = note.model_dump()
-            updated_note.update({
-                "id": note_id,
-                "created_at": n["created_at"],
-                "updated_at": datetime.utcnow().isoformat(),
-            })
+            updated_note = rebuild_note(n, note)
             notes[i] = updated_note
             save_notes(canvas_id, notes)
             return updated_note
     return None
 
 
+def patch_note(canvas_id: str, note_id: str, patch: dict, if_match: str | None = None) -> dict | None:
+    """Частично обновить заметку; notes.json при этом перезаписывается целиком"""
+    notes = load_notes(canvas_id)
+    for i, n in enumerate(notes):
+        if n["id"] == note_id:
+            check_revision(n, if_match)
+            patched_note, changed = apply_note_patch(n, patch)
+            if changed:
+                notes[i] = patched_note
+                save_notes(canvas_id, notes)
+            return patched_note
+    return None
+
+
 def delete_note(canvas_id: str, note_id: str) -> bool:
     notes = load_notes(canvas_id)
     new_notes = [n for n in notes if n["id"] != note_id]
@@ -71,26 +180,29 @@ def delete_note(canvas_id: str, note_id: str) -> bool:
     return True
 
 
+def apply_note_batch(canvas_id: str, operations: list) -> list[dict]:
+    """Применить пакет операций с заметками и сохранить notes.json один раз"""
+    _ensure_canvas(canvas_id)
+    notes, results = apply_batch(load_notes(canvas_id), operations)
+    if operations:
+        save_notes(canvas_id, notes)
+    return results
+
+
 def update_note_positions(canvas_id: str, position_updates: list) -> int:
     """Обновить позиции нескольких заметок одновременно"""
     notes = load_notes(canvas_id)
     updated_count = 0
     
     # Создаем словарь для быстрого поиска обновлений по ID
-    # Обрабатываем как Pydantic объекты, так и словари
-    updates_dict = {}
-    for update in position_updates:
-        if hasattr(update, 'id'):  # Pydantic объект
-            updates_dict[update.id] = {"x": update.x, "y": update.y}
-        else:  # Словарь
-            updates_dict[update["id"]] = {"x": update["x"], "y": update["y"]}
+    updates_dict = updates_by_id(position_updates, ("x", "y"))
     
     for i, note in enumerate(notes):
         if note["id"] in updates_dict:
             update = updates_dict[note["id"]]
             notes[i]["x"] = update["x"]
             notes[i]["y"] = update["y"]
-            notes[i]["updated_at"] = datetime.utcnow().isoformat()
+            notes[i]["updated_at"] = utcnow()
             updated_count += 1
     
     if updated_count > 0:
@@ -105,20 +217,14 @@ def update_note_sizes(canvas_id: str, size_updates: list) -> int:
     updated_count = 0
     
     # Создаем словарь для быстрого поиска обновлений по ID
-    # Обрабатываем как Pydantic объекты, так и словари
-    updates_dict = {}
-    for update in size_updates:
-        if hasattr(update, 'id'):  # Pydantic объект
-            updates_dict[update.id] = {"width": update.width, "height": update.height}
-        else:  # Словарь
-            updates_dict[update["id"]] = {"width": update["width"], "height": update["height"]}
+    updates_dict = updates_by_id(size_updates, ("width", "height"))
     
     for i, note in enumerate(notes):
         if note["id"] in updates_dict:
             update = updates_dict[note["id"]]
             notes[i]["width"] = update["width"]
             notes[i]["height"] = update["height"]
-            notes[i]["updated_at"] = datetime.utcnow().isoformat()
+            notes[i]["updated_at"] = utcnow()
             updated_count += 1
     
     if updated_count > 0:
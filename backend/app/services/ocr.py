@@ -0,0 +1,108 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
+
+from backend.app.core.config import settings
+from backend.app.services import storage
+from backend.app.services.admission import lower_thread_priority
+from backend.app.services.cache import file_cache
+from backend.app.services.image_index import dhash, image_index
+from backend.app.services.repository import Repository
+from backend.app.services.tools import find_tesseract
+
+
+# Параллельность даёт пул, поэтому каждому процессу tesseract хватает одного потока
+os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    # Отдельный пул с пониженным приоритетом: OCR не занимает общий пул Starlette,
+    # в котором выполняются обычные синхронные обработчики
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.ocr_concurrency,
+            thread_name_prefix="ocr",
+            initializer=lower_thread_priority
+        )
+    return _executor
+
+
+@lru_cache(maxsize=None)
+def _import_pytesseract():
+    # Импортируется при первом распознавании, а не при старте приложения
+    import pytesseract
+    return pytesseract
+
+
+def _pytesseract():
+    pytesseract = _import_pytesseract()
+    # Путь ищется при каждом вызове, пока tesseract не найден
+    tesseract_cmd = find_tesseract()
+    if tesseract_cmd:
+        pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+    return pytesseract
+
+
+def image_to_text(image_path: Path, lang: str) -> str:
+    from PIL import Image
+
+    with Image.open(image_path) as image:
+        return _pytesseract().image_to_string(image, lang=lang)
+
+
+def warmup() -> str:
+    """Загрузить pytesseract и Pillow и проверить, что tesseract запускается"""
+    import PIL.Image  # noqa: F401
+
+    return str(_pytesseract().get_tesseract_version())
+
+
+async def recognize(image_path: Path, lang: str) -> str:
+    """Распознать текст на изображении в пуле OCR"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), image_to_text, image_path, lang)
+
+
+def find_similar_text(repo: Repository, canvas_id: str, file_path: str, image_path: Path,
+                      lang: str) -> Optional[tuple[str, str]]:
+    """Найти распознанный текст почти такого же изображения: (текст, "canvas_id/file_path").
+
+    Остальные канвасы загружаются в индекс в фоне; пока загрузка идёт,
+    ищутся только уже загруженные.
+    """
+    image_index.start_loading(repo.list_canvases)
+    value = image_index.get_hash(canvas_id, file_path)
+    if value is None:
+        value = image_index.add_file(canvas_id, file_path, image_path)
+    if value is None:
+        # Файл вне индексируемых папок
+        value = dhash(image_path)
+    if value is None:
+        return None
+
+    for _, other_canvas, other_path in image_index.search(value, settings.ocr_reuse_distance):
+        if (other_canvas, other_path) == (canvas_id, file_path):
+            continue
+        other = storage.get_canvas_path(other_canvas) / other_path
+        if not other.is_file():
+            continue
+        # Язык в файлах transcripts/ не сохраняется, поэтому берём только кеш
+        text = file_cache.get_ocr_result(other, lang)
+        if text is not None:
+            return text, f"{other_canvas}/{other_path}"
+    return None
+
+
+async def find_similar(repo: Repository, canvas_id: str, file_path: str, image_path: Path,
+                       lang: str) -> Optional[tuple[str, str]]:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _get_executor(), find_similar_text, repo, canvas_id, file_path, image_path, lang
+    )
+
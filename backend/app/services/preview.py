@@ -0,0 +1,258 @@
+import logging
+import os
+import threading
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Optional
+
+from backend.app.core.config import settings
+from backend.app.services import storage
+from backend.app.services.admission import lower_thread_priority
+from backend.app.services.drawing import iter_strokes
+from backend.app.services.lod_store import lod_store
+from backend.app.services.repository import Repository
+
+# Pillow импортируется при первой отрисовке
+if TYPE_CHECKING:
+    from PIL import Image, ImageDraw, ImageFont
+
+
+logger = logging.getLogger(__name__)
+
+PREVIEW_SIZE = (320, 200)
+PREVIEW_MARGIN = 8
+
+# Превью перерисовывается через PREVIEW_DEBOUNCE_SECONDS после последнего изменения,
+# но при непрерывном редактировании не реже, чем раз в PREVIEW_MAX_DELAY_SECONDS
+PREVIEW_DEBOUNCE_SECONDS = 2.0
+PREVIEW_MAX_DELAY_SECONDS = 10.0
+
+BACKGROUND_COLOR = "#f4f4f0"
+OUTLINE_COLOR = "#b0b0a8"
+TEXT_COLOR = "#333333"
+NOTE_COLORS = {
+    "text": "#fff6c2",
+    "image": "#e4edf9",
+    "audio": "#e3f3e6",
+    "drawing": "#ffffff",
+}
+
+# Текст мельче этого размера в пикселях превью не рисуется
+MIN_FONT_SIZE = 5
+
+
+def get_preview_path(canvas_id: str) -> Path:
+    return settings.data_dir / storage.PREVIEW_DIR / f"{canvas_id}.png"
+
+
+@lru_cache(maxsize=16)
+def _font(size: int) -> "ImageFont.ImageFont":
+    from PIL import ImageFont
+
+    # DejaVu есть в большинстве дистрибутивов и содержит кириллицу
+    try:
+        return ImageFont.truetype("DejaVuSans.ttf", size)
+    except OSError:
+        return ImageFont.load_default(size)
+
+
+@lru_cache(maxsize=256)
+def _thumbnail(path: str, mtime_ns: int, size: tuple[int, int]) -> Optional["Image.Image"]:
+    from PIL import Image
+
+    # mtime_ns входит в ключ, чтобы заменённый файл не брался из кеша
+    try:
+        with Image.open(path) as image:
+            # Для JPEG декодируется сразу уменьшенная копия
+            image.draft("RGB", size)
+            image = image.convert("RGB")
+            image.thumbnail(size)
+            return image
+    except (OSError, ValueError):
+        return None
+
+
+def _draw_snippet(draw: "ImageDraw.ImageDraw", box: tuple[float, float, float, float], text: str, scale: float):
+    font_size = int(16 * scale)
+    left, top, right, bottom = box
+    if font_size < MIN_FONT_SIZE or not text or bottom - top < font_size + 2:
+        return
+
+    font = _font(font_size)
+    max_width = right - left - 4
+    lines = []
+    for paragraph in text.splitlines():
+        line = ""
+        for word in paragraph.split():
+            candidate = f"{line} {word}".strip()
+            if line and draw.textlength(candidate, font=font) > max_width:
+                lines.append(line)
+                line = word
+            else:
+                line = candidate
+        lines.append(line)
+
+    y = top + 2
+    for line in lines:
+        if y + font_size > bottom - 2:
+            break
+        draw.text((left + 2, y), line, fill=TEXT_COLOR, font=font)
+        y += font_size + 1
+
+
+def _draw_strokes(draw: "ImageDraw.ImageDraw", box: tuple[float, float, float, float], drawing_data: dict, scale: float):
+    left, top = box[0], box[1]
+    for stroke in iter_strokes(drawing_data):
+        # Упрощаем штрих до точек, отстоящих друг от друга хотя бы на пиксель превью
+        points = []
+        for x, y in stroke["points"]:
+            point = (left + x * scale, top + y * scale)
+            if not points or abs(point[0] - points[-1][0]) + abs(point[1] - points[-1][1]) >= 1:
+                points.append(point)
+        width = max(1, round((stroke["width"] or 2) * scale))
+        color = stroke["color"] or TEXT_COLOR
+        try:
+            if len(points) == 1:
+                draw.point(points, fill=color)
+            else:
+                draw.line(points, fill=color, width=width)
+        except ValueError:
+            # Цвет в неизвестном Pillow формате
+            draw.line(points, fill=TEXT_COLOR, width=width)
+
+
+def render_preview(repo: Repository, canvas_id: str) -> Optional[Path]:
+    """Нарисовать превью канваса и сохранить его на диск; None, если канваса нет"""
+    from PIL import Image, ImageDraw
+
+    if repo.get_canvas_meta(canvas_id) is None:
+        return None
+
+    notes = repo.list_notes(canvas_id)
+    canvas_dir = storage.get_canvas_path(canvas_id)
+    image = Image.new("RGB", PREVIEW_SIZE, BACKGROUND_COLOR)
+    draw = ImageDraw.Draw(image)
+
+    if notes:
+        min_x = min(n["x"] for n in notes)
+        min_y = min(n["y"] for n in notes)
+        max_x = max(n["x"] + (n.get("width") or 0) for n in notes)
+        max_y = max(n["y"] + (n.get("height") or 0) for n in notes)
+        scale = min(
+            (PREVIEW_SIZE[0] - 2 * PREVIEW_MARGIN) / max(max_x - min_x, 1),
+            (PREVIEW_SIZE[1] - 2 * PREVIEW_MARGIN) / max(max_y - min_y, 1),
+            1.0
+        )
+        # Центрируем содержимое канваса
+        offset_x = (PREVIEW_SIZE[0] - (max_x - min_x) * scale) / 2
+        offset_y = (PREVIEW_SIZE[1] - (max_y - min_y) * scale) / 2
+
+        for note in notes:
+            left = offset_x + (note["x"] - min_x) * scale
+            top = offset_y + (note["y"] - min_y) * scale
+            right = left + max((note.get("width") or 0) * scale, 1)
+            bottom = top + max((note.get("height") or 0) * scale, 1)
+            box = (left, top, right, bottom)
+            draw.rectangle(box, fill=NOTE_COLORS.get(note.get("type"), "#ffffff"), outline=OUTLINE_COLOR)
+
+            note_type = note.get("type")
+            if note_type == "text":
+                _draw_snippet(draw, box, f"{note.get('title', '')}\n{note.get('content', '')}", scale)
+            elif note_type == "audio":
+                _draw_snippet(draw, box, note.get("transcript") or "", scale)
+            elif note_type == "drawing":
+                # Пиксель превью равен 1 / scale единиц канваса
+                _draw_strokes(draw, box, lod_store.for_tolerance(canvas_id, note, 1 / scale) or {}, scale)
+            elif note_type == "image" and note.get("file_path"):
+                size = (int(right - left) - 2, int(bottom - top) - 2)
+                if size[0] < 2 or size[1] < 2:
+                    continue
+                path = canvas_dir / note["file_path"]
+                try:
+                    mtime_ns = path.stat().st_mtime_ns
+                except OSError:
+                    continue
+                thumbnail = _thumbnail(str(path), mtime_ns, size)
+                if thumbnail is not None:
+                    image.paste(thumbnail, (
+                        int(left + (right - left - thumbnail.width) / 2),
+                        int(top + (bottom - top - thumbnail.height) / 2)
+                    ))
+
+    preview_path = get_preview_path(canvas_id)
+    preview_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = preview_path.with_name(f"{preview_path.name}.{threading.get_ident()}.tmp")
+    image.save(tmp_path, "PNG", optimize=True)
+    os.replace(tmp_path, preview_path)
+    return preview_path
+
+
+class PreviewRenderer:
+    """Фоновая перерисовка превью канвасов с дебаунсом.
+
+    Изменения заметок и медиа вызывают invalidate(); превью перерисовывается
+    в отдельном потоке с пониженным приоритетом, когда изменения затихнут.
+    До перерисовки отдаётся прежняя версия превью.
+    """
+
+    def __init__(self, debounce: float = PREVIEW_DEBOUNCE_SECONDS, max_delay: float = PREVIEW_MAX_DELAY_SECONDS):
+        self._debounce = debounce
+        self._max_delay = max_delay
+        # {canvas_id: (время первого изменения, срок перерисовки, хранилище)}
+        self._pending: Dict[str, tuple[float, float, Repository]] = {}
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def invalidate(self, repo: Repository, canvas_id: str):
+        """Отметить превью канваса устаревшим"""
+        if "previews" not in settings.features:
+            return
+        now = time.monotonic()
+        with self._cond:
+            first = self._pending[canvas_id][0] if canvas_id in self._pending else now
+            self._pending[canvas_id] = (first, min(now + self._debounce, first + self._max_delay), repo)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="preview", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def forget(self, canvas_id: str):
+        """Убрать превью удалённого канваса"""
+        with self._cond:
+            self._pending.pop(canvas_id, None)
+        get_preview_path(canvas_id).unlink(missing_ok=True)
+
+    def get_preview(self, repo: Repository, canvas_id: str) -> Optional[Path]:
+        """Путь к превью канваса; если его ещё нет, оно рисуется сразу"""
+        path = get_preview_path(canvas_id)
+        if path.exists():
+            return path
+        return render_preview(repo, canvas_id)
+
+    def _next_due(self) -> tuple[str, Repository]:
+        with self._cond:
+            while True:
+                if not self._pending:
+                    self._cond.wait()
+                    continue
+                canvas_id, (_, deadline, repo) = min(self._pending.items(), key=lambda item: item[1][1])
+                delay = deadline - time.monotonic()
+                if delay <= 0:
+                    del self._pending[canvas_id]
+                    return canvas_id, repo
+                self._cond.wait(delay)
+
+    def _run(self):
+        lower_thread_priority()
+        while True:
+            canvas_id, repo = self._next_due()
+            try:
+                if render_preview(repo, canvas_id) is None:
+                    get_preview_path(canvas_id).unlink(missing_ok=True)
+            except Exception:
+                logger.exception("Failed to render preview for canvas %s", canvas_id)
+
+
+# Глобальный экземпляр
+preview_renderer = PreviewRenderer()
@@ -0,0 +1,29 @@
+from functools import lru_cache
+
+from backend.app.core.config import settings
+from backend.app.services.repository.base import (
+    Repository, CanvasNotFoundError, NoteBatchError, NoteConflictError, NotePatchError
+)
+
+
+@lru_cache
+def get_repository() -> Repository:
+    """Хранилище, выбранное настройкой storage_backend (используется как зависимость FastAPI)"""
+    backend = settings.storage_backend
+
+    if backend == "json":
+        from backend.app.services.repository.json_files import JsonFileRepository
+        return JsonFileRepository()
+    if backend == "sqlite":
+        from backend.app.services.repository.sqlite import SQLiteRepository
+        return SQLiteRepository(settings.sqlite_path)
+    if backend == "memory":
+        from backend.app.services.repository.memory import MemoryRepository
+        return MemoryRepository()
+
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+
+__all__ = [
+    "Repository", "CanvasNotFoundError", "NoteBatchError", "NoteConflictError", "NotePatchError", "get_repository"
+]
@@ -0,0 +1,303 @@
+from abc import ABC, abstractmethod
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Iterator, Optional, get_args
+import copy
+import uuid
+
+from pydantic import BaseModel, TypeAdapter, ValidationError
+
+from backend.app.schemas.note import NoteCreate
+
+
+def utcnow() -> str:
+    return datetime.utcnow().isoformat()
+
+
+def build_note(note: NoteCreate) -> dict:
+    """Собрать словарь новой заметки"""
+    now = utcnow()
+    note_dict = note.model_dump()
+    note_dict.update({
+        "id": str(uuid.uuid4()),
+        "created_at": now,
+        "updated_at": now,
+    })
+    return note_dict
+
+
+def rebuild_note(existing: dict, note: NoteCreate) -> dict:
+    """Собрать словарь заметки, полностью заменяющей existing"""
+    note_dict = note.model_dump()
+    note_dict.update({
+        "id": existing["id"],
+        "created_at": existing["created_at"],
+        "updated_at": utcnow(),
+    })
+    return note_dict
+
+
+class CanvasNotFoundError(Exception):
+    """Канваса нет, поэтому заметки в нём не создаются"""
+
+    def __init__(self, canvas_id: str):
+        super().__init__(f"Canvas {canvas_id} not found")
+        self.canvas_id = canvas_id
+
+
+class NoteBatchError(Exception):
+    """Операция пакета не может быть применена; пакет не применяется целиком"""
+
+    def __init__(self, index: int, detail: str):
+        super().__init__(f"Operation {index}: {detail}")
+        self.index = index
+        self.detail = detail
+
+
+def apply_note_batch(notes: list[dict], operations: list) -> tuple[list[dict], list[dict]]:
+    """Применить пакет операций к списку заметок.
+
+    Возвращает новый список заметок и результаты операций; исходный список
+    не меняется, поэтому при NoteBatchError сохранять нечего.
+    """
+    new_notes: list[Optional[dict]] = list(notes)
+    index = {n["id"]: i for i, n in enumerate(new_notes)}
+    results = []
+
+    for i, operation in enumerate(operations):
+        if operation.op == "create":
+            note_dict = build_note(operation.note)
+            index[note_dict["id"]] = len(new_notes)
+            new_notes.append(note_dict)
+            results.append({"op": "create", "id": note_dict["id"], "note": note_dict})
+            continue
+
+        position = index.get(operation.id)
+        if position is None:
+            raise NoteBatchError(i, f"Note {operation.id} not found")
+
+        if operation.op == "update":
+            note_dict = rebuild_note(new_notes[position], operation.note)
+            new_notes[position] = note_dict
+            results.append({"op": "update", "id": operation.id, "note": note_dict})
+        else:
+            del index[operation.id]
+            new_notes[position] = None
+            results.append({"op": "delete", "id": operation.id})
+
+    return [n for n in new_notes if n is not None], results
+
+
+class NotePatchError(Exception):
+    """Патч заметки не прошёл проверку"""
+
+    def __init__(self, errors: list[dict]):
+        super().__init__("Invalid note patch")
+        self.errors = errors
+
+
+class NoteConflictError(Exception):
+    """Заметка изменилась с тех пор, как клиент её прочитал"""
+
+    def __init__(self, updated_at: str):
+        super().__init__("Note was modified")
+        self.updated_at = updated_at
+
+
+# Модель создания заметки для каждого значения поля type
+NOTE_MODELS: dict[str, type[BaseModel]] = {
+    get_args(model.model_fields["type"].annotation)[0]: model for model in get_args(NoteCreate)
+}
+
+# Поля, которые задаёт сервер; тип заметки меняется только через PUT
+READONLY_FIELDS = {"id", "created_at", "updated_at", "type"}
+
+
+@lru_cache(maxsize=None)
+def _field_adapter(model: type[BaseModel], field: str) -> TypeAdapter:
+    return TypeAdapter(model.model_fields[field].annotation)
+
+
+def merge_patch(target: Any, patch: Any) -> Any:
+    """Применить JSON Merge Patch (RFC 7396): null удаляет ключ, объекты сливаются"""
+    if not isinstance(patch, dict):
+        return patch
+    result = dict(target) if isinstance(target, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = merge_patch(result.get(key), value)
+    return result
+
+
+def check_revision(existing: dict, if_match: Optional[str]):
+    """Проверить If-Match: ETag заметки — её updated_at в кавычках"""
+    if if_match is None:
+        return
+    tags = [tag.strip().removeprefix("W/").strip('"') for tag in if_match.split(",")]
+    if "*" not in tags and existing["updated_at"] not in tags:
+        raise NoteConflictError(existing["updated_at"])
+
+
+def apply_note_patch(existing: dict, patch: dict) -> tuple[dict, list[str]]:
+    """Применить merge patch к заметке, проверив только затронутые поля.
+
+    Возвращает новую заметку и список изменённых ключей, чтобы хранилище
+    могло записать только их. existing не меняется.
+    """
+    if not isinstance(patch, dict):
+        raise NotePatchError([{"loc": [], "msg": "Patch must be a JSON object"}])
+
+    model = NOTE_MODELS[existing["type"]]
+    errors = []
+    changes = {}
+    for field, value in patch.items():
+        if field == "type" and value == existing["type"]:
+            continue
+        if field in READONLY_FIELDS or field not in model.model_fields:
+            errors.append({"loc": [field], "msg": "Field cannot be patched"})
+            continue
+
+        if value is None:
+            # null на верхнем уровне сбрасывает поле к значению по умолчанию
+            field_info = model.model_fields[field]
+            if field_info.is_required():
+                errors.append({"loc": [field], "msg": "Field required"})
+                continue
+            value = copy.deepcopy(field_info.default)
+        else:
+            value = merge_patch(existing.get(field), value)
+
+        adapter = _field_adapter(model, field)
+        try:
+            changes[field] = adapter.dump_python(adapter.validate_python(value), mode="json")
+        except ValidationError as e:
+            errors.extend({"loc": [field, *err["loc"]], "msg": err["msg"]} for err in e.errors())
+
+    if errors:
+        raise NotePatchError(errors)
+
+    changed = [field for field, value in changes.items() if existing.get(field) != value]
+    if not changed:
+        return existing, []
+
+    note_dict = {**existing, **changes, "updated_at": utcnow()}
+    changed.append("updated_at")
+    return note_dict, changed
+
+
+def updates_by_id(updates: list, fields: tuple[str, ...]) -> dict[str, dict]:
+    """Собрать обновления полей по id заметки.
+
+    Обрабатываем как Pydantic объекты, так и словари.
+    """
+    result = {}
+    for update in updates:
+        if hasattr(update, "id"):  # Pydantic объект
+            result[update.id] = {field: getattr(update, field) for field in fields}
+        else:  # Словарь
+            result[update["id"]] = {field: update[field] for field in fields}
+    return result
+
+
+class Repository(ABC):
+    """Хранилище канвасов, заметок и метаданных медиафайлов.
+
+    Сами медиафайлы при любой реализации лежат на диске
+    в storage.get_canvas_path(canvas_id).
+    """
+
+    # Канвасы
+
+    @abstractmethod
+    def list_canvases(self) -> list[str]:
+        """Получить id всех канвасов"""
+
+    @abstractmethod
+    def get_canvas_meta(self, canvas_id: str) -> Optional[dict]:
+        """Получить метаданные канваса или None"""
+
+    @abstractmethod
+    def create_canvas(self, name: str, notes: Optional[list[dict]] = None, staging: Optional[Path] = None) -> dict:
+        """Создать канвас.
+
+        notes — готовые словари заметок (импорт, клонирование), staging — папка
+        из storage.new_staging_dir() с уже разложенными медиафайлами, которая
+        станет папкой канваса.
+        """
+
+    @abstractmethod
+    def delete_canvas(self, canvas_id: str) -> bool:
+        """Удалить канвас, перенеся его папку в корзину"""
+
+    # Заметки
+
+    @abstractmethod
+    def list_notes(self, canvas_id: str) -> list[dict]:
+        """Получить заметки канваса в порядке создания"""
+
+    def iter_notes(self, canvas_id: str) -> Iterator[dict]:
+        """Перебрать заметки канваса в порядке создания.
+
+        Хранилища, которые умеют читать заметки порциями, не собирают их
+        в один список; заметки, изменённые во время перебора, могут попасть
+        в него как в старом, так и в новом виде.
+        """
+        yield from self.list_notes(canvas_id)
+
+    @abstractmethod
+    def get_notes_revision(self, canvas_id: str) -> str:
+        """Ревизия заметок канваса: меняется при каждом изменении любой из них"""
+
+    @abstractmethod
+    def create_note(self, canvas_id: str, note: NoteCreate) -> dict:
+        """Создать заметку; если канваса нет — CanvasNotFoundError"""
+
+    @abstractmethod
+    def update_note(self, canvas_id: str, note_id: str, note: NoteCreate) -> Optional[dict]:
+        """Полностью заменить заметку; None, если её нет"""
+
+    @abstractmethod
+    def patch_note(self, canvas_id: str, note_id: str, patch: dict, if_match: Optional[str] = None) -> Optional[dict]:
+        """Частично обновить заметку JSON Merge Patch; None, если её нет.
+
+        Проверяются только поля из патча (NotePatchError). Если задан if_match
+        и он не совпадает с updated_at заметки, выбрасывается NoteConflictError.
+        """
+
+    @abstractmethod
+    def delete_note(self, canvas_id: str, note_id: str) -> bool:
+        """Удалить заметку"""
+
+    @abstractmethod
+    def apply_note_batch(self, canvas_id: str, operations: list) -> list[dict]:
+        """Применить пакет операций create/update/delete за одну запись.
+
+        Всё или ничего: при ошибке выбрасывается NoteBatchError и ничего не
+        сохраняется. Если канваса нет — CanvasNotFoundError. Возвращает
+        результаты операций в порядке пакета.
+        """
+
+    @abstractmethod
+    def update_note_positions(self, canvas_id: str, position_updates: list) -> int:
+        """Обновить позиции нескольких заметок, вернуть число обновлённых"""
+
+    @abstractmethod
+    def update_note_sizes(self, canvas_id: str, size_updates: list) -> int:
+        """Обновить размеры нескольких заметок, вернуть число обновлённых"""
+
+    # Метаданные медиафайлов
+
+    @abstractmethod
+    def list_media(self, canvas_id: str) -> list[dict]:
+        """Получить медиафайлы канваса: [{"file_path": str, "size": int}]"""
+
+    @abstractmethod
+    def add_media(self, canvas_id: str, file_path: str, size: int):
+        """Зарегистрировать записанный медиафайл (путь относительно канваса)"""
+
+    @abstractmethod
+    def remove_media(self, canvas_id: str, file_path: str):
+        """Забыть удалённый медиафайл"""
@@ -0,0 +1,71 @@
+from pathlib import Path
+from typing import Iterator, Optional
+
+from backend.app.schemas.note import NoteCreate
+from backend.app.services import storage, notes_storage
+from backend.app.services.repository.base import Repository
+
+
+class JsonFileRepository(Repository):
+    """Хранилище в JSON-файлах: meta.json и notes.json в папке канваса.
+
+    Список медиафайлов берётся с диска, поэтому add_media/remove_media
+    ничего не делают.
+    """
+
+    def list_canvases(self) -> list[str]:
+        return storage.list_canvases()
+
+    def get_canvas_meta(self, canvas_id: str) -> Optional[dict]:
+        return storage.get_canvas_meta(canvas_id)
+
+    def create_canvas(self, name: str, notes: Optional[list[dict]] = None, staging: Optional[Path] = None) -> dict:
+        return storage.create_canvas(name, notes, staging)
+
+    def delete_canvas(self, canvas_id: str) -> bool:
+        return storage.delete_canvas(canvas_id)
+
+    def list_notes(self, canvas_id: str) -> list[dict]:
+        return notes_storage.list_notes(canvas_id)
+
+    def iter_notes(self, canvas_id: str) -> Iterator[dict]:
+        return notes_storage.iter_notes(canvas_id)
+
+    def get_notes_revision(self, canvas_id: str) -> str:
+        return notes_storage.get_notes_revision(canvas_id)
+
+    def create_note(self, canvas_id: str, note: NoteCreate) -> dict:
+        return notes_storage.create_note(canvas_id, note)
+
+    def update_note(self, canvas_id: str, note_id: str, note: NoteCreate) -> Optional[dict]:
+        return notes_storage.update_note(canvas_id, note_id, note)
+
+    def patch_note(self, canvas_id: str, note_id: str, patch: dict, if_match: Optional[str] = None) -> Optional[dict]:
+        return notes_storage.patch_note(canvas_id, note_id, patch, if_match)
+
+    def delete_note(self, canvas_id: str, note_id: str) -> bool:
+        return notes_storage.delete_note(canvas_id, note_id)
+
+    def apply_note_batch(self, canvas_id: str, operations: list) -> list[dict]:
+        return notes_storage.apply_note_batch(canvas_id, operations)
+
+    def update_note_positions(self, canvas_id: str, position_updates: list) -> int:
+        return notes_storage.update_note_positions(canvas_id, position_updates)
+
+    def update_note_sizes(self, canvas_id: str, size_updates: list) -> int:
+        return notes_storage.update_note_sizes(canvas_id, size_updates)
+
+    def list_media(self, canvas_id: str) -> list[dict]:
+        media = []
+        for path, file_path in storage.iter_media_files(storage.get_canvas_path(canvas_id)):
+            try:
+                media.append({"file_path": file_path, "size": path.stat().st_size})
+            except FileNotFoundError:
+                pass
+        return media
+
+    def add_media(self, canvas_id: str, file_path: str, size: int):
+        pass
+
+    def remove_media(self, canvas_id: str, file_path: str):
+        pass
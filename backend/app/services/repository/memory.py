@@ -0,0 +1,168 @@
+import itertools
+import shutil
+import threading
+from pathlib import Path
+from typing import Iterator, Optional
+
+from backend.app.schemas.note import NoteCreate
+from backend.app.services import storage
+from backend.app.services.repository.base import (
+    Repository, CanvasNotFoundError, apply_note_batch, apply_note_patch, build_note, check_revision, rebuild_note, updates_by_id, utcnow
+)
+
+
+class MemoryRepository(Repository):
+    """Хранилище в памяти процесса для тестов и бенчмарков.
+
+    Данные теряются при перезапуске; медиафайлы всё равно пишутся на диск.
+    """
+
+    def __init__(self):
+        self._canvases: dict[str, dict] = {}
+        # {canvas_id: {note_id: note}}, порядок вставки сохраняется
+        self._notes: dict[str, dict[str, dict]] = {}
+        # {canvas_id: {file_path: size}}
+        self._media: dict[str, dict[str, int]] = {}
+        # {canvas_id: номер последнего изменения заметок}; номера общие для всех канвасов
+        self._revisions: dict[str, int] = {}
+        self._revision_counter = itertools.count(1)
+        self._lock = threading.RLock()
+
+    def _touch(self, canvas_id: str):
+        # Вызывается под self._lock
+        self._revisions[canvas_id] = next(self._revision_counter)
+
+    def list_canvases(self) -> list[str]:
+        with self._lock:
+            return list(self._canvases)
+
+    def get_canvas_meta(self, canvas_id: str) -> Optional[dict]:
+        with self._lock:
+            meta = self._canvases.get(canvas_id)
+            return dict(meta) if meta else None
+
+    def create_canvas(self, name: str, notes: Optional[list[dict]] = None, staging: Optional[Path] = None) -> dict:
+        meta = storage.new_canvas_meta(name)
+        path = staging or storage.new_staging_dir()
+        try:
+            media = {
+                file_path: file.stat().st_size
+                for file, file_path in storage.iter_media_files(path)
+            }
+            storage.publish_canvas_dir(path, meta["id"])
+        except BaseException:
+            shutil.rmtree(path, ignore_errors=True)
+            raise
+
+        with self._lock:
+            self._canvases[meta["id"]] = meta
+            self._notes[meta["id"]] = {n["id"]: dict(n) for n in notes or []}
+            self._media[meta["id"]] = media
+            self._touch(meta["id"])
+        return dict(meta)
+
+    def delete_canvas(self, canvas_id: str) -> bool:
+        with self._lock:
+            if self._canvases.pop(canvas_id, None) is None:
+                return False
+            self._notes.pop(canvas_id, None)
+            self._media.pop(canvas_id, None)
+            self._revisions.pop(canvas_id, None)
+        storage.move_to_trash(canvas_id)
+        return True
+
+    def list_notes(self, canvas_id: str) -> list[dict]:
+        with self._lock:
+            return [dict(n) for n in self._notes.get(canvas_id, {}).values()]
+
+    def iter_notes(self, canvas_id: str) -> Iterator[dict]:
+        # Под блокировкой берём только ссылки, копии делаются по мере перебора
+        with self._lock:
+            notes = list(self._notes.get(canvas_id, {}).values())
+        for note in notes:
+            with self._lock:
+                note = dict(note)
+            yield note
+
+    def get_notes_revision(self, canvas_id: str) -> str:
+        with self._lock:
+            return str(self._revisions.get(canvas_id, 0))
+
+    def create_note(self, canvas_id: str, note: NoteCreate) -> dict:
+        note_dict = build_note(note)
+        with self._lock:
+            if canvas_id not in self._canvases:
+                raise CanvasNotFoundError(canvas_id)
+            self._notes[canvas_id][note_dict["id"]] = note_dict
+            self._touch(canvas_id)
+        return dict(note_dict)
+
+    def update_note(self, canvas_id: str, note_id: str, note: NoteCreate) -> Optional[dict]:
+        with self._lock:
+            notes = self._notes.get(canvas_id, {})
+            if note_id not in notes:
+                return None
+            notes[note_id] = rebuild_note(notes[note_id], note)
+            self._touch(canvas_id)
+            return dict(notes[note_id])
+
+    def patch_note(self, canvas_id: str, note_id: str, patch: dict, if_match: Optional[str] = None) -> Optional[dict]:
+        with self._lock:
+            notes = self._notes.get(canvas_id, {})
+            if note_id not in notes:
+                return None
+            check_revision(notes[note_id], if_match)
+            notes[note_id], changed = apply_note_patch(notes[note_id], patch)
+            if changed:
+                self._touch(canvas_id)
+            return dict(notes[note_id])
+
+    def delete_note(self, canvas_id: str, note_id: str) -> bool:
+        with self._lock:
+            if self._notes.get(canvas_id, {}).pop(note_id, None) is None:
+                return False
+            self._touch(canvas_id)
+            return True
+
+    def apply_note_batch(self, canvas_id: str, operations: list) -> list[dict]:
+        with self._lock:
+            if canvas_id not in self._canvases:
+                raise CanvasNotFoundError(canvas_id)
+            notes, results = apply_note_batch(list(self._notes[canvas_id].values()), operations)
+            self._notes[canvas_id] = {n["id"]: n for n in notes}
+            self._touch(canvas_id)
+        return results
+
+    def _update_fields(self, canvas_id: str, updates: dict[str, dict]) -> int:
+        updated_count = 0
+        now = utcnow()
+        with self._lock:
+            notes = self._notes.get(canvas_id, {})
+            for note_id, fields in updates.items():
+                if note_id in notes:
+                    notes[note_id].update(fields, updated_at=now)
+                    updated_count += 1
+            if updated_count:
+                self._touch(canvas_id)
+        return updated_count
+
+    def update_note_positions(self, canvas_id: str, position_updates: list) -> int:
+        return self._update_fields(canvas_id, updates_by_id(position_updates, ("x", "y")))
+
+    def update_note_sizes(self, canvas_id: str, size_updates: list) -> int:
+        return self._update_fields(canvas_id, updates_by_id(size_updates, ("width", "height")))
+
+    def list_media(self, canvas_id: str) -> list[dict]:
+        with self._lock:
+            return [
+                {"file_path": file_path, "size": size}
+                for file_path, size in sorted(self._media.get(canvas_id, {}).items())
+            ]
+
+    def add_media(self, canvas_id: str, file_path: str, size: int):
+        with self._lock:
+            self._media.setdefault(canvas_id, {})[file_path] = size
+
+    def remove_media(self, canvas_id: str, file_path: str):
+        with self._lock:
+            self._media.get(canvas_id, {}).pop(file_path, None)
@@ -0,0 +1,326 @@
+import json
+import shutil
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional
+
+from backend.app.schemas.note import NoteCreate
+from backend.app.services import storage
+from backend.app.services.repository.base import (
+    Repository, CanvasNotFoundError, NoteBatchError, apply_note_patch, build_note, check_revision, rebuild_note, updates_by_id, utcnow
+)
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS canvases (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+
+-- Заметка хранится целиком в JSON, порядок создания задаёт rowid
+CREATE TABLE IF NOT EXISTS notes (
+    canvas_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    data TEXT NOT NULL,
+    UNIQUE (canvas_id, id)
+);
+
+-- Строки индекса упорядочены по (canvas_id, rowid): заметки канваса
+-- читаются в порядке создания без сортировки и с любого места
+CREATE INDEX IF NOT EXISTS notes_canvas ON notes (canvas_id);
+
+-- Ревизия заметок канваса, её увеличивают триггеры на любое изменение notes
+CREATE TABLE IF NOT EXISTS note_revisions (
+    canvas_id TEXT PRIMARY KEY,
+    revision INTEGER NOT NULL
+);
+
+CREATE TRIGGER IF NOT EXISTS notes_revision_insert AFTER INSERT ON notes BEGIN
+    INSERT INTO note_revisions (canvas_id, revision) VALUES (NEW.canvas_id, 1)
+    ON CONFLICT (canvas_id) DO UPDATE SET revision = revision + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS notes_revision_update AFTER UPDATE ON notes BEGIN
+    INSERT INTO note_revisions (canvas_id, revision) VALUES (NEW.canvas_id, 1)
+    ON CONFLICT (canvas_id) DO UPDATE SET revision = revision + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS notes_revision_delete AFTER DELETE ON notes BEGIN
+    INSERT INTO note_revisions (canvas_id, revision) VALUES (OLD.canvas_id, 1)
+    ON CONFLICT (canvas_id) DO UPDATE SET revision = revision + 1;
+END;
+
+CREATE TABLE IF NOT EXISTS media (
+    canvas_id TEXT NOT NULL,
+    file_path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    PRIMARY KEY (canvas_id, file_path)
+);
+"""
+
+# Сколько заметок читается за один запрос в iter_notes
+ITER_PAGE_SIZE = 500
+
+
+class SQLiteRepository(Repository):
+    """Хранилище в базе SQLite; у каждого потока своё соединение"""
+
+    def __init__(self, db_path: Path):
+        self._db_path = db_path
+        self._local = threading.local()
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection().executescript(SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._db_path)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _write_transaction(self):
+        """Транзакция, которая сразу берёт блокировку записи.
+
+        По умолчанию sqlite3 начинает транзакцию только перед первым изменением,
+        и прочитанное до него могут изменить другие соединения.
+        """
+        conn = self._connection()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            yield conn
+
+    def list_canvases(self) -> list[str]:
+        rows = self._connection().execute("SELECT id FROM canvases ORDER BY rowid")
+        return [row[0] for row in rows]
+
+    def get_canvas_meta(self, canvas_id: str) -> Optional[dict]:
+        row = self._connection().execute(
+            "SELECT id, name, created_at, updated_at FROM canvases WHERE id = ?", (canvas_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {"id": row[0], "name": row[1], "created_at": row[2], "updated_at": row[3]}
+
+    def create_canvas(self, name: str, notes: Optional[list[dict]] = None, staging: Optional[Path] = None) -> dict:
+        meta = storage.new_canvas_meta(name)
+        path = staging or storage.new_staging_dir()
+        conn = self._connection()
+        try:
+            media = [
+                (meta["id"], file_path, file.stat().st_size)
+                for file, file_path in storage.iter_media_files(path)
+            ]
+            with conn:
+                conn.execute(
+                    "INSERT INTO canvases (id, name, created_at, updated_at) VALUES (?, ?, ?, ?)",
+                    (meta["id"], meta["name"], meta["created_at"], meta["updated_at"])
+                )
+                conn.executemany(
+                    "INSERT INTO notes (canvas_id, id, data) VALUES (?, ?, ?)",
+                    [(meta["id"], n["id"], json.dumps(n, ensure_ascii=False)) for n in notes or []]
+                )
+                conn.executemany("INSERT INTO media (canvas_id, file_path, size) VALUES (?, ?, ?)", media)
+                # Папка публикуется внутри транзакции: при ошибке записи в базу не останется
+                storage.publish_canvas_dir(path, meta["id"])
+        except BaseException:
+            shutil.rmtree(path, ignore_errors=True)
+            raise
+        return meta
+
+    def delete_canvas(self, canvas_id: str) -> bool:
+        conn = self._connection()
+        with conn:
+            deleted = conn.execute("DELETE FROM canvases WHERE id = ?", (canvas_id,)).rowcount
+            conn.execute("DELETE FROM notes WHERE canvas_id = ?", (canvas_id,))
+            conn.execute("DELETE FROM media WHERE canvas_id = ?", (canvas_id,))
+            conn.execute("DELETE FROM note_revisions WHERE canvas_id = ?", (canvas_id,))
+        if not deleted:
+            return False
+        storage.move_to_trash(canvas_id)
+        return True
+
+    def list_notes(self, canvas_id: str) -> list[dict]:
+        rows = self._connection().execute(
+            "SELECT data FROM notes WHERE canvas_id = ? ORDER BY rowid", (canvas_id,)
+        )
+        return [json.loads(row[0]) for row in rows]
+
+    def iter_notes(self, canvas_id: str) -> Iterator[dict]:
+        # Читаем страницами по rowid: курсор не живёт между шагами, поэтому перебор
+        # можно продолжать из другого потока и он не держит транзакцию чтения
+        last_rowid = 0
+        while True:
+            rows = self._connection().execute(
+                "SELECT rowid, data FROM notes WHERE canvas_id = ? AND rowid > ? ORDER BY rowid LIMIT ?",
+                (canvas_id, last_rowid, ITER_PAGE_SIZE)
+            ).fetchall()
+            for row in rows:
+                yield json.loads(row[1])
+            if len(rows) < ITER_PAGE_SIZE:
+                return
+            last_rowid = rows[-1][0]
+
+    def get_notes_revision(self, canvas_id: str) -> str:
+        row = self._connection().execute(
+            "SELECT revision FROM note_revisions WHERE canvas_id = ?", (canvas_id,)
+        ).fetchone()
+        return str(row[0] if row else 0)
+
+    def create_note(self, canvas_id: str, note: NoteCreate) -> dict:
+        note_dict = build_note(note)
+        conn = self._connection()
+        with conn:
+            inserted = conn.execute(
+                "INSERT INTO notes (canvas_id, id, data) "
+                "SELECT ?, ?, ? WHERE EXISTS (SELECT 1 FROM canvases WHERE id = ?)",
+                (canvas_id, note_dict["id"], json.dumps(note_dict, ensure_ascii=False), canvas_id)
+            ).rowcount
+        if not inserted:
+            raise CanvasNotFoundError(canvas_id)
+        return note_dict
+
+    def update_note(self, canvas_id: str, note_id: str, note: NoteCreate) -> Optional[dict]:
+        conn = self._connection()
+        with conn:
+            row = conn.execute(
+                "SELECT data FROM notes WHERE canvas_id = ? AND id = ?", (canvas_id, note_id)
+            ).fetchone()
+            if row is None:
+                return None
+            note_dict = rebuild_note(json.loads(row[0]), note)
+            conn.execute(
+                "UPDATE notes SET data = ? WHERE canvas_id = ? AND id = ?",
+                (json.dumps(note_dict, ensure_ascii=False), canvas_id, note_id)
+            )
+        return note_dict
+
+    def patch_note(self, canvas_id: str, note_id: str, patch: dict, if_match: Optional[str] = None) -> Optional[dict]:
+        conn = self._connection()
+        while True:
+            row = conn.execute(
+                "SELECT data FROM notes WHERE canvas_id = ? AND id = ?", (canvas_id, note_id)
+            ).fetchone()
+            if row is None:
+                return None
+            existing = json.loads(row[0])
+            check_revision(existing, if_match)
+            note_dict, changed = apply_note_patch(existing, patch)
+            if not changed:
+                return note_dict
+
+            # Записываем только изменённые поля внутри JSON
+            set_fields = [field for field in changed if field in note_dict]
+            removed_fields = [field for field in changed if field not in note_dict]
+            expression = "data"
+            params = []
+            if set_fields:
+                expression = f"json_set({expression}{', ?, json(?)' * len(set_fields)})"
+                for field in set_fields:
+                    params += [f"$.{field}", json.dumps(note_dict[field], ensure_ascii=False)]
+            if removed_fields:
+                expression = f"json_remove({expression}{', ?' * len(removed_fields)})"
+                params += [f"$.{field}" for field in removed_fields]
+
+            # Запись проходит, только если заметку не изменили после чтения: проверка
+            # If-Match и запись атомарны, а соединение не держит блокировку, пока
+            # патч проверяется в Python
+            with conn:
+                updated = conn.execute(
+                    f"UPDATE notes SET data = {expression} "
+                    "WHERE canvas_id = ? AND id = ? AND json_extract(data, '$.updated_at') = ?",
+                    (*params, canvas_id, note_id, existing["updated_at"])
+                ).rowcount
+            if updated:
+                return note_dict
+            # Заметку изменили параллельно: перечитываем её. С If-Match повторная
+            # проверка выбросит NoteConflictError, без него патч применится к новой версии
+
+    def delete_note(self, canvas_id: str, note_id: str) -> bool:
+        conn = self._connection()
+        with conn:
+            return conn.execute(
+                "DELETE FROM notes WHERE canvas_id = ? AND id = ?", (canvas_id, note_id)
+            ).rowcount > 0
+
+    def apply_note_batch(self, canvas_id: str, operations: list) -> list[dict]:
+        results = []
+        # Ошибка в любой операции откатывает всю транзакцию; канвас не удалят,
+        # пока она не закончится
+        with self._write_transaction() as conn:
+            if conn.execute("SELECT 1 FROM canvases WHERE id = ?", (canvas_id,)).fetchone() is None:
+                raise CanvasNotFoundError(canvas_id)
+            for i, operation in enumerate(operations):
+                if operation.op == "create":
+                    note_dict = build_note(operation.note)
+                    conn.execute(
+                        "INSERT INTO notes (canvas_id, id, data) VALUES (?, ?, ?)",
+                        (canvas_id, note_dict["id"], json.dumps(note_dict, ensure_ascii=False))
+                    )
+                    results.append({"op": "create", "id": note_dict["id"], "note": note_dict})
+                elif operation.op == "update":
+                    row = conn.execute(
+                        "SELECT data FROM notes WHERE canvas_id = ? AND id = ?", (canvas_id, operation.id)
+                    ).fetchone()
+                    if row is None:
+                        raise NoteBatchError(i, f"Note {operation.id} not found")
+                    note_dict = rebuild_note(json.loads(row[0]), operation.note)
+                    conn.execute(
+                        "UPDATE notes SET data = ? WHERE canvas_id = ? AND id = ?",
+                        (json.dumps(note_dict, ensure_ascii=False), canvas_id, operation.id)
+                    )
+                    results.append({"op": "update", "id": operation.id, "note": note_dict})
+                else:
+                    deleted = conn.execute(
+                        "DELETE FROM notes WHERE canvas_id = ? AND id = ?", (canvas_id, operation.id)
+                    ).rowcount
+                    if not deleted:
+                        raise NoteBatchError(i, f"Note {operation.id} not found")
+                    results.append({"op": "delete", "id": operation.id})
+        return results
+
+    def _update_fields(self, canvas_id: str, updates: dict[str, dict], fields: tuple[str, str]) -> int:
+        # Меняем только нужные поля внутри JSON, не перечитывая заметку целиком
+        now = utcnow()
+        conn = self._connection()
+        with conn:
+            cursor = conn.executemany(
+                f"UPDATE notes SET data = json_set(data, '$.{fields[0]}', ?, '$.{fields[1]}', ?, '$.updated_at', ?) "
+                "WHERE canvas_id = ? AND id = ?",
+                [
+                    (values[fields[0]], values[fields[1]], now, canvas_id, note_id)
+                    for note_id, values in updates.items()
+                ]
+            )
+        return cursor.rowcount
+
+    def update_note_positions(self, canvas_id: str, position_updates: list) -> int:
+        return self._update_fields(canvas_id, updates_by_id(position_updates, ("x", "y")), ("x", "y"))
+
+    def update_note_sizes(self, canvas_id: str, size_updates: list) -> int:
+        return self._update_fields(canvas_id, updates_by_id(size_updates, ("width", "height")), ("width", "height"))
+
+    def list_media(self, canvas_id: str) -> list[dict]:
+        rows = self._connection().execute(
+            "SELECT file_path, size FROM media WHERE canvas_id = ? ORDER BY file_path", (canvas_id,)
+        )
+        return [{"file_path": row[0], "size": row[1]} for row in rows]
+
+    def add_media(self, canvas_id: str, file_path: str, size: int):
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO media (canvas_id, file_path, size) VALUES (?, ?, ?)",
+                (canvas_id, file_path, size)
+            )
+
+    def remove_media(self, canvas_id: str, file_path: str):
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM media WHERE canvas_id = ? AND file_path = ?", (canvas_id, file_path))
@@ -0,0 +1,240 @@
+import array
+import asyncio
+import json
+import math
+import threading
+import warnings
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional
+
+from backend.app.core.config import settings
+from backend.app.services.admission import lower_thread_priority
+from backend.app.services.cache import file_cache
+
+try:
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", DeprecationWarning)
+        import audioop
+except ImportError:  # Python 3.13+
+    audioop = None
+
+
+MODELS = {
+    "en-us": "models_vosk/vosk-model-small-en-us-0.15",
+    "ru-ru": "models_vosk/vosk-model-ru-0.10"
+}
+
+# Окно, по которому считается громкость при поиске пауз
+ENERGY_FRAME_MS = 30
+
+# Сегменты режутся по паузе не короче MIN_SILENCE_MS после MIN_SEGMENT_SECONDS;
+# если паузы нет, сегмент режется в самом тихом месте до MAX_SEGMENT_SECONDS
+MIN_SEGMENT_SECONDS = 15
+MAX_SEGMENT_SECONDS = 45
+MIN_SILENCE_MS = 300
+
+# Порог тишины для 16-битного звука (примерно -40 dBFS)
+SILENCE_RMS = 300
+
+# Модели vosk по языку; сам vosk импортируется при первой загрузке модели
+_models: Dict[str, object] = {}
+_models_lock = threading.Lock()
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_model(lang: str):
+    """Загрузить модель один раз на процесс; её разделяют все распознаватели"""
+    with _models_lock:
+        if lang not in _models:
+            from vosk import Model
+            _models[lang] = Model(MODELS[lang])
+        return _models[lang]
+
+
+def warmup() -> list[str]:
+    """Загрузить модели, которые есть на диске; вернуть их языки"""
+    return [lang for lang, path in MODELS.items() if Path(path).is_dir() and get_model(lang)]
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    # Вызовы vosk отпускают GIL, поэтому сегменты распознаются на разных ядрах
+    # в потоках одного процесса, и модель хранится в памяти в одном экземпляре
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.transcription_workers,
+            thread_name_prefix="transcribe",
+            initializer=lower_thread_priority
+        )
+    return _executor
+
+
+async def run_in_pool(func, *args):
+    """Выполнить блокирующую функцию (например, ffmpeg) в пуле транскрипции"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), func, *args)
+
+
+def _frame_rms(data: bytes, width: int) -> float:
+    if audioop is not None:
+        return audioop.rms(data, width)
+    if width != 2:
+        return float(SILENCE_RMS)
+    # Для оценки громкости достаточно каждого восьмого отсчёта
+    samples = array.array("h", data)[::8]
+    if not samples:
+        return 0.0
+    return math.sqrt(sum(s * s for s in samples) / len(samples))
+
+
+def split_on_silence(wav_path: Path) -> List[tuple[int, int]]:
+    """Разбить запись на сегменты по паузам: [(первый кадр, число кадров)]"""
+    with wave.open(str(wav_path), "rb") as wf:
+        rate = wf.getframerate()
+        width = wf.getsampwidth()
+        frame_size = wf.getnchannels() * width
+        window = max(1, rate * ENERGY_FRAME_MS // 1000)
+
+        energies = []
+        while True:
+            data = wf.readframes(window * 1000)
+            if not data:
+                break
+            step = window * frame_size
+            for offset in range(0, len(data), step):
+                energies.append(_frame_rms(data[offset:offset + step], width))
+
+    windows_per_second = 1000 / ENERGY_FRAME_MS
+    min_windows = int(MIN_SEGMENT_SECONDS * windows_per_second)
+    max_windows = int(MAX_SEGMENT_SECONDS * windows_per_second)
+    silence_windows = max(1, MIN_SILENCE_MS // ENERGY_FRAME_MS)
+
+    # Порог подстраивается под шум записи, но остаётся заметно ниже громкости речи
+    ordered = sorted(energies)
+    noise_floor = ordered[len(ordered) // 10] if ordered else 0
+    median = ordered[len(ordered) // 2] if ordered else 0
+    threshold = max(SILENCE_RMS, min(noise_floor * 1.5, median * 0.5))
+
+    bounds = []
+    start = 0
+    while len(energies) - start > max_windows:
+        cut = None
+        run = 0
+        for i in range(start + min_windows, start + max_windows):
+            if energies[i] < threshold:
+                run += 1
+                if run >= silence_windows:
+                    cut = i - run // 2
+                    break
+            else:
+                run = 0
+        if cut is None:
+            cut = min(range(start + min_windows, start + max_windows), key=energies.__getitem__)
+        bounds.append((start, cut))
+        start = cut
+    bounds.append((start, len(energies)))
+
+    return [(begin * window, (end - begin) * window) for begin, end in bounds]
+
+
+def _transcribe_segment(wav_path: Path, lang: str, start_frame: int, nframes: int) -> dict:
+    """Распознать один сегмент своим распознавателем; время слов — от начала записи"""
+    from vosk import KaldiRecognizer
+
+    model = get_model(lang)
+    texts = []
+    words = []
+
+    with wave.open(str(wav_path), "rb") as wf:
+        rate = wf.getframerate()
+        wf.setpos(start_frame)
+        rec = KaldiRecognizer(model, rate)
+        rec.SetWords(True)
+
+        def collect(result: str):
+            res = json.loads(result)
+            if res.get("text"):
+                texts.append(res["text"])
+            words.extend(res.get("result", []))
+
+        frame_size = wf.getnchannels() * wf.getsampwidth()
+        remaining = nframes
+        while remaining > 0:
+            data = wf.readframes(min(4000, remaining))
+            if not data:
+                break
+            remaining -= len(data) // frame_size
+            if rec.AcceptWaveform(data):
+                collect(rec.Result())
+        collect(rec.FinalResult())
+
+    offset = start_frame / rate
+    return {
+        "text": " ".join(texts),
+        "words": [
+            {
+                "word": w["word"],
+                "start": round(w["start"] + offset, 3),
+                "end": round(w["end"] + offset, 3),
+                "conf": w.get("conf"),
+            }
+            for w in words
+        ],
+    }
+
+
+def combine_segments(results: List[dict]) -> dict:
+    """Собрать результат записи из результатов сегментов"""
+    return {
+        "transcript": " ".join(r["text"] for r in results if r["text"]),
+        "words": [w for r in results for w in r["words"]],
+        "segments": len(results),
+    }
+
+
+async def iter_segments(wav_path: Path, lang: str, source_path: Optional[Path] = None) -> AsyncIterator[dict]:
+    """Распознать WAV параллельно по сегментам, отдавая результаты сегментов по порядку.
+
+    Все сегменты сразу ставятся в пул; результат сегмента отдаётся, как только
+    готовы он и все предыдущие. Результат каждого сегмента кешируется по хешу
+    исходного файла (source_path, по умолчанию сам wav_path), языку и границам
+    сегмента, поэтому повторный запуск распознаёт только недостающие сегменты.
+    Если перебор прерван ошибкой или отключением клиента, ещё не начатые
+    сегменты отменяются. Элементы: {"index", "segments", "text", "words"}.
+    """
+    loop = asyncio.get_running_loop()
+    file_key = await loop.run_in_executor(None, file_cache.get_file_key, source_path or wav_path)
+    segments = await loop.run_in_executor(None, split_on_silence, wav_path)
+
+    def run_segment(start_frame: int, nframes: int) -> dict:
+        # Кешируем в потоке пула: результат сохранится, даже если ожидание уже отменено
+        cached = file_cache.get_segment_result(file_key, lang, start_frame, nframes)
+        if cached is not None:
+            return cached
+        result = _transcribe_segment(wav_path, lang, start_frame, nframes)
+        file_cache.set_segment_result(file_key, lang, start_frame, nframes, result)
+        return result
+
+    futures = [
+        loop.run_in_executor(_get_executor(), run_segment, start, nframes)
+        for start, nframes in segments
+    ]
+    try:
+        for i, future in enumerate(futures):
+            result = await future
+            yield {"index": i, "segments": len(segments), **result}
+    finally:
+        for future in futures:
+            if not future.cancel() and not future.cancelled():
+                # Ошибки остальных сегментов уже никто не ждёт
+                future.exception()
+
+
+async def transcribe_wav(wav_path: Path, lang: str, source_path: Optional[Path] = None) -> dict:
+    """Распознать WAV целиком; см. iter_segments.
+
+    Возвращает {"transcript": str, "words": [...], "segments": int}.
+    """
+    return combine_segments([result async for result in iter_segments(wav_path, lang, source_path)])
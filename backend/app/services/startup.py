@@ -0,0 +1,101 @@
+import logging
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from backend.app.core.config import settings
+from backend.app.services.repository import Repository
+
+try:
+    import resource
+except ImportError:
+    # На Windows модуля нет
+    resource = None
+
+
+logger = logging.getLogger(__name__)
+
+# Тяжёлые библиотеки, которые импортируются только при первом использовании
+HEAVY_MODULES = ("PIL", "pytesseract", "vosk")
+
+
+def _max_rss_kb() -> Optional[int]:
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # На macOS ru_maxrss в байтах, на Linux — в килобайтах
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+class StartupReport:
+    """Время этапов запуска и прогрева; отдаётся через /system/startup"""
+
+    def __init__(self):
+        self._started = time.perf_counter()
+        self._ready_ms: Optional[float] = None
+        self._steps: list[dict] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def step(self, name: str, phase: str = "startup"):
+        """Замерить этап; ошибка записывается в отчёт и пробрасывается дальше"""
+        started = time.perf_counter()
+        entry = {"name": name, "phase": phase}
+        try:
+            yield
+        except Exception as e:
+            entry["error"] = str(e) or type(e).__name__
+            raise
+        finally:
+            entry["ms"] = round((time.perf_counter() - started) * 1000, 1)
+            with self._lock:
+                self._steps.append(entry)
+
+    def mark_ready(self):
+        self._ready_ms = round((time.perf_counter() - self._started) * 1000, 1)
+
+    def get_report(self) -> dict:
+        with self._lock:
+            steps = list(self._steps)
+        return {
+            "features": sorted(settings.features),
+            "warmup": settings.warmup,
+            "ready_ms": self._ready_ms,
+            "steps": steps,
+            "loaded_modules": [name for name in HEAVY_MODULES if name in sys.modules],
+            "max_rss_kb": _max_rss_kb(),
+        }
+
+
+def warmup(repo: Repository):
+    """Заранее загрузить библиотеки, модели и индексы включённых подсистем.
+
+    Выполняется в фоновом потоке после старта; сбой одного шага не мешает
+    остальным и только записывается в отчёт.
+    """
+    from backend.app.services import ocr, preview, speech
+    from backend.app.services.image_index import image_index
+    from backend.app.services.tools import find_ffmpeg
+
+    steps = []
+    if "ocr" in settings.features:
+        steps.append(("tesseract", ocr.warmup))
+        steps.append(("image_index", lambda: image_index.start_loading(repo.list_canvases).join()))
+    if "transcription" in settings.features:
+        steps.append(("ffmpeg", find_ffmpeg))
+        steps.append(("vosk_models", speech.warmup))
+    if "previews" in settings.features:
+        steps.append(("preview_fonts", lambda: preview._font(16)))
+
+    for name, func in steps:
+        try:
+            with startup_report.step(name, phase="warmup"):
+                func()
+        except Exception:
+            logger.warning("Warmup step %s failed", name, exc_info=True)
+
+
+# Глобальный экземпляр
+startup_report = StartupReport()
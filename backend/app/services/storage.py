@@ -1,56 +1,147 @@
 import os
 import json
+import shutil
 from datetime import datetime
+from pathlib import Path
+from typing import Iterator, Optional
 import uuid
 
+from backend.app.core.config import settings
 
-BASE_PATH = "data/canvases"
 
+MEDIA_FOLDERS = ["images", "audio", "drawings", "ocr", "transcripts"]
+
+# Служебные папки внутри settings.data_dir
+TRASH_DIR = ".trash"
+STAGING_DIR = ".staging"
+PREVIEW_DIR = ".previews"
 
-def list_canvases():
-    if not os.path.exists(BASE_PATH):
-        return []
-    return [name for name in os.listdir(BASE_PATH) if os.path.isdir(os.path.join(BASE_PATH, name))]
 
+def _sharded_path(canvas_id: str) -> Path:
+    prefix_length = settings.shard_prefix_length
+    if prefix_length <= 0:
+        return settings.data_dir / canvas_id
+    return settings.data_dir / canvas_id[:prefix_length] / canvas_id
 
-def create_canvas(name: str):
-    canvas_id = str(uuid.uuid4())
-    path = os.path.join(BASE_PATH, canvas_id)
-    os.makedirs(path, exist_ok=False)
 
+def get_canvas_path(canvas_id: str) -> Path:
+    """Папка канваса: data/canvases/<префикс id>/<id>.
 
-    notes_path = os.path.join(path, "notes.json")
-    with open(notes_path, "w", encoding="utf-8") as f:
-        json.dump([], f)
+    Канвас из старой плоской раскладки (data/canvases/<id>) переносится
+    в свою подпапку при первом обращении.
+    """
+    path = _sharded_path(canvas_id)
+    if path.parent != settings.data_dir and not path.exists():
+        legacy_path = settings.data_dir / canvas_id
+        if (legacy_path / "meta.json").exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                os.rename(legacy_path, path)
+            except FileNotFoundError:
+                # Канвас уже перенесён параллельным запросом
+                pass
+    return path
 
 
-    for folder in ["images", "audio", "drawings", "ocr", "transcripts"]:
-        os.makedirs(os.path.join(path, folder), exist_ok=True)
+def iter_media_files(canvas_dir: Path) -> Iterator[tuple[Path, str]]:
+    """Файлы канваса в медиапапках: (путь на диске, путь относительно канваса)"""
+    for folder in MEDIA_FOLDERS:
+        folder_dir = canvas_dir / folder
+        if not folder_dir.is_dir():
+            continue
+        for entry in os.scandir(folder_dir):
+            if entry.is_file():
+                yield Path(entry.path), f"{folder}/{entry.name}"
 
-    meta = {
-        "id": canvas_id,
+
+def new_canvas_meta(name: str) -> dict:
+    now = datetime.utcnow().isoformat()
+    return {
+        "id": str(uuid.uuid4()),
         "name": name,
-        "created_at": datetime.utcnow().isoformat(),
-        "updated_at": datetime.utcnow().isoformat(),
+        "created_at": now,
+        "updated_at": now,
     }
-    with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
-        json.dump(meta, f)
+
+
+def new_staging_dir() -> Path:
+    """Создать временную папку для сборки нового канваса"""
+    path = settings.data_dir / STAGING_DIR / uuid.uuid4().hex
+    path.mkdir(parents=True)
+    for folder in MEDIA_FOLDERS:
+        (path / folder).mkdir()
+    return path
+
+
+def publish_canvas_dir(staging: Path, canvas_id: str):
+    """Атомарно сделать собранную папку папкой канваса"""
+    for folder in MEDIA_FOLDERS:
+        (staging / folder).mkdir(exist_ok=True)
+    path = _sharded_path(canvas_id)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    os.rename(staging, path)
+
+
+def move_to_trash(canvas_id: str) -> bool:
+    """Переместить папку канваса в корзину; файлы удаляются позже в фоне"""
+    path = get_canvas_path(canvas_id)
+    if not path.is_dir():
+        return False
+
+    trash_path = settings.data_dir / TRASH_DIR
+    trash_path.mkdir(parents=True, exist_ok=True)
+    os.rename(path, trash_path / f"{canvas_id}-{uuid.uuid4().hex}")
+    return True
+
+
+# Канвасы в раскладке JSON-файлов: meta.json и notes.json в папке канваса
+
+def list_canvases() -> list[str]:
+    base_path = settings.data_dir
+    if not base_path.is_dir():
+        return []
+
+    canvases = []
+    # Служебные папки (например, .staging) начинаются с точки
+    for entry in os.scandir(base_path):
+        if entry.name.startswith(".") or not entry.is_dir():
+            continue
+        if os.path.exists(os.path.join(entry.path, "meta.json")):
+            # Канвас в плоской раскладке
+            canvases.append(entry.name)
+            continue
+        for canvas_entry in os.scandir(entry.path):
+            if canvas_entry.is_dir() and os.path.exists(os.path.join(canvas_entry.path, "meta.json")):
+                canvases.append(canvas_entry.name)
+    return canvases
+
+
+def create_canvas(name: str, notes: Optional[list[dict]] = None, staging: Optional[Path] = None) -> dict:
+    meta = new_canvas_meta(name)
+    path = staging or new_staging_dir()
+    try:
+        with open(path / "notes.json", "w", encoding="utf-8") as f:
+            json.dump(notes or [], f, ensure_ascii=False, indent=2)
+
+        with open(path / "meta.json", "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+
+        publish_canvas_dir(path, meta["id"])
+    except BaseException:
+        shutil.rmtree(path, ignore_errors=True)
+        raise
 
     return meta
 
 
-def delete_canvas(canvas_id: str):
-    import shutil
-    path = os.path.join(BASE_PATH, canvas_id)
-    if os.path.exists(path):
-        shutil.rmtree(path)
-        return True
-    return False
+def delete_canvas(canvas_id: str) -> bool:
+    """Переместить канвас в корзину; файлы удаляются позже в фоне"""
+    return move_to_trash(canvas_id)
 
 
 def get_canvas_meta(canvas_id: str):
-    path = os.path.join(BASE_PATH, canvas_id, "meta.json")
-    if os.path.exists(path):
+    path = get_canvas_path(canvas_id) / "meta.json"
+    if path.exists():
         with open(path, "r", encoding="utf-8") as f:
             return json.load(f)
     return None
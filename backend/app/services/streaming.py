@@ -0,0 +1,243 @@
+import json
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Callable, Iterable, Iterator, Optional
+
+from pydantic import TypeAdapter
+
+from backend.app.core.config import settings
+from backend.app.schemas.note import Note
+
+# zstd и brotli необязательны: без них ответы сжимаются gzip
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# Заметки сериализуются и сжимаются порциями примерно такого размера
+CHUNK_SIZE = 64 * 1024
+
+# Ответы меньше этого размера целиком не сжимаются: выигрыш меньше накладных расходов
+MIN_COMPRESS_SIZE = 1024
+
+_note_adapter = TypeAdapter(Note)
+
+
+def available_encodings() -> list[str]:
+    """Поддерживаемые сжатия в порядке предпочтения сервера"""
+    encodings = []
+    if zstandard is not None:
+        encodings.append("zstd")
+    if brotli is not None:
+        encodings.append("br")
+    encodings.append("gzip")
+    return encodings
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Выбрать сжатие по заголовку Accept-Encoding; None — отдавать без сжатия"""
+    if not accept_encoding:
+        return None
+
+    weights = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.partition(";")
+        name = name.strip().lower()
+        weight = 1.0
+        params = params.replace(" ", "")
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        if name:
+            weights[name] = weight
+
+    # При равном весе выигрывает сжатие, которое сервер предпочитает
+    best, best_weight = None, 0.0
+    for encoding in available_encodings():
+        weight = weights.get(encoding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+class _Encoder:
+    """Потоковое сжатие; каждая порция сбрасывается сразу, чтобы клиент не ждал конца ответа"""
+
+    def __init__(self, encoding: str):
+        self._encoding = encoding
+        if encoding == "gzip":
+            self._compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        elif encoding == "br":
+            self._compressor = brotli.Compressor(quality=5)
+        elif encoding == "zstd":
+            self._compressor = zstandard.ZstdCompressor(level=3).compressobj()
+        else:
+            raise ValueError(f"Unsupported encoding: {encoding}")
+
+    def compress(self, data: bytes) -> bytes:
+        if self._encoding == "gzip":
+            return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        if self._encoding == "br":
+            return self._compressor.process(data) + self._compressor.flush()
+        return self._compressor.compress(data) + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        if self._encoding == "br":
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+
+def encode(chunks: Iterable[bytes], encoding: Optional[str]) -> Iterator[bytes]:
+    """Сжать поток порций; при encoding=None порции отдаются как есть"""
+    if encoding is None:
+        yield from chunks
+        return
+    encoder = _Encoder(encoding)
+    for chunk in chunks:
+        data = encoder.compress(chunk)
+        if data:
+            yield data
+    yield encoder.finish()
+
+
+async def encode_async(chunks, encoding: Optional[str]):
+    """То же, что encode(), для асинхронного потока порций"""
+    if encoding is None:
+        async for chunk in chunks:
+            yield chunk
+        return
+    encoder = _Encoder(encoding)
+    async for chunk in chunks:
+        data = encoder.compress(chunk)
+        if data:
+            yield data
+    yield encoder.finish()
+
+
+def encode_body(body: bytes, encoding: Optional[str]) -> tuple[bytes, Optional[str]]:
+    """Сжать готовое тело ответа: (тело, фактическое сжатие или None)"""
+    if encoding is None or len(body) < MIN_COMPRESS_SIZE:
+        return body, None
+    encoder = _Encoder(encoding)
+    return encoder.compress(body) + encoder.finish(), encoding
+
+
+def ndjson_line(item) -> bytes:
+    return json.dumps(item, ensure_ascii=False).encode("utf-8") + b"\n"
+
+
+def iter_notes_json(notes: Iterable[dict], ndjson: bool = False) -> Iterator[bytes]:
+    """Сериализовать заметки порциями: JSON-массивом или NDJSON (заметка на строку).
+
+    Каждая заметка проходит через схему Note, как ответ с response_model,
+    поэтому служебные поля вроде уровней детализации рисунка не попадают в ответ.
+    """
+    buffer = bytearray() if ndjson else bytearray(b"[")
+    first = True
+    for note in notes:
+        if not ndjson and not first:
+            buffer += b","
+        buffer += _note_adapter.dump_json(_note_adapter.validate_python(note))
+        if ndjson:
+            buffer += b"\n"
+        first = False
+        if len(buffer) >= CHUNK_SIZE:
+            yield bytes(buffer)
+            buffer.clear()
+    if not ndjson:
+        buffer += b"]"
+    if buffer:
+        yield bytes(buffer)
+
+
+class ResponseCache:
+    """LRU-кеш готовых, уже сериализованных и сжатых тел ответов.
+
+    Ключ — кортеж, начинающийся с id канваса и ревизии его заметок, поэтому
+    изменение заметок делает прежние записи ненужными; они удаляются, как только
+    сохраняется запись новой ревизии того же канваса.
+    """
+
+    def __init__(self, max_bytes: int):
+        self._max_bytes = max_bytes
+        # Одна запись занимает не больше четверти кеша
+        self._max_entry_bytes = max_bytes // 4
+        self._entries: "OrderedDict[tuple, bytes]" = OrderedDict()
+        self._size = 0
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple) -> Optional[bytes]:
+        with self._lock:
+            body = self._entries.get(key)
+            if body is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return body
+
+    def put(self, key: tuple, body: bytes):
+        if len(body) > self._max_entry_bytes:
+            return
+        with self._lock:
+            canvas_id, revision = key[0], key[1]
+            for old_key in [k for k in self._entries if k[0] == canvas_id and k[1] != revision]:
+                self._size -= len(self._entries.pop(old_key))
+            if key in self._entries:
+                self._size -= len(self._entries.pop(key))
+            self._entries[key] = body
+            self._size += len(body)
+            while self._size > self._max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def forget_canvas(self, canvas_id: str):
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == canvas_id]:
+                self._size -= len(self._entries.pop(key))
+
+    def stream(self, key: tuple, chunks: Iterable[bytes], is_current: Callable[[], bool]) -> Iterator[bytes]:
+        """Отдавать порции ответа, попутно собирая их для кеша.
+
+        Тело сохраняется, только если ответ отдан до конца, уместился в запись
+        кеша и ревизия заметок за это время не изменилась.
+        """
+        parts: Optional[list[bytes]] = []
+        size = 0
+        for chunk in chunks:
+            if parts is not None:
+                size += len(chunk)
+                if size > self._max_entry_bytes:
+                    parts = None
+                else:
+                    parts.append(chunk)
+            yield chunk
+        if parts is not None and is_current():
+            self.put(key, b"".join(parts))
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self._max_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+            }
+
+
+# Глобальный экземпляр
+response_cache = ResponseCache(settings.response_cache_mb * 1024 * 1024)
@@ -0,0 +1,48 @@
+import os
+import shutil
+from typing import Optional
+
+from backend.app.core.config import settings
+
+
+# Где искать программы, если их нет в PATH
+TESSERACT_CANDIDATES = (
+    r"C:\Program Files\Tesseract-OCR\tesseract.exe",
+    r"C:\Program Files (x86)\Tesseract-OCR\tesseract.exe",
+    "/opt/homebrew/bin/tesseract",
+    "/usr/local/bin/tesseract",
+)
+FFMPEG_CANDIDATES = (
+    r"C:\ffmpeg\bin\ffmpeg.exe",
+    r"C:\Program Files\ffmpeg\bin\ffmpeg.exe",
+    "/opt/homebrew/bin/ffmpeg",
+    "/usr/local/bin/ffmpeg",
+)
+
+# Найденные пути; неудачный поиск не запоминается, чтобы программу,
+# установленную после запуска сервера, было видно без перезапуска
+_found: dict[str, str] = {}
+
+
+def _find(name: str, configured: Optional[str], candidates: tuple[str, ...]) -> Optional[str]:
+    # Явно заданный путь не перепроверяем: ошибка запуска скажет больше, чем «не найдено»
+    if configured:
+        return configured
+    if name in _found:
+        return _found[name]
+    found = shutil.which(name)
+    if not found:
+        found = next((c for c in candidates if os.path.isfile(c)), None)
+    if found:
+        _found[name] = found
+    return found
+
+
+def find_tesseract() -> Optional[str]:
+    """Путь к tesseract; найденный путь запоминается на время работы процесса"""
+    return _find("tesseract", settings.tesseract_cmd, TESSERACT_CANDIDATES)
+
+
+def find_ffmpeg() -> Optional[str]:
+    """Путь к ffmpeg; найденный путь запоминается на время работы процесса"""
+    return _find("ffmpeg", settings.ffmpeg_path, FFMPEG_CANDIDATES)
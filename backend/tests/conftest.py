@@ -0,0 +1,37 @@
+import os
+import tempfile
+
+# Настройки читаются при импорте backend.app, поэтому окружение задаётся до него.
+# Тяжёлые подсистемы выключены: тестам заметок не нужны tesseract, vosk и ffmpeg
+_data_dir = tempfile.mkdtemp(prefix="smartnotes-tests-")
+os.environ["SMARTNOTES_DATA_DIR"] = os.path.join(_data_dir, "canvases")
+os.environ["SMARTNOTES_SQLITE_PATH"] = os.path.join(_data_dir, "smartnotes.db")
+os.environ["SMARTNOTES_FEATURES"] = ""
+os.environ["SMARTNOTES_WARMUP"] = "0"
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.app.core.config import settings
+from backend.app.main import app
+from backend.app.services.repository import get_repository
+
+
+@pytest.fixture(params=["json", "sqlite", "memory"])
+def storage_backend(request, monkeypatch):
+    """Тест с хранилищем выполняется для каждого бэкенда"""
+    monkeypatch.setattr(settings, "storage_backend", request.param)
+    get_repository.cache_clear()
+    yield request.param
+    get_repository.cache_clear()
+
+
+@pytest.fixture
+def client(storage_backend):
+    with TestClient(app) as c:
+        yield c
+
+
+@pytest.fixture
+def canvas_id(client):
+    return client.post("/canvases/", json={"name": "test"}).json()["id"]
@@ -0,0 +1,3 @@
+def text_note(title: str = "t", **fields) -> dict:
+    """Тело запроса для создания текстовой заметки"""
+    return {"type": "text", "title": title, "content": "c", "x": 0, "y": 0, **fields}
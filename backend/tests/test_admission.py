@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+
+from backend.app.services.admission import AdmissionRejected, Limiter, limiters
+
+
+def test_limiter_rejects_when_queue_is_full():
+    async def scenario():
+        limiter = Limiter("test", limit=1, queue_size=1)
+        await limiter.acquire()
+        waiting = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+
+        with pytest.raises(AdmissionRejected) as e:
+            await limiter.acquire()
+        assert e.value.retry_after >= 1
+        assert limiter.get_stats()["rejected"] == 1
+
+        # Освободившееся место переходит ожидающему запросу
+        limiter.release(0.01)
+        await waiting
+        stats = limiter.get_stats()
+        assert (stats["active"], stats["queued"], stats["admitted"]) == (1, 0, 2)
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_leaves_queue():
+    async def scenario():
+        limiter = Limiter("test", limit=1, queue_size=1)
+        await limiter.acquire()
+        waiting = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+
+        assert limiter.get_stats()["queued"] == 0
+        limiter.release(0.01)
+        assert limiter.get_stats()["active"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_full_class_returns_503_with_retry_after(client, canvas_id, monkeypatch):
+    limiter = limiters["interactive"]
+    # Все места заняты, очереди нет: следующий запрос сразу отклоняется
+    monkeypatch.setattr(limiter, "limit", 1)
+    monkeypatch.setattr(limiter, "queue_size", 0)
+    monkeypatch.setattr(limiter, "_active", 1)
+
+    r = client.get(f"/canvases/{canvas_id}/notes/")
+    assert r.status_code == 503
+    assert int(r.headers["Retry-After"]) >= 1
+
+    # Другие классы запросов не затронуты
+    assert client.get("/system/admission").json()["interactive"]["rejected"] >= 1
+    assert client.get(f"/canvases/{canvas_id}").status_code == 200
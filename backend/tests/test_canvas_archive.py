@@ -0,0 +1,152 @@
+import io
+import json
+import zipfile
+
+import pytest
+
+from backend.app.core.config import settings
+from backend.app.services import storage
+from backend.app.services.repository import get_repository
+
+from backend.tests.helpers import text_note
+
+IMAGE = b"\x89PNG fake image " * 64
+
+
+def _zip(members: dict[str, bytes], compression=zipfile.ZIP_STORED) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression) as zf:
+        for name, data in members.items():
+            zf.writestr(name, data)
+    return buffer.getvalue()
+
+
+def _import(client, archive: bytes):
+    return client.post("/canvases/import", files={"file": ("canvas.zip", archive, "application/zip")})
+
+
+def _meta(name: str = "imported") -> bytes:
+    return json.dumps({"name": name}).encode()
+
+
+def _staging_entries() -> list:
+    staging_root = settings.data_dir / storage.STAGING_DIR
+    return list(staging_root.iterdir()) if staging_root.is_dir() else []
+
+
+@pytest.fixture
+def filled_canvas(client, canvas_id):
+    url = f"/canvases/{canvas_id}/notes/"
+    client.post(url, json=text_note("заметка", tags=["a"]))
+    client.post(url, json={"type": "drawing", "x": 1, "y": 2, "drawing_data": {"paths": [[[0, 0], [5, 5]]]}})
+    image = client.post(f"/canvases/{canvas_id}/upload/image", files={"file": ("a.png", IMAGE, "image/png")})
+    return canvas_id, image.json()["file_path"]
+
+
+def test_export_import_round_trip(client, filled_canvas):
+    canvas_id, image_path = filled_canvas
+    r = client.get(f"/canvases/{canvas_id}/export")
+    assert r.status_code == 200
+
+    imported = _import(client, r.content)
+    assert imported.status_code == 200
+    imported_id = imported.json()["id"]
+    assert imported_id != canvas_id
+    assert imported.json()["name"] == "test"
+
+    repo = get_repository()
+    assert repo.list_notes(imported_id) == repo.list_notes(canvas_id)
+    assert client.get(f"/canvases/{imported_id}/media").json()["images"] == [image_path]
+    assert (storage.get_canvas_path(imported_id) / image_path).read_bytes() == IMAGE
+    assert _staging_entries() == []
+
+
+def test_import_name_override(client, filled_canvas):
+    archive = client.get(f"/canvases/{filled_canvas[0]}/export").content
+    r = client.post("/canvases/import", params={"name": "другое"},
+                    files={"file": ("canvas.zip", archive, "application/zip")})
+    assert r.json()["name"] == "другое"
+
+
+@pytest.mark.parametrize("name", [
+    "../evil.txt",
+    "/etc/passwd",
+    "images/../../evil.png",
+    "images/./a.png",
+    "images\\a.png",
+    "images/sub/a.png",
+    "secret/a.png",
+    "notes.json/x",
+])
+def test_unsafe_member_names_are_rejected(client, name):
+    canvases = client.get("/canvases/").json()
+    r = _import(client, _zip({"meta.json": _meta(), name: b"x"}))
+    assert r.status_code == 400
+    assert name in r.json()["detail"]
+    assert client.get("/canvases/").json() == canvases
+    assert _staging_entries() == []
+
+
+def test_too_many_members(client, monkeypatch):
+    monkeypatch.setattr(settings, "import_max_members", 2)
+    r = _import(client, _zip({"meta.json": _meta(), "images/a.png": b"a", "images/b.png": b"b"}))
+    assert r.status_code == 400
+    assert "more than 2 entries" in r.json()["detail"]
+
+
+def test_zip_bomb(client, monkeypatch):
+    monkeypatch.setattr(settings, "import_max_size_mb", 1)
+    # Мегабайт нулей сжимается в несколько килобайт
+    archive = _zip({"meta.json": _meta(), "images/a.png": bytes(1024 * 1024)}, zipfile.ZIP_DEFLATED)
+    assert len(archive) < 10 * 1024
+
+    r = _import(client, archive)
+    assert r.status_code == 400
+    assert "larger than 1 MB" in r.json()["detail"]
+    assert _staging_entries() == []
+
+
+def test_corrupt_member(client):
+    archive = _zip({"meta.json": _meta(), "images/a.png": IMAGE})
+    # Данные элемента хранятся без сжатия: порча ломает CRC
+    corrupted = archive.replace(IMAGE, IMAGE[::-1], 1)
+    assert corrupted != archive
+
+    canvases = client.get("/canvases/").json()
+    r = _import(client, corrupted)
+    assert r.status_code == 400
+    assert r.json()["detail"].startswith("Corrupt zip archive")
+    assert client.get("/canvases/").json() == canvases
+    assert _staging_entries() == []
+
+
+@pytest.mark.parametrize("members, detail", [
+    ({"images/a.png": b"a"}, "meta.json is missing"),
+    ({"meta.json": b"{"}, "meta.json is not valid JSON"),
+    ({"meta.json": b"[]"}, "meta.json must contain an object"),
+    ({"meta.json": _meta(), "notes.json": b"{}"}, "notes.json must contain a list"),
+    ({"meta.json": _meta(), "notes.json": b'[{"type": "text"}]'}, "Invalid note in archive: None"),
+])
+def test_invalid_contents(client, members, detail):
+    r = _import(client, _zip(members))
+    assert r.status_code == 400
+    assert r.json()["detail"] == detail
+    assert _staging_entries() == []
+
+
+def test_not_a_zip(client):
+    r = _import(client, b"not a zip")
+    assert r.status_code == 400
+    assert r.json()["detail"] == "Invalid zip archive"
+
+
+def test_duplicate_note_ids(client, canvas_id):
+    note = client.post(f"/canvases/{canvas_id}/notes/", json=text_note()).json()
+    notes = [note, {**note, "title": "copy"}]
+
+    canvases = client.get("/canvases/").json()
+    r = _import(client, _zip({"meta.json": _meta(), "notes.json": json.dumps(notes).encode()}))
+    assert r.status_code == 400
+    assert r.json()["detail"] == f"Duplicate note id in archive: {note['id']}"
+    assert client.get("/canvases/").json() == canvases
+    assert _staging_entries() == []
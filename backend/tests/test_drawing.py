@@ -0,0 +1,251 @@
+import math
+from collections import OrderedDict
+
+import pytest
+
+from backend.app.services import lod_store as lod_store_module, storage
+from backend.app.services.drawing import (
+    build_lod, count_points, lod_level, select_tier, simplify_drawing, simplify_points
+)
+from backend.app.services.lod_store import LOD_DIR, LodStore, drawing_digest, lod_store
+from backend.app.services.media_gc import collect_canvas
+from backend.app.services.repository import get_repository
+
+MERGE_PATCH = {"Content-Type": "application/merge-patch+json"}
+
+
+def _wave(n: int = 1000) -> list[list[float]]:
+    return [[i, math.sin(i / 20) * 100] for i in range(n)]
+
+
+def _drawing_note(points, updated_at="2024-01-01T00:00:00", **drawing_data) -> dict:
+    return {
+        "id": "n1", "type": "drawing", "updated_at": updated_at,
+        "drawing_data": {"paths": [points], "colors": ["#000"], **drawing_data},
+    }
+
+
+def _max_deviation(points, kept) -> float:
+    """Наибольшее расстояние от исходных точек до упрощённой ломаной"""
+    worst = 0.0
+    for a, b in zip(kept, kept[1:]):
+        (x1, y1), (x2, y2) = points[a], points[b]
+        length = math.hypot(x2 - x1, y2 - y1)
+        for x, y in points[a:b + 1]:
+            if length:
+                dist = abs((x2 - x1) * (y - y1) - (y2 - y1) * (x - x1)) / length
+            else:
+                dist = math.hypot(x - x1, y - y1)
+            worst = max(worst, dist)
+    return worst
+
+
+@pytest.mark.parametrize("points", [[], [(0, 0)], [(0, 0), (5, 5)]])
+def test_short_strokes_are_kept(points):
+    assert simplify_points(points, 10) == list(range(len(points)))
+
+
+def test_straight_line_keeps_endpoints():
+    points = [(i, 2 * i) for i in range(100)]
+    assert simplify_points(points, 0.01) == [0, 99]
+
+
+def test_corner_is_kept():
+    points = [(i, 0) for i in range(10)] + [(9, i) for i in range(1, 10)]
+    assert simplify_points(points, 0.5) == [0, 9, 18]
+
+
+@pytest.mark.parametrize("tolerance", [0.5, 2, 10])
+def test_deviation_stays_within_tolerance(tolerance):
+    points = [tuple(p) for p in _wave()]
+    kept = simplify_points(points, tolerance)
+    assert kept[0] == 0 and kept[-1] == len(points) - 1
+    assert _max_deviation(points, kept) <= tolerance + 1e-9
+
+
+def test_simplify_drawing_keeps_point_format_and_other_keys():
+    drawing = {
+        "paths": [[{"x": x, "y": y} for x, y in _wave(200)]],
+        "strokes": [{"points": _wave(200), "color": "#f00", "width": 3}],
+        "tools": ["pen"],
+    }
+    simplified = simplify_drawing(drawing, 4)
+
+    assert simplified["tools"] == ["pen"]
+    assert set(simplified["paths"][0][0]) == {"x", "y"}
+    assert simplified["strokes"][0]["color"] == "#f00"
+    assert count_points(simplified) < count_points(drawing)
+
+
+def test_lod_tiers_get_coarser():
+    tiers = build_lod({"paths": [_wave()]})
+    assert tiers
+    tolerances = [tier["tolerance"] for tier in tiers]
+    points = [tier["points"] for tier in tiers]
+    assert tolerances == sorted(tolerances)
+    assert points == sorted(points, reverse=True)
+    assert points[0] < 1000
+
+
+def test_select_tier_picks_coarsest_fitting_tier():
+    drawing = _drawing_note(_wave())["drawing_data"]
+    tiers = build_lod(drawing)
+    assert select_tier(tiers, drawing, 0.1) is drawing
+
+    for tier in tiers:
+        assert count_points(select_tier(tiers, drawing, tier["tolerance"])) == tier["points"]
+    assert count_points(select_tier(tiers, drawing, 10 ** 6)) == tiers[-1]["points"]
+
+
+def test_lod_level_decides_tier():
+    drawing = _drawing_note(_wave())["drawing_data"]
+    tiers = build_lod(drawing)
+    tolerances = [None, 0.1, 0.99, 1, 3, 4.99, 5, 20, 21, 100, 10 ** 6]
+    levels = [lod_level(t) for t in tolerances]
+    assert levels == [0, 0, 0, 1, 1, 1, 2, 2, 3, 3, 3]
+
+    selected = {}
+    for tolerance, level in zip(tolerances[1:], levels[1:]):
+        tier = select_tier(tiers, drawing, tolerance)
+        assert selected.setdefault(level, tier) is tier
+
+
+def test_response_cache_is_shared_by_zooms_of_one_level(client, canvas_id):
+    url = f"/canvases/{canvas_id}/notes/"
+    client.post(url, json=_drawing_body(_wave()))
+
+    coarse = client.get(url, params={"zoom": 0.01}).content
+    hits = client.get("/system/response-cache").json()["hits"]
+    for zoom in (0.011, 0.02, 0.023):
+        assert client.get(url, params={"zoom": zoom}).content == coarse
+    assert client.get("/system/response-cache").json()["hits"] == hits + 3
+
+    # Без упрощения ответ тот же, что и без zoom
+    full = client.get(url).content
+    assert client.get(url, params={"zoom": 2}).content == full
+    assert client.get("/system/response-cache").json()["hits"] == hits + 4
+
+
+def test_digest_ignores_key_order():
+    assert drawing_digest({"paths": [[[0, 0]]], "colors": ["#000"]}) == drawing_digest(
+        {"colors": ["#000"], "paths": [[[0, 0]]]}
+    )
+    assert drawing_digest({"paths": [[[0, 0]]]}) != drawing_digest({"paths": [[[0, 1]]]})
+
+
+@pytest.fixture
+def count_builds(monkeypatch):
+    """Число построений уровней детализации; кеш общего хранилища уровней начинается пустым"""
+    monkeypatch.setattr(lod_store, "_tiers", OrderedDict())
+    monkeypatch.setattr(lod_store, "_points", 0)
+    monkeypatch.setattr(lod_store, "_digests", OrderedDict())
+    builds = []
+
+    def counting_build_lod(drawing_data):
+        builds.append(drawing_data)
+        return build_lod(drawing_data)
+
+    monkeypatch.setattr(lod_store_module, "build_lod", counting_build_lod)
+    return builds
+
+
+def _drawing_body(points) -> dict:
+    return {"type": "drawing", "drawing_data": {"paths": [points]}, "x": 0, "y": 0}
+
+
+def _lod_files(canvas_id: str) -> set[str]:
+    lod_dir = storage.get_canvas_path(canvas_id) / LOD_DIR
+    return {entry.name for entry in lod_dir.iterdir()} if lod_dir.is_dir() else set()
+
+
+def test_lod_is_computed_on_write(client, canvas_id, count_builds):
+    url = f"/canvases/{canvas_id}/notes/"
+    note = client.post(url, json=_drawing_body(_wave())).json()
+    assert len(count_builds) == 1
+    assert all("_lod" not in n for n in get_repository().list_notes(canvas_id))
+    assert _lod_files(canvas_id) == {f"{drawing_digest(note['drawing_data'])}.json"}
+
+    full = client.get(url).json()[0]["drawing_data"]
+    assert len(full["paths"][0]) == 1000
+
+    # При масштабе 1/100 пиксель экрана — 100 единиц канваса
+    coarse = client.get(url, params={"zoom": 0.01}).json()[0]["drawing_data"]
+    assert len(coarse["paths"][0]) < 100
+
+    # Перемещение меняет updated_at, но не рисунок
+    client.patch(url + "positions", json={"updates": [{"id": note["id"], "x": 5, "y": 5}]})
+    client.patch(url + "sizes", json={"updates": [{"id": note["id"], "width": 50, "height": 50}]})
+    client.get(url, params={"zoom": 0.02})
+    assert len(count_builds) == 1
+
+    line = [[i, 0] for i in range(100)]
+    client.patch(url + note["id"], json={"drawing_data": {"paths": [line]}}, headers=MERGE_PATCH)
+    assert len(count_builds) == 2
+    coarse = client.get(url, params={"zoom": 0.01}).json()[0]["drawing_data"]
+    assert coarse["paths"][0] == [[0, 0], [99, 0]]
+    assert len(count_builds) == 2
+
+
+def test_lod_survives_restart(client, canvas_id, monkeypatch):
+    url = f"/canvases/{canvas_id}/notes/"
+    client.post(url, json=_drawing_body(_wave()))
+    (note,) = get_repository().list_notes(canvas_id)
+
+    def fail(drawing_data):
+        raise AssertionError("tiers must be read from disk")
+
+    # Новый экземпляр — как после перезапуска: в памяти ничего нет
+    monkeypatch.setattr(lod_store_module, "build_lod", fail)
+    tiers = LodStore(max_points=10 ** 6).get_tiers(canvas_id, note)
+    assert tiers == build_lod(note["drawing_data"])
+
+
+def test_batch_and_put_compute_lod(client, canvas_id, count_builds):
+    url = f"/canvases/{canvas_id}/notes/"
+    results = client.post(url + "batch", json={"operations": [
+        {"op": "create", "note": _drawing_body(_wave())},
+        {"op": "create", "note": _drawing_body(_wave(500))},
+    ]}).json()
+    assert len(count_builds) == 2
+
+    client.put(url + results[0]["id"], json=_drawing_body(_wave(300)))
+    assert len(count_builds) == 3
+    assert len(_lod_files(canvas_id)) == 3
+
+
+def test_lod_of_missing_tiers_is_rebuilt_on_read(client, canvas_id, count_builds):
+    url = f"/canvases/{canvas_id}/notes/"
+    note = client.post(url, json=_drawing_body(_wave())).json()
+    for name in _lod_files(canvas_id):
+        (storage.get_canvas_path(canvas_id) / LOD_DIR / name).unlink()
+
+    tiers = LodStore(max_points=10 ** 6).get_tiers(canvas_id, note)
+    assert tiers and len(count_builds) == 2
+    assert _lod_files(canvas_id) == {f"{drawing_digest(note['drawing_data'])}.json"}
+
+
+def test_lod_follows_clone_import_and_gc(client, canvas_id, count_builds):
+    url = f"/canvases/{canvas_id}/notes/"
+    note = client.post(url, json=_drawing_body(_wave())).json()
+    files = _lod_files(canvas_id)
+
+    clone_id = client.post(f"/canvases/{canvas_id}/clone", json={}).json()["id"]
+    assert _lod_files(clone_id) == files
+    assert len(count_builds) == 1
+
+    archive = client.get(f"/canvases/{canvas_id}/export").content
+    imported_id = client.post("/canvases/import", files={"file": ("a.zip", archive, "application/zip")}).json()["id"]
+    assert _lod_files(imported_id) == files
+
+    # Уровни удалённого рисунка собирает сборщик мусора
+    client.delete(url + note["id"])
+    assert collect_canvas(get_repository(), canvas_id, grace_seconds=0) == [f"{LOD_DIR}/{name}" for name in files]
+    assert _lod_files(canvas_id) == set()
+    assert _lod_files(clone_id) == files
+
+
+def test_lod_cache_evicts_by_points():
+    store = LodStore(max_points=1000)
+    for i in range(5):
+        store._remember(str(i), build_lod({"paths": [_wave()]}))
+    assert store._points <= 1000
@@ -0,0 +1,148 @@
+import json
+import random
+
+import pytest
+from PIL import Image, ImageDraw
+
+from backend.app.core.config import settings
+from backend.app.services import image_index as image_index_module, storage
+from backend.app.services.image_index import HASH_BITS, HASHES_FILE, ImageHashIndex, dhash
+
+
+def _picture(seed: int, size=(320, 240)) -> Image.Image:
+    rnd = random.Random(seed)
+    image = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(image)
+    for _ in range(12):
+        x, y = rnd.randrange(size[0]), rnd.randrange(size[1])
+        color = tuple(rnd.randrange(256) for _ in range(3))
+        draw.ellipse([x, y, x + rnd.randrange(40, 160), y + rnd.randrange(40, 120)], fill=color)
+    return image
+
+
+def _distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def _flip(value: int, *bits: int) -> int:
+    for bit in bits:
+        value ^= 1 << bit
+    return value
+
+
+def _index(hashes: dict[tuple[str, str], int]) -> ImageHashIndex:
+    index = ImageHashIndex()
+    for canvas_id in {canvas_id for canvas_id, _ in hashes}:
+        index.load_canvas(canvas_id)
+    for key, value in hashes.items():
+        index._insert(key, value)
+    return index
+
+
+def test_dhash_survives_resize_and_jpeg(tmp_path):
+    original = _picture(1)
+    original.save(tmp_path / "a.png")
+    original.resize((160, 120)).save(tmp_path / "small.jpg", quality=50)
+    original.resize((640, 480)).save(tmp_path / "large.jpg", quality=30)
+    _picture(2).save(tmp_path / "other.png")
+    (tmp_path / "broken.png").write_bytes(b"not an image")
+
+    value = dhash(tmp_path / "a.png")
+    assert 0 <= value < 1 << HASH_BITS
+    for name in ("small.jpg", "large.jpg"):
+        assert _distance(value, dhash(tmp_path / name)) <= settings.ocr_reuse_distance
+    assert _distance(value, dhash(tmp_path / "other.png")) > 4 * settings.ocr_reuse_distance
+    assert dhash(tmp_path / "broken.png") is None
+
+
+@pytest.mark.parametrize("max_distance", [0, 1, 3, 4, 7, 12])
+def test_search_matches_brute_force(max_distance):
+    rnd = random.Random(max_distance)
+    query = rnd.getrandbits(HASH_BITS)
+    hashes = {}
+    for i in range(300):
+        if i % 3:
+            value = rnd.getrandbits(HASH_BITS)
+        else:
+            # Соседи запроса на разном расстоянии, в том числе с изменениями во всех частях хеша
+            value = _flip(query, *rnd.sample(range(HASH_BITS), rnd.randrange(0, 14)))
+        hashes[(f"c{i % 2}", f"images/{i}.png")] = value
+    index = _index(hashes)
+
+    expected = sorted(
+        (_distance(value, query), canvas_id, file_path)
+        for (canvas_id, file_path), value in hashes.items()
+        if _distance(value, query) <= max_distance
+    )
+    assert index.search(query, max_distance) == expected
+    assert index.search(query, max_distance, "c1") == [item for item in expected if item[1] == "c1"]
+
+
+def test_find_duplicates_groups_transitively():
+    a, b, c = 0x0123456789ABCDEF, 0xFEDCBA9876543210, 0x00FF00FF00FF00FF
+    index = _index({
+        ("c", "images/a.png"): a,
+        ("c", "ocr/a1.png"): _flip(a, 3),
+        ("c", "images/a2.png"): _flip(a, 3, 40),
+        ("c", "images/b.png"): b,
+        ("c", "images/b1.png"): _flip(b, 63),
+        ("c", "images/c.png"): c,
+        ("other", "images/a.png"): a,
+    })
+
+    groups = index.find_duplicates("c", max_distance=1)
+    assert sorted(groups) == [
+        ["images/a.png", "images/a2.png", "ocr/a1.png"],
+        ["images/b.png", "images/b1.png"],
+    ]
+    assert index.find_duplicates("c", max_distance=0) == []
+    assert index.find_duplicates("missing", max_distance=4) == []
+
+
+@pytest.fixture
+def canvas_images(client, canvas_id, monkeypatch):
+    """Канвас с двумя почти одинаковыми изображениями и одним другим"""
+    monkeypatch.setattr(settings, "features", {"ocr"})
+    images_dir = storage.get_canvas_path(canvas_id) / "images"
+    _picture(1).save(images_dir / "a.png")
+    _picture(1).resize((200, 150)).save(images_dir / "a.jpg", quality=40)
+    _picture(7).save(images_dir / "b.png")
+    return canvas_id, images_dir
+
+
+def test_hashes_are_saved_with_canvas(canvas_images, monkeypatch):
+    canvas_id, images_dir = canvas_images
+    index = ImageHashIndex()
+    value = index.add_file(canvas_id, "images/a.png", images_dir / "a.png")
+    assert value == dhash(images_dir / "a.png")
+    assert index.add_file(canvas_id, "audio/a.png", images_dir / "a.png") is None
+
+    with open(images_dir.parent / HASHES_FILE, encoding="utf-8") as f:
+        saved = {file_path: int(value, 16) for file_path, value in json.load(f).items()}
+    assert saved == {f"images/{name}": dhash(images_dir / name) for name in ("a.png", "a.jpg", "b.png")}
+
+    # Новый процесс берёт хеши из файла, не читая изображения
+    monkeypatch.setattr(image_index_module, "dhash", None)
+    reloaded = ImageHashIndex()
+    assert reloaded.find_duplicates(canvas_id, settings.ocr_reuse_distance) == [["images/a.jpg", "images/a.png"]]
+    assert len(reloaded) == 3
+
+
+def test_remove_file_and_forget_canvas(canvas_images):
+    canvas_id, images_dir = canvas_images
+    index = ImageHashIndex()
+    index.load_canvas(canvas_id)
+    value = index.get_hash(canvas_id, "images/a.png")
+    assert {path for _, _, path in index.search(value, 4)} == {"images/a.png", "images/a.jpg"}
+
+    index.remove_file(canvas_id, "images/a.jpg")
+    assert {path for _, _, path in index.search(value, 4)} == {"images/a.png"}
+    assert index.find_duplicates(canvas_id, 4) == []
+    with open(images_dir.parent / HASHES_FILE, encoding="utf-8") as f:
+        assert set(json.load(f)) == {"images/a.png", "images/b.png"}
+
+    index.forget_canvas(canvas_id)
+    assert len(index) == 0
+    assert index.search(value, HASH_BITS) == []
+    # Забытый канвас загружается заново при следующем обращении
+    assert index.get_hash(canvas_id, "images/a.png") == value
@@ -0,0 +1,95 @@
+import os
+import time
+
+import pytest
+
+from backend.app.services import storage
+from backend.app.services.disk_usage import disk_usage
+from backend.app.services.media_gc import GC_GRACE_SECONDS, collect_canvas
+from backend.app.services.repository import get_repository
+
+
+def _upload(client, canvas_id: str, kind: str, name: str, data: bytes) -> str:
+    content_type = "image/png" if kind == "image" else "audio/wav"
+    r = client.post(f"/canvases/{canvas_id}/upload/{kind}", files={"file": (name, data, content_type)})
+    return r.json()["file_path"]
+
+
+def _age(canvas_dir, *paths: str, seconds: float = GC_GRACE_SECONDS + 60):
+    old = time.time() - seconds
+    for path in paths:
+        os.utime(canvas_dir / path, (old, old))
+
+
+@pytest.fixture
+def canvas_files(client, canvas_id):
+    """Медиафайлы канваса: используемые, их производные и брошенные"""
+    canvas_dir = storage.get_canvas_path(canvas_id)
+    url = f"/canvases/{canvas_id}/notes/"
+
+    image = _upload(client, canvas_id, "image", "a.png", b"image" * 100)
+    audio = _upload(client, canvas_id, "audio", "a.wav", b"audio" * 100)
+    client.post(url, json={"type": "image", "file_path": image, "x": 0, "y": 0})
+    client.post(url, json={"type": "audio", "file_path": audio, "x": 0, "y": 0})
+
+    image_stem = os.path.splitext(os.path.basename(image))[0]
+    audio_name = os.path.basename(audio)
+    audio_stem = os.path.splitext(audio_name)[0]
+    files = {
+        "image": image,
+        "audio": audio,
+        "orphan": _upload(client, canvas_id, "image", "b.png", b"orphan" * 100),
+        "image_ocr": f"transcripts/{image_stem}_ocr.txt",
+        "audio_transcript": f"transcripts/{audio_stem}_transcript.txt",
+        "audio_text": f"transcripts/{audio_name}.txt",
+        "temp": f"transcripts/{audio_stem}_temp.wav",
+        "orphan_ocr": "transcripts/gone_ocr.txt",
+        "orphan_text": "transcripts/gone.wav.txt",
+        "unknown": "transcripts/readme.md",
+    }
+    for key in ("image_ocr", "audio_transcript", "audio_text", "temp", "orphan_ocr", "orphan_text", "unknown"):
+        (canvas_dir / files[key]).write_bytes(key.encode() * 10)
+
+    _age(canvas_dir, *files.values())
+    return canvas_dir, files
+
+
+def test_collects_unreferenced_files(client, canvas_id, canvas_files):
+    canvas_dir, files = canvas_files
+    before = disk_usage.get_canvas_usage(canvas_id)
+    sizes = {key: (canvas_dir / path).stat().st_size for key, path in files.items()}
+
+    removed = collect_canvas(get_repository(), canvas_id)
+
+    garbage = {"orphan", "temp", "orphan_ocr", "orphan_text"}
+    assert sorted(removed) == sorted(files[key] for key in garbage)
+    for key, path in files.items():
+        assert (canvas_dir / path).exists() == (key not in garbage), key
+
+    assert disk_usage.get_canvas_usage(canvas_id) == before - sum(sizes[key] for key in garbage)
+    assert files["orphan"] not in client.get(f"/canvases/{canvas_id}/media").json()["images"]
+    assert collect_canvas(get_repository(), canvas_id) == []
+
+
+def test_grace_period_protects_new_files(client, canvas_id, canvas_files):
+    canvas_dir, files = canvas_files
+    _age(canvas_dir, files["orphan"], files["temp"], seconds=60)
+
+    removed = collect_canvas(get_repository(), canvas_id)
+    assert files["orphan"] not in removed and files["temp"] not in removed
+    assert (canvas_dir / files["orphan"]).exists()
+    assert (canvas_dir / files["temp"]).exists()
+
+    removed = collect_canvas(get_repository(), canvas_id, grace_seconds=0)
+    assert sorted(removed) == sorted([files["orphan"], files["temp"]])
+
+
+def test_deleted_note_releases_its_files(client, canvas_id, canvas_files):
+    canvas_dir, files = canvas_files
+    url = f"/canvases/{canvas_id}/notes/"
+    (image_note,) = [n for n in client.get(url).json() if n.get("file_path") == files["image"]]
+    client.delete(url + image_note["id"])
+
+    removed = client.post(f"/canvases/{canvas_id}/gc").json()["removed"]
+    assert files["image"] in removed and files["image_ocr"] in removed
+    assert files["audio"] not in removed and files["audio_text"] not in removed
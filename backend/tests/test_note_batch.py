@@ -0,0 +1,91 @@
+import pytest
+from pydantic import TypeAdapter
+
+from backend.app.schemas.note import NoteBatchOperation
+from backend.app.services.repository.base import NoteBatchError, apply_note_batch, build_note
+
+from backend.tests.helpers import text_note
+
+_operation = TypeAdapter(NoteBatchOperation)
+
+
+def _operations(*items):
+    return [_operation.validate_python(item) for item in items]
+
+
+def _existing(*titles):
+    return [build_note(_operation.validate_python({"op": "create", "note": text_note(t)}).note) for t in titles]
+
+
+def test_batch_applies_operations_in_order():
+    a, b = _existing("a", "b")
+    notes, results = apply_note_batch([a, b], _operations(
+        {"op": "create", "note": text_note("c")},
+        {"op": "update", "id": a["id"], "note": text_note("a2")},
+        {"op": "delete", "id": b["id"]},
+    ))
+
+    assert [r["op"] for r in results] == ["create", "update", "delete"]
+    assert [n["title"] for n in notes] == ["a2", "c"]
+    updated = notes[0]
+    assert updated["id"] == a["id"] and updated["created_at"] == a["created_at"]
+
+
+def test_batch_can_update_note_created_earlier_in_same_batch():
+    notes, results = apply_note_batch([], _operations({"op": "create", "note": text_note("new")}))
+    created_id = results[0]["id"]
+
+    notes, _ = apply_note_batch(notes, _operations(
+        {"op": "update", "id": created_id, "note": text_note("renamed")},
+        {"op": "delete", "id": created_id},
+    ))
+    assert notes == []
+
+
+@pytest.mark.parametrize("operations, index", [
+    ([{"op": "delete", "id": "missing"}], 0),
+    ([{"op": "create", "note": text_note()}, {"op": "update", "id": "missing", "note": text_note()}], 1),
+])
+def test_batch_error_reports_operation_index(operations, index):
+    with pytest.raises(NoteBatchError) as e:
+        apply_note_batch([], _operations(*operations))
+    assert e.value.index == index
+
+
+def test_batch_error_after_delete_of_same_note():
+    (a,) = _existing("a")
+    with pytest.raises(NoteBatchError) as e:
+        apply_note_batch([a], _operations(
+            {"op": "delete", "id": a["id"]},
+            {"op": "delete", "id": a["id"]},
+        ))
+    assert e.value.index == 1
+
+
+def test_batch_does_not_modify_input():
+    (a,) = _existing("a")
+    notes = [a]
+    apply_note_batch(notes, _operations({"op": "delete", "id": a["id"]}))
+    assert notes == [a]
+
+
+def test_batch_endpoint_is_all_or_nothing(client, canvas_id):
+    url = f"/canvases/{canvas_id}/notes/"
+    kept = client.post(url, json=text_note("kept")).json()
+
+    r = client.post(url + "batch", json={"operations": [
+        {"op": "create", "note": text_note("lost")},
+        {"op": "delete", "id": kept["id"]},
+        {"op": "delete", "id": "missing"},
+    ]})
+    assert r.status_code == 404
+    assert r.json()["detail"]["index"] == 2
+    assert [n["title"] for n in client.get(url).json()] == ["kept"]
+
+    r = client.post(url + "batch", json={"operations": [
+        {"op": "create", "note": text_note("added")},
+        {"op": "delete", "id": kept["id"]},
+    ]})
+    assert r.status_code == 200
+    assert [item["op"] for item in r.json()] == ["create", "delete"]
+    assert [n["title"] for n in client.get(url).json()] == ["added"]
@@ -0,0 +1,127 @@
+import threading
+
+import pytest
+
+from backend.app.services.repository import NoteConflictError, get_repository
+from backend.app.services.repository import sqlite as sqlite_repository
+from backend.app.services.repository.base import merge_patch
+
+from backend.tests.helpers import text_note
+
+MERGE_PATCH = {"Content-Type": "application/merge-patch+json"}
+
+
+# Примеры из приложения A RFC 7396
+@pytest.mark.parametrize("target, patch, expected", [
+    ({"a": "b"}, {"a": "c"}, {"a": "c"}),
+    ({"a": "b"}, {"b": "c"}, {"a": "b", "b": "c"}),
+    ({"a": "b"}, {"a": None}, {}),
+    ({"a": "b", "b": "c"}, {"a": None}, {"b": "c"}),
+    ({"a": ["b"]}, {"a": "c"}, {"a": "c"}),
+    ({"a": "c"}, {"a": ["b"]}, {"a": ["b"]}),
+    ({"a": {"b": "c"}}, {"a": {"b": "d", "c": None}}, {"a": {"b": "d"}}),
+    ({"a": [{"b": "c"}]}, {"a": [1]}, {"a": [1]}),
+    (["a", "b"], ["c", "d"], ["c", "d"]),
+    ({"a": "b"}, ["c"], ["c"]),
+    ({"a": "foo"}, None, None),
+    ({"a": "foo"}, "bar", "bar"),
+    ({"e": None}, {"a": 1}, {"e": None, "a": 1}),
+    ([1, 2], {"a": "b", "c": None}, {"a": "b"}),
+    ({}, {"a": {"bb": {"ccc": None}}}, {"a": {"bb": {}}}),
+])
+def test_merge_patch(target, patch, expected):
+    assert merge_patch(target, patch) == expected
+
+
+def test_merge_patch_does_not_modify_target():
+    target = {"a": {"b": 1}}
+    merge_patch(target, {"a": {"b": 2}})
+    assert target == {"a": {"b": 1}}
+
+
+@pytest.fixture
+def note_url(client, canvas_id):
+    note = client.post(f"/canvases/{canvas_id}/notes/", json=text_note("title")).json()
+    return f"/canvases/{canvas_id}/notes/{note['id']}"
+
+
+def test_patch_changes_only_given_fields(client, note_url):
+    r = client.patch(note_url, json={"title": "new"}, headers=MERGE_PATCH)
+    assert r.status_code == 200
+    note = r.json()
+    assert (note["title"], note["content"]) == ("new", "c")
+    assert r.headers["ETag"] == f'"{note["updated_at"]}"'
+
+
+def test_patch_validates_fields(client, note_url):
+    for patch in ({"x": "left"}, {"id": "other"}, {"unknown": 1}, {"title": None}):
+        r = client.patch(note_url, json=patch, headers=MERGE_PATCH)
+        assert r.status_code == 422, patch
+
+
+def test_patch_missing_note(client, canvas_id):
+    r = client.patch(f"/canvases/{canvas_id}/notes/missing", json={"title": "x"}, headers=MERGE_PATCH)
+    assert r.status_code == 404
+
+
+def test_if_match(client, note_url):
+    etag = client.patch(note_url, json={"title": "first"}, headers=MERGE_PATCH).headers["ETag"]
+
+    r = client.patch(note_url, json={"title": "second"}, headers={**MERGE_PATCH, "If-Match": etag})
+    assert r.status_code == 200
+    current = r.headers["ETag"]
+
+    # Клиент с устаревшей версией получает 412 и актуальный ETag
+    r = client.patch(note_url, json={"title": "stale"}, headers={**MERGE_PATCH, "If-Match": etag})
+    assert r.status_code == 412
+    assert r.headers["ETag"] == current
+
+    r = client.patch(note_url, json={"title": "any"}, headers={**MERGE_PATCH, "If-Match": "*"})
+    assert r.status_code == 200
+
+
+def test_noop_patch_keeps_revision(client, note_url):
+    etag = client.patch(note_url, json={"title": "same"}, headers=MERGE_PATCH).headers["ETag"]
+    r = client.patch(note_url, json={"title": "same"}, headers={**MERGE_PATCH, "If-Match": etag})
+    assert r.status_code == 200
+    assert r.headers["ETag"] == etag
+
+
+def _race_on_read(monkeypatch, repo, canvas_id, note_id, concurrent_patch):
+    """Другой воркер меняет заметку между чтением и записью патча"""
+    original = sqlite_repository.apply_note_patch
+    raced = []
+
+    def apply_note_patch(existing, patch):
+        if not raced:
+            raced.append(True)
+            thread = threading.Thread(target=repo.patch_note, args=(canvas_id, note_id, concurrent_patch))
+            thread.start()
+            thread.join()
+        return original(existing, patch)
+
+    monkeypatch.setattr(sqlite_repository, "apply_note_patch", apply_note_patch)
+
+
+@pytest.mark.parametrize("storage_backend", ["sqlite"], indirect=True)
+def test_if_match_is_atomic(client, canvas_id, note_url, monkeypatch):
+    repo = get_repository()
+    note_id = note_url.rsplit("/", 1)[1]
+    etag = f'"{repo.list_notes(canvas_id)[0]["updated_at"]}"'
+    _race_on_read(monkeypatch, repo, canvas_id, note_id, {"title": "other"})
+
+    with pytest.raises(NoteConflictError):
+        repo.patch_note(canvas_id, note_id, {"content": "mine"}, etag)
+    (stored,) = repo.list_notes(canvas_id)
+    assert (stored["title"], stored["content"]) == ("other", "c")
+
+
+@pytest.mark.parametrize("storage_backend", ["sqlite"], indirect=True)
+def test_patch_without_if_match_applies_to_latest(client, canvas_id, note_url, monkeypatch):
+    repo = get_repository()
+    note_id = note_url.rsplit("/", 1)[1]
+    _race_on_read(monkeypatch, repo, canvas_id, note_id, {"title": "other"})
+
+    patched = repo.patch_note(canvas_id, note_id, {"content": "mine"})
+    assert (patched["title"], patched["content"]) == ("other", "mine")
+    assert repo.list_notes(canvas_id) == [patched]
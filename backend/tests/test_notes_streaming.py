@@ -0,0 +1,182 @@
+import gzip
+import io
+import json
+
+import pytest
+
+from backend.app.services import notes_storage, streaming
+from backend.app.services.repository import get_repository
+from backend.app.services.streaming import ResponseCache, encode, encode_body, negotiate_encoding, response_cache
+
+from backend.tests.helpers import text_note
+
+
+@pytest.fixture
+def all_encodings(monkeypatch):
+    monkeypatch.setattr(streaming, "available_encodings", lambda: ["zstd", "br", "gzip"])
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("", None),
+    ("identity", None),
+    ("gzip", "gzip"),
+    ("gzip, br", "br"),
+    ("gzip, br, zstd", "zstd"),
+    ("br;q=0.5, gzip", "gzip"),
+    ("zstd;q=0, br;q=0", None),
+    ("*", "zstd"),
+    ("*;q=0.1, gzip;q=0.5", "gzip"),
+    ("GZIP ; q=0.8", "gzip"),
+    ("gzip;q=bad", None),
+])
+def test_negotiate_encoding(all_encodings, header, expected):
+    assert negotiate_encoding(header) == expected
+
+
+def test_negotiate_skips_unavailable_encodings(monkeypatch):
+    monkeypatch.setattr(streaming, "available_encodings", lambda: ["gzip"])
+    assert negotiate_encoding("br, zstd") is None
+    assert negotiate_encoding("br, gzip;q=0.1") == "gzip"
+
+
+def test_gzip_stream_decodes_to_original():
+    chunks = [b"a" * 5000, b"b" * 5000, b""]
+    assert gzip.decompress(b"".join(encode(chunks, "gzip"))) == b"".join(chunks)
+
+
+def test_small_bodies_are_not_compressed():
+    assert encode_body(b"{}", "gzip") == (b"{}", None)
+
+
+def test_cache_keeps_only_latest_revision():
+    cache = ResponseCache(max_bytes=1000)
+    cache.put(("c1", "r1", None), b"old")
+    cache.put(("c2", "r1", None), b"other")
+    cache.put(("c1", "r2", None), b"new")
+
+    assert cache.get(("c1", "r1", None)) is None
+    assert cache.get(("c1", "r2", None)) == b"new"
+    assert cache.get(("c2", "r1", None)) == b"other"
+
+    cache.forget_canvas("c1")
+    assert cache.get(("c1", "r2", None)) is None
+    assert cache.get_stats()["entries"] == 1
+
+
+def test_cache_limits():
+    cache = ResponseCache(max_bytes=100)
+    cache.put(("big", "r", None), b"x" * 26)
+    assert cache.get(("big", "r", None)) is None
+
+    for i in range(5):
+        cache.put((f"c{i}", "r", None), b"x" * 25)
+    stats = cache.get_stats()
+    assert stats["bytes"] <= 100
+    assert cache.get(("c0", "r", None)) is None
+
+
+def test_stream_stores_only_current_complete_body():
+    cache = ResponseCache(max_bytes=1000)
+    assert b"".join(cache.stream(("c", "r1"), [b"a", b"b"], lambda: True)) == b"ab"
+    assert cache.get(("c", "r1")) == b"ab"
+
+    # Ревизия изменилась, пока ответ отдавался
+    b"".join(cache.stream(("c", "r2"), [b"c"], lambda: False))
+    assert cache.get(("c", "r2")) is None
+
+    # Клиент ушёл, не дочитав ответ
+    partial = cache.stream(("d", "r1"), [b"a", b"b"], lambda: True)
+    next(partial)
+    partial.close()
+    assert cache.get(("d", "r1")) is None
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 4096])
+@pytest.mark.parametrize("notes", [
+    [],
+    [{"title": "заметка ✓", "n": [1, 2.5e3, -7, None, True, False]}, {}],
+    [12345, "x", [[1, 2], [3, 4]]],
+])
+def test_json_array_is_read_in_chunks(monkeypatch, chunk_size, notes):
+    monkeypatch.setattr(notes_storage, "ITER_CHUNK_SIZE", chunk_size)
+    for indent in (None, 2):
+        text = json.dumps(notes, ensure_ascii=False, indent=indent)
+        assert list(notes_storage._iter_json_array(io.StringIO(text))) == notes
+
+
+@pytest.mark.parametrize("text", ["", "{}", "[", "[1", "[1,", "[1,]", "[1 2]", '[{"a": 1]'])
+def test_broken_json_array_is_an_error(monkeypatch, text):
+    monkeypatch.setattr(notes_storage, "ITER_CHUNK_SIZE", 2)
+    with pytest.raises(ValueError):
+        list(notes_storage._iter_json_array(io.StringIO(text)))
+
+
+@pytest.mark.parametrize("storage_backend", ["json"], indirect=True)
+def test_json_notes_are_not_loaded_whole(client, canvas_id, monkeypatch):
+    url = f"/canvases/{canvas_id}/notes/"
+    for i in range(5):
+        client.post(url, json=text_note(f"заметка {i}"))
+
+    with open(notes_storage.get_notes_path(canvas_id), encoding="utf-8") as f:
+        stored = json.load(f)
+
+    monkeypatch.setattr(notes_storage, "ITER_CHUNK_SIZE", 16)
+    monkeypatch.setattr(notes_storage, "load_notes", None)
+    assert list(get_repository().iter_notes(canvas_id)) == stored
+    assert [n["title"] for n in client.get(url, params={"zoom": 3}).json()] == [f"заметка {i}" for i in range(5)]
+
+
+def test_etag_and_not_modified(client, canvas_id):
+    url = f"/canvases/{canvas_id}/notes/"
+    client.post(url, json=text_note("a"))
+
+    r = client.get(url)
+    etag = r.headers["ETag"]
+    assert etag.startswith('W/"')
+    assert "Accept-Encoding" in r.headers["Vary"]
+
+    r = client.get(url, headers={"If-None-Match": etag})
+    assert r.status_code == 304
+    assert r.content == b""
+
+    client.post(url, json=text_note("b"))
+    r = client.get(url, headers={"If-None-Match": etag})
+    assert r.status_code == 200
+    assert r.headers["ETag"] != etag
+    assert [n["title"] for n in r.json()] == ["a", "b"]
+
+
+def test_cached_response_follows_changes(client, canvas_id):
+    url = f"/canvases/{canvas_id}/notes/"
+    note = client.post(url, json=text_note("a")).json()
+
+    client.get(url)
+    hits = client.get("/system/response-cache").json()["hits"]
+    assert [n["title"] for n in client.get(url).json()] == ["a"]
+    assert client.get("/system/response-cache").json()["hits"] == hits + 1
+
+    client.patch(url + note["id"], json={"title": "changed"},
+                 headers={"Content-Type": "application/merge-patch+json"})
+    assert [n["title"] for n in client.get(url).json()] == ["changed"]
+
+    # Удалённый канвас не занимает место в кеше
+    client.get(url)
+    entries = response_cache.get_stats()["entries"]
+    client.delete(f"/canvases/{canvas_id}")
+    assert response_cache.get_stats()["entries"] == entries - 1
+
+
+def test_ndjson_and_gzip(client, canvas_id):
+    url = f"/canvases/{canvas_id}/notes/"
+    for i in range(3):
+        client.post(url, json=text_note(str(i)))
+
+    r = client.get(url, headers={"Accept": "application/x-ndjson", "Accept-Encoding": "gzip"})
+    assert r.headers["Content-Type"].startswith("application/x-ndjson")
+    assert r.headers["Content-Encoding"] == "gzip"
+    assert [json.loads(line)["title"] for line in r.text.splitlines()] == ["0", "1", "2"]
+
+    r = client.get(url, headers={"Accept-Encoding": "identity"})
+    assert "Content-Encoding" not in r.headers
+    assert len(r.json()) == 3
@@ -0,0 +1,133 @@
+import io
+import time
+
+import pytest
+from PIL import Image
+
+from backend.app.core.config import settings
+from backend.app.services import preview
+from backend.app.services.preview import (
+    BACKGROUND_COLOR, PREVIEW_SIZE, PreviewRenderer, get_preview_path, preview_renderer, render_preview
+)
+from backend.app.services.repository import get_repository
+
+from backend.tests.helpers import text_note
+
+DEBOUNCE = 0.3
+
+
+@pytest.fixture
+def renders(client, monkeypatch):
+    """Превью включены, дебаунс короткий; возвращает список перерисованных канвасов"""
+    monkeypatch.setattr(settings, "features", {"previews"})
+    monkeypatch.setattr(preview_renderer, "_debounce", DEBOUNCE)
+    monkeypatch.setattr(preview_renderer, "_max_delay", 10 * DEBOUNCE)
+
+    rendered = []
+
+    def counting_render(repo, canvas_id):
+        rendered.append(canvas_id)
+        return render_preview(repo, canvas_id)
+
+    monkeypatch.setattr(preview, "render_preview", counting_render)
+    return rendered
+
+
+def _wait_for(condition, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return condition()
+
+
+def test_preview_disabled(client, canvas_id):
+    r = client.get(f"/canvases/{canvas_id}/preview")
+    assert r.status_code == 404
+    assert r.json()["detail"] == "Previews are disabled"
+
+
+def test_preview_and_etag(client, canvas_id, renders):
+    assert client.get("/canvases/missing/preview").status_code == 404
+
+    r = client.get(f"/canvases/{canvas_id}/preview")
+    assert r.status_code == 200
+    assert r.headers["Content-Type"] == "image/png"
+    assert r.headers["Cache-Control"] == "no-cache"
+    with Image.open(io.BytesIO(r.content)) as image:
+        assert image.size == PREVIEW_SIZE
+
+    etag = r.headers["ETag"]
+    r = client.get(f"/canvases/{canvas_id}/preview", headers={"If-None-Match": f'"other", {etag}'})
+    assert r.status_code == 304
+    assert r.content == b""
+    assert r.headers["ETag"] == etag
+
+
+def test_mutations_rerender_after_debounce(client, canvas_id, renders):
+    url = f"/canvases/{canvas_id}/preview"
+    # Первое превью рисуется сразу при запросе
+    etag = client.get(url).headers["ETag"]
+    assert renders == [canvas_id]
+
+    def changed() -> bool:
+        return client.get(url, headers={"If-None-Match": etag}).status_code == 200
+
+    # Серия правок: до перерисовки отдаётся прежнее превью, затем превью рисуется один раз
+    notes_url = f"/canvases/{canvas_id}/notes/"
+    for i in range(3):
+        client.post(notes_url, json=text_note(str(i), x=i * 100))
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+    assert _wait_for(changed)
+    assert renders.count(canvas_id) == 2
+    etag = client.get(url).headers["ETag"]
+
+    # Чтение заметок превью не трогает
+    client.get(notes_url)
+    time.sleep(2 * DEBOUNCE)
+    assert renders.count(canvas_id) == 2
+
+    # Загрузка медиафайла тоже ставит превью на перерисовку
+    png = io.BytesIO()
+    Image.new("RGB", (10, 10), "red").save(png, "PNG")
+    client.post(f"/canvases/{canvas_id}/upload/image", files={"file": ("a.png", png.getvalue(), "image/png")})
+    assert _wait_for(changed)
+    assert renders.count(canvas_id) == 3
+
+
+def test_deleted_canvas_loses_preview(client, canvas_id, renders):
+    client.get(f"/canvases/{canvas_id}/preview")
+    assert get_preview_path(canvas_id).exists()
+    client.delete(f"/canvases/{canvas_id}")
+    assert not get_preview_path(canvas_id).exists()
+
+
+def test_continuous_edits_rerender_after_max_delay(client, canvas_id, renders):
+    renderer = PreviewRenderer(debounce=0.2, max_delay=0.5)
+    repo = get_repository()
+    started = time.monotonic()
+    while time.monotonic() - started < 1.5:
+        renderer.invalidate(repo, canvas_id)
+        time.sleep(0.05)
+    # Правки идут чаще дебаунса, но превью всё равно перерисовывается
+    assert renders.count(canvas_id) >= 2
+
+
+def test_render_draws_notes(client, canvas_id):
+    url = f"/canvases/{canvas_id}/notes/"
+    repo = get_repository()
+    empty = render_preview(repo, canvas_id)
+    with Image.open(empty) as image:
+        assert set(image.getdata()) == {Image.new("RGB", (1, 1), BACKGROUND_COLOR).getpixel((0, 0))}
+
+    client.post(url, json=text_note("Заголовок", width=300, height=200))
+    client.post(url, json={
+        "type": "drawing", "x": 400, "y": 0, "width": 200, "height": 200,
+        "drawing_data": {"paths": [[[0, 0], [200, 200]]], "colors": ["not a color"]},
+    })
+    client.post(url, json={"type": "image", "file_path": "images/missing.png", "x": 0, "y": 300})
+    with Image.open(render_preview(repo, canvas_id)) as image:
+        assert len(set(image.getdata())) > 3
+
+    assert render_preview(repo, "missing") is None
@@ -0,0 +1,94 @@
+import pytest
+
+from backend.app.schemas.note import NoteBatch, TextNoteCreate
+from backend.app.services.repository import CanvasNotFoundError, get_repository
+from backend.app.services.repository import sqlite as sqlite_repository
+
+from backend.tests.helpers import text_note
+
+MERGE_PATCH = {"Content-Type": "application/merge-patch+json"}
+
+
+def _batch(*operations):
+    return NoteBatch(operations=list(operations)).operations
+
+
+def test_notes_need_existing_canvas(client):
+    repo = get_repository()
+    with pytest.raises(CanvasNotFoundError):
+        repo.create_note("missing", TextNoteCreate(**text_note()))
+    with pytest.raises(CanvasNotFoundError):
+        repo.apply_note_batch("missing", _batch({"op": "create", "note": text_note()}))
+    assert repo.list_notes("missing") == []
+
+    r = client.post("/canvases/missing/notes/", json=text_note())
+    assert r.status_code == 404
+    assert r.json()["detail"] == "Canvas not found"
+
+    r = client.post("/canvases/missing/notes/batch", json={"operations": [{"op": "create", "note": text_note()}]})
+    assert r.status_code == 404
+    assert r.json()["detail"] == "Canvas not found"
+
+
+def test_deleted_canvas_takes_notes_away(client, canvas_id):
+    client.post(f"/canvases/{canvas_id}/notes/", json=text_note())
+    client.delete(f"/canvases/{canvas_id}")
+    assert client.post(f"/canvases/{canvas_id}/notes/", json=text_note()).status_code == 404
+    assert get_repository().list_notes(canvas_id) == []
+
+
+def test_revision_changes_on_every_write(client, canvas_id):
+    repo = get_repository()
+    url = f"/canvases/{canvas_id}/notes/"
+    revisions = [repo.get_notes_revision(canvas_id)]
+
+    def changed():
+        revisions.append(repo.get_notes_revision(canvas_id))
+        return revisions[-1] != revisions[-2]
+
+    note = client.post(url, json=text_note()).json()
+    assert changed()
+    client.patch(url + note["id"], json={"title": "new"}, headers=MERGE_PATCH)
+    assert changed()
+    client.patch(url + note["id"], json={"title": "new"}, headers=MERGE_PATCH)
+    assert not changed()
+    client.put(url + note["id"], json=text_note("put"))
+    assert changed()
+    client.patch(url + "positions", json={"updates": [{"id": note["id"], "x": 5, "y": 6}]})
+    assert changed()
+    client.patch(url + "sizes", json={"updates": [{"id": note["id"], "width": 50, "height": 60}]})
+    assert changed()
+    client.delete(url + note["id"])
+    assert changed()
+
+
+def test_stored_note_matches_response(client, canvas_id):
+    url = f"/canvases/{canvas_id}/notes/"
+    note = client.post(url, json={
+        "type": "drawing", "x": 0, "y": 0, "width": 10,
+        "drawing_data": {"paths": [[[0, 0], [1, 1]]], "colors": ["#000"], "tools": ["pen"]},
+    }).json()
+
+    # Вложенное слияние, удаление ключа и сброс поля к значению по умолчанию
+    patched = client.patch(url + note["id"], json={
+        "drawing_data": {"colors": ["#f00"], "tools": None}, "width": None, "tags": ["a"],
+    }, headers=MERGE_PATCH).json()
+    assert patched["drawing_data"] == {"paths": [[[0, 0], [1, 1]]], "colors": ["#f00"]}
+    assert patched["tags"] == ["a"]
+
+    client.patch(url + "positions", json={"updates": [{"id": note["id"], "x": 7, "y": 8}]})
+    (stored,) = get_repository().list_notes(canvas_id)
+    assert stored == {**patched, "x": 7, "y": 8, "updated_at": stored["updated_at"]}
+
+
+@pytest.mark.parametrize("count", [0, 1, 3, 7])
+def test_iter_notes_keeps_creation_order(client, canvas_id, monkeypatch, count):
+    monkeypatch.setattr(sqlite_repository, "ITER_PAGE_SIZE", 3)
+    url = f"/canvases/{canvas_id}/notes/"
+    ids = [client.post(url, json=text_note(str(i))).json()["id"] for i in range(count)]
+    if ids:
+        client.delete(url + ids.pop(0))
+
+    repo = get_repository()
+    assert [n["id"] for n in repo.iter_notes(canvas_id)] == ids
+    assert list(repo.iter_notes(canvas_id)) == repo.list_notes(canvas_id)
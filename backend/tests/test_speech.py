@@ -0,0 +1,183 @@
+import array
+import asyncio
+import json
+import math
+import sys
+import time
+import types
+import wave
+
+import pytest
+
+from backend.app.services import speech
+from backend.app.services.cache import file_cache
+from backend.app.services.speech import (
+    ENERGY_FRAME_MS, MAX_SEGMENT_SECONDS, MIN_SEGMENT_SECONDS, iter_segments, split_on_silence, transcribe_wav
+)
+
+RATE = 8000
+WINDOW = RATE * ENERGY_FRAME_MS // 1000
+# Период синуса 200 Гц укладывается в окно громкости целое число раз,
+# поэтому громкость ровной речи одинакова во всех окнах
+PERIOD = RATE // 200
+
+
+def _write_wav(path, parts: list[tuple[float, int]]):
+    """Записать WAV из частей (длительность в секундах, амплитуда синуса); 0 — тишина"""
+    samples = array.array("h")
+    for seconds, amplitude in parts:
+        period = [round(amplitude * math.sin(2 * math.pi * i / PERIOD)) for i in range(PERIOD)]
+        samples.extend(period * round(seconds * RATE / PERIOD))
+    with wave.open(str(path), "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(RATE)
+        wf.writeframes(samples.tobytes())
+    return path
+
+
+def _seconds(frames: int) -> float:
+    return frames / RATE
+
+
+def _check_covers(segments: list[tuple[int, int]], total_frames: int):
+    """Сегменты идут подряд и покрывают запись; последнее окно громкости может быть неполным"""
+    assert segments[0][0] == 0
+    for (start, nframes), (next_start, _) in zip(segments, segments[1:]):
+        assert start + nframes == next_start
+    start, nframes = segments[-1]
+    assert total_frames <= start + nframes < total_frames + WINDOW
+
+
+@pytest.fixture(autouse=True)
+def empty_segment_cache(monkeypatch):
+    monkeypatch.setattr(file_cache, "_segment_cache", {})
+
+
+def test_short_record_is_one_segment(tmp_path):
+    wav = _write_wav(tmp_path / "a.wav", [(10, 8000), (1, 0), (10, 8000)])
+    assert split_on_silence(wav) == [(0, 21 * RATE)]
+
+
+def test_cuts_land_in_pauses(tmp_path):
+    parts = [(20, 8000), (1, 0)] * 3 + [(20, 8000)]
+    wav = _write_wav(tmp_path / "a.wav", parts)
+    segments = split_on_silence(wav)
+
+    assert len(segments) == 3
+    _check_covers(segments, 83 * RATE)
+    for start, _ in segments[1:]:
+        # Паузы: 20–21, 41–42, 62–63 с
+        assert any(pause <= _seconds(start) <= pause + 1 for pause in (20, 41, 62)), _seconds(start)
+
+
+def test_forced_cut_without_pauses(tmp_path):
+    # Ровная речь без пауз с тихим местом на 30-й секунде
+    wav = _write_wav(tmp_path / "a.wav", [(30, 8000), (0.3, 6000), (69.7, 8000)])
+    segments = split_on_silence(wav)
+
+    assert len(segments) > 2
+    _check_covers(segments, 100 * RATE)
+    assert 30 <= _seconds(segments[1][0]) < 30.3
+    for start, nframes in segments:
+        assert nframes <= MAX_SEGMENT_SECONDS * RATE
+    for start, nframes in segments[:-1]:
+        assert nframes >= MIN_SEGMENT_SECONDS * RATE - WINDOW
+
+
+def _fake_transcribe(calls: list, fail_at=()):
+    """Замена распознавания: одно слово на сегмент, первые сегменты готовы последними"""
+    def transcribe_segment(wav_path, lang, start_frame, nframes):
+        calls.append(start_frame)
+        if start_frame in fail_at:
+            raise RuntimeError("recognizer failed")
+        time.sleep(0.05 if start_frame == 0 else 0)
+        offset = start_frame / RATE
+        return {
+            "text": f"слово{start_frame}",
+            "words": [{"word": f"слово{start_frame}", "start": offset + 1, "end": offset + 2, "conf": 1.0}],
+        }
+    return transcribe_segment
+
+
+def _collect(wav, lang="ru-ru") -> list[dict]:
+    async def scenario():
+        return [result async for result in iter_segments(wav, lang)]
+    return asyncio.run(scenario())
+
+
+def test_segments_are_stitched_in_order(tmp_path, monkeypatch):
+    wav = _write_wav(tmp_path / "a.wav", [(20, 8000), (1, 0)] * 3 + [(20, 8000)])
+    segments = split_on_silence(wav)
+    calls = []
+    monkeypatch.setattr(speech, "_transcribe_segment", _fake_transcribe(calls))
+
+    results = _collect(wav)
+    assert [r["index"] for r in results] == list(range(len(segments)))
+    assert all(r["segments"] == len(segments) for r in results)
+    assert [r["text"] for r in results] == [f"слово{start}" for start, _ in segments]
+    assert sorted(calls) == [start for start, _ in segments]
+
+    combined = asyncio.run(transcribe_wav(wav, "ru-ru"))
+    assert combined["segments"] == len(segments)
+    assert combined["transcript"] == " ".join(f"слово{start}" for start, _ in segments)
+    starts = [w["start"] for w in combined["words"]]
+    assert starts == sorted(starts)
+    # Повторное распознавание того же файла целиком берётся из кеша
+    assert len(calls) == len(segments)
+
+
+def test_retry_reuses_cached_segments(tmp_path, monkeypatch):
+    wav = _write_wav(tmp_path / "a.wav", [(20, 8000), (1, 0)] * 3 + [(20, 8000)])
+    segments = split_on_silence(wav)
+    failed = segments[1][0]
+
+    first = []
+    monkeypatch.setattr(speech, "_transcribe_segment", _fake_transcribe(first, fail_at={failed}))
+    with pytest.raises(RuntimeError):
+        _collect(wav)
+    done = {start for start in first if start != failed}
+    assert segments[0][0] in done
+
+    second = []
+    monkeypatch.setattr(speech, "_transcribe_segment", _fake_transcribe(second))
+    results = _collect(wav)
+    assert len(results) == len(segments)
+    assert failed in second
+    assert not done & set(second)
+
+    # Кеш сегментов учитывает язык
+    third = []
+    monkeypatch.setattr(speech, "_transcribe_segment", _fake_transcribe(third))
+    _collect(wav, lang="en-us")
+    assert sorted(third) == [start for start, _ in segments]
+
+
+def test_word_times_are_shifted_to_segment_start(tmp_path, monkeypatch):
+    class KaldiRecognizer:
+        """Распознаватель, который слышит одно слово через секунду после начала сегмента"""
+
+        def __init__(self, model, rate):
+            self.frames = 0
+
+        def SetWords(self, enabled):
+            pass
+
+        def AcceptWaveform(self, data):
+            self.frames += len(data) // 2
+            return False
+
+        def FinalResult(self):
+            word = {"word": f"кадров{self.frames}", "start": 1.0, "end": 1.5, "conf": 0.9}
+            return json.dumps({"text": word["word"], "result": [word]})
+
+    monkeypatch.setitem(sys.modules, "vosk", types.SimpleNamespace(KaldiRecognizer=KaldiRecognizer))
+    monkeypatch.setattr(speech, "get_model", lambda lang: None)
+    wav = _write_wav(tmp_path / "a.wav", [(20, 8000), (1, 0), (30, 8000)])
+
+    start_frame, nframes = 10 * RATE, 5 * RATE
+    result = speech._transcribe_segment(wav, "ru-ru", start_frame, nframes)
+    assert result == {
+        "text": f"кадров{nframes}",
+        "words": [{"word": f"кадров{nframes}", "start": 11.0, "end": 11.5, "conf": 0.9}],
+    }